@@ -5,102 +5,137 @@ AI上下文自动化刷新守护进程
 
 使用方法:
 python auto-refresh-daemon.py --start    # 启动守护进程
+python auto-refresh-daemon.py --start --no-watch  # 不监听文件变更，仅定时检查
 python auto-refresh-daemon.py --stop     # 停止守护进程
 python auto-refresh-daemon.py --status   # 查看状态
+
+多项目模式（一个进程监听注册表中的全部项目，检查和刷新在有界线程池中执行）:
+python auto-refresh-daemon.py --add-project /path/to/project   # 注册项目
+python auto-refresh-daemon.py --registry --start                # 启动多项目守护进程
+python auto-refresh-daemon.py --registry --status               # 查看状态
+
+控制运行中的守护进程（Unix 域套接字，毫秒级响应，不启动新的生成流程）:
+python auto-refresh-daemon.py --ctl status                      # 即时状态（任务、队列、暂停）
+python auto-refresh-daemon.py --ctl trigger-refresh             # 立即刷新（守护进程未运行时直接刷新）
+python auto-refresh-daemon.py --ctl pause / resume              # 暂停/恢复自动刷新
+python auto-refresh-daemon.py --ctl reload-config               # 重新加载定时任务配置
+python auto-refresh-daemon.py --ctl metrics                     # 各任务执行次数和耗时
+python auto-refresh-daemon.py --registry --ctl status           # 多项目守护进程（可加 --project 指定项目）
 """
 
 import os
 import sys
 import time
 import json
+import select
 import signal
 import threading
+from functools import partial
 from pathlib import Path
-from datetime import datetime, timedelta
-import subprocess
+from datetime import datetime
+
+# 添加当前目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent))
+
+from change_watcher import create_change_watcher  # type: ignore
+from metadata_index import load_exclude_dirs  # type: ignore
+from refresh_engine import get_engine, load_tool_module  # type: ignore
+from git_reader import GitReader, GitReaderError  # type: ignore
+from session_store import SessionStore, CATALOG_DB_NAME  # type: ignore
+from session_tracker import SessionTracker, is_git_change  # type: ignore
+from project_registry import ProjectRegistry, DEFAULT_REGISTRY_PATH  # type: ignore
+from work_pool import FairWorkPool  # type: ignore
+from daemon_log import JsonLineLogger, read_recent, format_record  # type: ignore
+from control_socket import (  # type: ignore
+    ControlServer, CONTROL_COMMANDS, send_command, project_socket_path, registry_socket_path,
+)
+from cron_scheduler import (  # type: ignore
+    CronScheduler, CronExpression, SCHEDULER_STATE_FILE_NAME, CATCHUP_ONCE, CATCHUP_POLICIES,
+)
 
 # 定义常量
-SMART_REFRESH_SCRIPT = "smart-refresh.py"
-
-class SimpleScheduler:
-    """简单的定时任务调度器"""
-    def __init__(self):
-        self.jobs = []
-    
-    def add_daily_job(self, hour, minute, func):
-        """添加每日任务"""
-        self.jobs.append({
-            'type': 'daily',
-            'hour': hour,
-            'minute': minute,
-            'func': func,
-            'last_run': None
-        })
-    
-    def add_weekly_job(self, weekday, hour, minute, func):
-        """添加每周任务 (weekday: 0=Monday, 6=Sunday)"""
-        self.jobs.append({
-            'type': 'weekly',
-            'weekday': weekday,
-            'hour': hour,
-            'minute': minute,
-            'func': func,
-            'last_run': None
-        })
-    
-    def add_hourly_job(self, hour, func):
-        """添加特定小时的任务"""
-        self.jobs.append({
-            'type': 'hourly',
-            'hour': hour,
-            'func': func,
-            'last_run': None
-        })
+MAX_REPORTED_PATHS = 5
+NEW_COMMIT_WINDOW_SECONDS = 3600
+CONFIG_FILE_NAME = "context-config.json"
+# 主循环最长休眠该秒数后检查一次配置文件是否修改（多项目模式下同时检查注册表）
+CONFIG_POLL_SECONDS = 300
+# 多项目模式下同时执行检查/刷新的最大线程数
+DEFAULT_WORKERS = min(4, os.cpu_count() or 1)
+# 状态中显示的最近日志条数
+RECENT_LOG_COUNT = 10
+
+# 默认定时任务（cron 表达式: 分 时 日 月 周），可在配置文件 daemon.schedule 中覆盖或设为 null 禁用
+DEFAULT_SCHEDULE = {
+    "daily_check": "0 9 * * *",              # 每天早上9点检查
+    "weekly_deep_check": "30 9 * * 1",       # 每周一早上深度检查
+    "hourly_change_check": "0 9-17 * * 1-5", # 工作日工作时间每小时检查代码变更
+}
+
+
+def _pid_file_running(pid_file: Path) -> bool:
+    """PID 文件中的进程是否仍在运行（进程不存在时删除过期的 PID 文件）"""
+    if not pid_file.exists():
+        return False
     
-    def check_and_run(self):
-        """检查并运行到期的任务"""
-        now = datetime.now()
+    try:
+        with open(pid_file, 'r') as f:
+            pid = int(f.read().strip())
         
-        for job in self.jobs:
-            should_run = False
-            
-            if job['type'] == 'daily':
-                if (now.hour == job['hour'] and 
-                    now.minute == job['minute'] and
-                    (job['last_run'] is None or 
-                     job['last_run'].date() < now.date())):
-                    should_run = True
-            
-            elif job['type'] == 'weekly':
-                if (now.weekday() == job['weekday'] and
-                    now.hour == job['hour'] and
-                    now.minute == job['minute'] and
-                    (job['last_run'] is None or 
-                     now - job['last_run'] > timedelta(days=6))):
-                    should_run = True
-            
-            elif job['type'] == 'hourly':
-                if (now.hour == job['hour'] and
-                    now.minute == 0 and
-                    (job['last_run'] is None or 
-                     now - job['last_run'] > timedelta(hours=1))):
-                    should_run = True
-            
-            if should_run:
-                try:
-                    job['func']()
-                    job['last_run'] = now
-                except Exception as e:
-                    print(f"执行任务时出错: {e}")
+        # 检查进程是否存在
+        os.kill(pid, 0)
+        return True
+    except (OSError, ValueError):
+        # 进程不存在，删除过期的PID文件
+        try:
+            pid_file.unlink()
+        except OSError:
+            pass
+        return False
+
+
+def _emit_log(logger: JsonLineLogger, message: str, level: str, prefix: str = ""):
+    """写入结构化日志（缓冲写入，按大小轮转）并输出到控制台"""
+    record = logger.write(level, message)
+    print(f"{record['time'].replace('T', ' ')} [{level}] {prefix}{message}")
+
 
 class AutoRefreshDaemon:
-    def __init__(self, project_root: str = "."):
+    def __init__(self, project_root: str = ".", watch_changes: bool = True,
+                 pool: "FairWorkPool" = None):
         self.project_root = Path(project_root).resolve()
         self.ai_context_dir = self.project_root / ".ai-context"
         self.pid_file = self.ai_context_dir / "cache" / "daemon.pid"
-        self.log_file = self.ai_context_dir / "logs" / "auto-refresh.log"
+        self.log_file = self.ai_context_dir / "logs" / "auto-refresh.jsonl"
+        self.logger = JsonLineLogger(self.log_file)
         self.running = False
-        self.scheduler = SimpleScheduler()
+        self.config_file = self.ai_context_dir / CONFIG_FILE_NAME
+        self._config_mtime = None
+        # 按下次运行时间排序的任务堆；上次运行时间持久化，重启后补跑错过的任务
+        self.scheduler = CronScheduler(self.ai_context_dir / "cache" / SCHEDULER_STATE_FILE_NAME,
+                                       on_error=lambda job, e: self.log(f"执行任务 {job.name} 时出错: {e}", "ERROR"))
+        self.watch_changes = watch_changes
+        self.watcher = None
+        # 检查和刷新提交到线程池执行（多项目模式下共享），主循环始终能及时响应控制命令
+        self.pool = pool
+        self._owns_pool = False
+        self.log_prefix = f"[{self.project_root.name}] " if pool else ""
+        # 控制套接字（仅单项目模式；多项目模式由 MultiProjectDaemon 统一监听）
+        self.control_file = self.ai_context_dir / "cache" / "daemon.sock"
+        self.control = None
+        self.paused = False
+        self.started_at = time.time()
+        self.change_batches = 0
+        self._task_metrics = {}
+        self._metrics_lock = threading.Lock()
+        # 进程内刷新引擎，跨多次检查复用配置、索引和缓存
+        self.engine = get_engine(str(self.project_root))
+        # 直接读取 .git，比较引用快照发现新提交
+        self.git = GitReader(self.project_root)
+        self._git_snapshot = None
+        # 监听到的文件变化和新提交记录到活跃会话
+        self.tracker = SessionTracker(
+            SessionStore(self.ai_context_dir / "sessions", self.ai_context_dir / "cache" / CATALOG_DB_NAME),
+            self.project_root, git=self.git)
         
         # 确保目录存在
         self.pid_file.parent.mkdir(parents=True, exist_ok=True)
@@ -108,15 +143,7 @@ class AutoRefreshDaemon:
     
     def log(self, message: str, level: str = "INFO"):
         """记录日志"""
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        log_entry = f"[{timestamp}] [{level}] {message}\n"
-        
-        # 写入文件
-        with open(self.log_file, 'a', encoding='utf-8') as f:
-            f.write(log_entry)
-        
-        # 同时输出到控制台
-        print(f"{timestamp} [{level}] {message}")
+        _emit_log(self.logger, message, level, self.log_prefix)
     
     def start_daemon(self):
         """启动守护进程"""
@@ -138,43 +165,259 @@ class AutoRefreshDaemon:
         signal.signal(signal.SIGINT, self.signal_handler)
         signal.signal(signal.SIGTERM, self.signal_handler)
         
-        # 主循环
+        self.start_watcher()
+        if self.pool is None:
+            self.pool = FairWorkPool(1, on_error=lambda project, name, e: self.log(
+                f"执行任务 {name} 时出错: {e}", "ERROR"))
+            self._owns_pool = True
+        self.control = _open_control_server(self.control_file, self.control_handlers(), self.log)
+        
+        # 主循环：休眠到下一个任务到期、文件变化或控制命令，不再每分钟唤醒
         try:
             while self.running:
-                self.scheduler.check_and_run()
-                time.sleep(60)  # 每分钟检查一次
+                self.reload_schedule_if_changed()
+                self.scheduler.run_pending()
+                _wait_for_events([self.watcher] if self.watcher else [], self.control, self.next_timeout())
+                self.process_ready_batch()
         except KeyboardInterrupt:
             self.stop_daemon()
     
-    def setup_schedule(self):
-        """设置定时任务"""
-        # 每天早上9点检查
-        self.scheduler.add_daily_job(9, 0, self.daily_check)
-        
-        # 每周一早上进行深度检查
-        self.scheduler.add_weekly_job(0, 9, 30, self.weekly_deep_check)
-        
-        # 每小时检查代码变更（工作时间）
-        for hour in range(9, 18):  # 9AM to 6PM
-            self.scheduler.add_hourly_job(hour, self.hourly_change_check)
+    def start_watcher(self):
+        """文件变更监听（Linux inotify），不可用时只依赖定时检查"""
+        if not self.watch_changes:
+            return
+        self.watcher = create_change_watcher(self.project_root, load_exclude_dirs(self.project_root))
+        if self.watcher:
+            self.log(f"文件变更监听已启用 ({self.watcher.watch_count} 个目录)")
+            if self.watcher.watch_limit_reached:
+                self.log("inotify 监听数量达到系统上限，部分目录未被监听", "WARNING")
+        else:
+            self.log("当前平台不支持文件变更监听，仅使用定时检查", "WARNING")
+    
+    def close_watcher(self):
+        if self.watcher:
+            self.watcher.close()
+            self.watcher = None
+    
+    def next_timeout(self) -> float:
+        """距离下一个任务到期或变更批次就绪的秒数（最长 CONFIG_POLL_SECONDS）"""
+        timeout = float(CONFIG_POLL_SECONDS)
+        due = self.scheduler.seconds_until_next()
+        if due is not None:
+            timeout = min(timeout, due)
+        deadline = self.watcher.batch_deadline() if self.watcher else None
+        if deadline is not None:
+            timeout = min(timeout, max(0.0, deadline - time.monotonic()))
+        return timeout
+    
+    def process_ready_batch(self):
+        """监听器中已去抖完成的变更批次交给 handle_changes"""
+        if self.watcher:
+            changed = self.watcher.ready_batch()
+            if changed:
+                self.handle_changes(changed)
+    
+    def handle_changes(self, changed):
+        """处理一批已去抖的文件变化：记录到活跃会话，再触发刷新"""
+        self.change_batches += 1
+        self.track_session_changes(changed)
+        self.run_task("change_triggered_refresh", partial(self.change_triggered_refresh, changed))
+    
+    def run_task(self, name: str, func, manual: bool = False) -> bool:
+        """
+        执行检查/刷新任务：提交到线程池（同一项目排队中的同名任务会被合并），未启动线程池时直接执行；
+        暂停期间只执行手动触发的任务。返回任务是否新加入队列
+        """
+        if self.paused and not manual:
+            self._count_task(name, "skipped")
+            return False
+        task = partial(self._timed_task, name, func)
+        if self.pool is None:
+            task()
+            return True
+        if not self.pool.submit(str(self.project_root), name, task):
+            self._count_task(name, "coalesced")
+            self.log(f"任务 {name} 已在排队，合并执行")
+            return False
+        return True
+    
+    def _timed_task(self, name: str, func):
+        """执行任务并记录次数和耗时"""
+        started = time.perf_counter()
+        failed = True
+        try:
+            func()
+            failed = False
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._metrics_lock:
+                metrics = self._task_metrics_locked(name)
+                metrics["runs"] += 1
+                metrics["failed"] += int(failed)
+                metrics["total_seconds"] += elapsed
+                metrics["last_seconds"] = round(elapsed, 3)
+                metrics["last_finished"] = datetime.now().isoformat(timespec="seconds")
+    
+    def _count_task(self, name: str, field: str):
+        with self._metrics_lock:
+            self._task_metrics_locked(name)[field] += 1
+    
+    def _task_metrics_locked(self, name: str) -> dict:
+        return self._task_metrics.setdefault(name, {
+            "runs": 0, "failed": 0, "skipped": 0, "coalesced": 0,
+            "total_seconds": 0.0, "last_seconds": None, "last_finished": None,
+        })
+    
+    def control_handlers(self) -> dict:
+        """控制套接字命令: {命令: 处理函数(参数)}"""
+        return {
+            "status": lambda args: self.control_status(),
+            "trigger-refresh": lambda args: self.trigger_refresh(args.get("reason"), args.get("force", True)),
+            "pause": lambda args: self.set_paused(True),
+            "resume": lambda args: self.set_paused(False),
+            "reload-config": lambda args: self.reload_config(),
+            "metrics": lambda args: dict(self.control_metrics(), **_server_metrics(self.pool, self.control)),
+        }
+    
+    def control_status(self) -> dict:
+        """运行中守护进程的即时状态（定时任务、队列、暂停状态）"""
+        key = str(self.project_root)
+        jobs = sorted(self.scheduler.jobs.values(), key=lambda job: job.next_run)
+        return {
+            "project": key,
+            "pid": os.getpid(),
+            "paused": self.paused,
+            "uptime_seconds": round(time.time() - self.started_at, 1),
+            "watching": self.watcher is not None,
+            "jobs": [{
+                "name": job.name,
+                "cron": job.cron.expression,
+                "catchup": job.catchup,
+                "next_run": _isoformat(job.next_run),
+                "last_run": _isoformat(job.last_run),
+            } for job in jobs],
+            "running_task": self.pool.running().get(key) if self.pool else None,
+            "queued_tasks": self.pool.pending(key) if self.pool else 0,
+        }
+    
+    def control_metrics(self) -> dict:
+        """各任务的执行次数、失败/跳过/合并次数和耗时"""
+        with self._metrics_lock:
+            tasks = {name: dict(metrics) for name, metrics in self._task_metrics.items()}
+        for metrics in tasks.values():
+            metrics["total_seconds"] = round(metrics["total_seconds"], 3)
+        return {"tasks": tasks, "change_batches": self.change_batches}
+    
+    def trigger_refresh(self, reason=None, force: bool = True) -> dict:
+        """立即刷新（暂停期间也执行）；force 为假时先检查是否需要刷新"""
+        queued = self.run_task("manual_refresh", partial(self.manual_refresh, reason or "控制命令触发", force),
+                               manual=True)
+        return {"queued": True, "coalesced": not queued}
+    
+    def manual_refresh(self, reason: str, force: bool):
+        """控制命令触发的刷新"""
+        try:
+            if not force:
+                needs_refresh, reasons = self.engine.check()
+                if not needs_refresh:
+                    self.log("手动检查完成，无需刷新")
+                    return
+                reason = f"{reason}: {'; '.join(reasons)}"
+            self.log(f"执行手动刷新: {reason}")
+            if not self.engine.refresh(reason):
+                self.log("手动刷新失败", "ERROR")
+        except Exception as e:
+            self.log(f"手动刷新异常: {e}", "ERROR")
+    
+    def set_paused(self, paused: bool) -> dict:
+        """暂停/恢复定时任务和变更触发的刷新；暂停期间到期的任务直接跳过，会话跟踪照常进行"""
+        if self.paused != paused:
+            self.paused = paused
+            self.log("自动刷新已暂停" if paused else "自动刷新已恢复")
+        return {"paused": self.paused}
+    
+    def reload_config(self) -> dict:
+        """立即重新加载定时任务配置，返回发生变化的任务"""
+        return {"changed_jobs": self.setup_schedule()}
+    
+    def setup_schedule(self) -> list:
+        """按配置设置定时任务（表达式未变化的任务保留原有的下次运行时间），返回发生变化的任务名"""
+        self._config_mtime = self._stat_config()
+        tasks = {
+            "daily_check": self.daily_check,
+            "weekly_deep_check": self.weekly_deep_check,
+            "hourly_change_check": self.hourly_change_check,
+        }
+        schedule = {}
+        for name, (expression, catchup) in self._load_schedule_config().items():
+            if name not in tasks:
+                self.log(f"未知的定时任务: {name}", "WARNING")
+                continue
+            try:
+                CronExpression(expression)
+                if catchup not in CATCHUP_POLICIES:
+                    raise ValueError(f"未知的补跑策略: {catchup}")
+            except ValueError as e:
+                self.log(f"定时任务 {name} 配置无效，保留原设置: {e}", "ERROR")
+                job = self.scheduler.jobs.get(name)
+                if job is None:
+                    continue
+                expression, catchup = job.cron.expression, job.catchup
+            schedule[name] = (expression, partial(self.run_task, name, tasks[name]), catchup)
         
+        changed = self.scheduler.configure(schedule)
+        for name in changed:
+            job = self.scheduler.jobs.get(name)
+            if job:
+                self.log(f"定时任务 {name}: {job.cron.expression}，下次运行 {job.next_run.strftime('%Y-%m-%d %H:%M')}")
+            else:
+                self.log(f"定时任务 {name} 已移除")
         self.log("定时任务已设置")
+        return changed
+    
+    def reload_schedule_if_changed(self):
+        """配置文件修改后重新加载定时任务"""
+        if self._stat_config() != self._config_mtime:
+            self.log("配置文件已修改，重新加载定时任务")
+            self.setup_schedule()
+    
+    def _stat_config(self):
+        try:
+            return self.config_file.stat().st_mtime_ns
+        except OSError:
+            return None
+    
+    def _load_schedule_config(self) -> dict:
+        """读取 daemon.schedule 配置与默认任务合并: {任务名: (cron 表达式, 补跑策略)}"""
+        try:
+            with open(self.config_file, 'r', encoding='utf-8') as f:
+                daemon_config = json.load(f).get("daemon") or {}
+        except (OSError, ValueError, AttributeError):
+            daemon_config = {}
+        default_catchup = daemon_config.get("catchup", CATCHUP_ONCE)
+        
+        merged = dict(DEFAULT_SCHEDULE)
+        merged.update(daemon_config.get("schedule") or {})
+        schedule = {}
+        for name, spec in merged.items():
+            if not spec:
+                continue
+            if isinstance(spec, dict):
+                schedule[name] = (str(spec.get("cron", "")), spec.get("catchup", default_catchup))
+            else:
+                schedule[name] = (str(spec), default_catchup)
+        return schedule
     
     def daily_check(self):
         """每日检查"""
         self.log("执行每日上下文检查")
         
         try:
-            result = subprocess.run([
-                sys.executable, 
-                str(self.ai_context_dir / "tools" / SMART_REFRESH_SCRIPT),
-                "--auto"
-            ], capture_output=True, text=True, cwd=self.project_root)
-            
-            if result.returncode == 0:
-                self.log("每日检查完成")
+            needs_refresh, reasons = self.engine.check()
+            if needs_refresh and not self.engine.refresh(f"自动刷新: {'; '.join(reasons)}"):
+                self.log("每日检查失败: 上下文刷新失败", "ERROR")
             else:
-                self.log(f"每日检查失败: {result.stderr}", "ERROR")
+                self.log("每日检查完成")
                 
         except Exception as e:
             self.log(f"每日检查异常: {e}", "ERROR")
@@ -185,78 +428,108 @@ class AutoRefreshDaemon:
         
         try:
             # 生成详细报告
-            result = subprocess.run([
-                sys.executable,
-                str(self.ai_context_dir / "tools" / SMART_REFRESH_SCRIPT),
-                "--report"
-            ], capture_output=True, text=True, cwd=self.project_root)
+            report = self.engine.report()
+            report_text = load_tool_module("smart-refresh.py").format_refresh_report(report)
             
-            if result.returncode == 0:
-                # 保存报告
-                report_file = self.ai_context_dir / "reports" / f"weekly-report-{datetime.now().strftime('%Y%m%d')}.txt"
-                report_file.parent.mkdir(parents=True, exist_ok=True)
-                
-                with open(report_file, 'w', encoding='utf-8') as f:
-                    f.write(result.stdout)
-                
-                self.log(f"每周报告已保存: {report_file}")
-                
-                # 如果需要刷新，执行刷新
-                if "需要刷新" in result.stdout:
-                    self.log("根据周报告建议执行刷新")
-                    subprocess.run([
-                        sys.executable,
-                        str(self.ai_context_dir / "tools" / SMART_REFRESH_SCRIPT),
-                        "--auto"
-                    ], cwd=self.project_root)
-            else:
-                self.log(f"每周检查失败: {result.stderr}", "ERROR")
+            # 保存报告
+            report_file = self.ai_context_dir / "reports" / f"weekly-report-{datetime.now().strftime('%Y%m%d')}.txt"
+            report_file.parent.mkdir(parents=True, exist_ok=True)
+            
+            with open(report_file, 'w', encoding='utf-8') as f:
+                f.write(report_text)
+            
+            self.log(f"每周报告已保存: {report_file}")
+            
+            # 如果需要刷新，直接使用报告中的原因执行刷新
+            if report["需要刷新"]:
+                self.log("根据周报告建议执行刷新")
+                self.engine.refresh(f"自动刷新: {'; '.join(report['刷新原因'])}")
                 
         except Exception as e:
             self.log(f"每周检查异常: {e}", "ERROR")
     
     def hourly_change_check(self):
-        """每小时变更检查"""
-        # 只在工作日执行
-        if datetime.now().weekday() >= 5:  # 周末不执行
-            return
-        
+        """每小时变更检查（执行时间由 cron 表达式决定，默认工作日工作时间）"""
         try:
             # 检查Git是否有新的提交
-            result = subprocess.run([
-                "git", "log", "--oneline", "-n", "1", "--since='1 hour ago'"
-            ], capture_output=True, text=True, cwd=self.project_root)
-            
-            if result.returncode == 0 and result.stdout.strip():
+            if self._has_new_commits():
                 self.log("检测到新提交，执行变更检查")
                 
                 # 执行智能检查
-                check_result = subprocess.run([
-                    sys.executable,
-                    str(self.ai_context_dir / "tools" / SMART_REFRESH_SCRIPT),
-                    "--check"
-                ], capture_output=True, text=True, cwd=self.project_root)
+                needs_refresh, reasons = self.engine.check()
                 
-                if "需要刷新" in check_result.stdout:
+                if needs_refresh:
                     self.log("检测到需要刷新，执行自动刷新")
-                    subprocess.run([
-                        sys.executable,
-                        str(self.ai_context_dir / "tools" / SMART_REFRESH_SCRIPT),
-                        "--auto"
-                    ], cwd=self.project_root)
+                    self.engine.refresh(f"自动刷新: {'; '.join(reasons)}")
                     
         except Exception as e:
             self.log(f"变更检查异常: {e}", "ERROR")
     
+    def _has_new_commits(self) -> bool:
+        """
+        比较引用快照判断是否有新提交
+        首次检查时没有快照，按 HEAD 提交时间是否在最近一小时内判断
+        """
+        previous = self._git_snapshot
+        self._git_snapshot = self.git.snapshot()
+        if previous is not None:
+            return self._git_snapshot != previous
+        
+        head = self._git_snapshot.get("HEAD")
+        if not head:
+            return False
+        try:
+            committed_at = self.git.commit(head).committer_time
+        except GitReaderError:
+            return False
+        return time.time() - committed_at < NEW_COMMIT_WINDOW_SECONDS
+    
+    def track_session_changes(self, changed_paths):
+        """将本批文件变化（含删除和重命名）及新提交记录到活跃会话"""
+        try:
+            self.tracker.record_changes(self.watcher.file_events, self.watcher.renames)
+            if is_git_change(changed_paths):
+                self.tracker.record_commits()
+        except Exception as e:
+            self.log(f"记录会话变更时出错: {e}", "WARNING")
+    
+    def change_triggered_refresh(self, changed_paths):
+        """文件变更触发的刷新（已去抖）"""
+        paths = sorted(changed_paths)
+        shown = ", ".join(paths[:MAX_REPORTED_PATHS])
+        if len(paths) > MAX_REPORTED_PATHS:
+            shown += f" 等 {len(paths)} 个路径"
+        
+        try:
+            # 只有工作区文件变化（不含 Git 引用变化）时，内容指纹未变则无需刷新
+            git_changed = any(path == "." or path.startswith(".git/") for path in paths)
+            if not git_changed and not self.engine.refresher.get_content_state()["changed"]:
+                self.log(f"文件内容与上次刷新时一致，跳过刷新: {shown}")
+                return
+            
+            self.log(f"检测到文件变更，执行刷新: {shown}")
+            if not self.engine.refresh(f"文件变更: {shown}"):
+                self.log("变更刷新失败", "ERROR")
+        except Exception as e:
+            self.log(f"变更刷新异常: {e}", "ERROR")
+    
     def stop_daemon(self):
         """停止守护进程"""
         self.running = False
         
+        self.close_watcher()
+        if self.control:
+            self.control.close()
+            self.control = None
+        if self._owns_pool:
+            self.pool.shutdown(wait=False)
+        
         # 删除PID文件
         if self.pid_file.exists():
             self.pid_file.unlink()
         
         self.log("AI上下文自动刷新守护进程已停止")
+        self.logger.close()
     
     def signal_handler(self, signum, frame):
         """信号处理器"""
@@ -266,41 +539,248 @@ class AutoRefreshDaemon:
     
     def is_running(self) -> bool:
         """检查守护进程是否运行"""
-        if not self.pid_file.exists():
+        return _pid_file_running(self.pid_file)
+    
+    def get_status(self) -> dict:
+        """获取守护进程状态"""
+        return _daemon_status(self.pid_file, self.log_file)
+
+
+class MultiProjectDaemon:
+    """
+    多项目守护进程：一个进程监听注册表中的全部项目
+    每个项目保留自己的定时任务、文件监听和刷新引擎，主循环在所有监听器上 select，
+    检查和刷新提交到有界线程池，按项目轮流执行，同一项目的任务串行
+    """
+    
+    def __init__(self, registry_path=None, watch_changes: bool = True, workers: int = DEFAULT_WORKERS):
+        self.registry = ProjectRegistry(registry_path)
+        self.pid_file = self.registry.path.with_suffix(".pid")
+        self.log_file = self.registry.path.parent / "logs" / "multi-project-daemon.jsonl"
+        self.logger = JsonLineLogger(self.log_file)
+        self.watch_changes = watch_changes
+        self.workers = workers
+        self.running = False
+        self.pool = None
+        self.projects = {}
+        self._registry_signature = None
+        self.control = None
+        self.started_at = time.time()
+        
+        self.log_file.parent.mkdir(parents=True, exist_ok=True)
+    
+    def log(self, message: str, level: str = "INFO"):
+        """记录日志"""
+        _emit_log(self.logger, message, level)
+    
+    def start_daemon(self):
+        """启动多项目守护进程"""
+        if self.is_running():
+            self.log("多项目守护进程已在运行", "WARNING")
             return False
         
+        with open(self.pid_file, 'w') as f:
+            f.write(str(os.getpid()))
+        
+        self.log(f"多项目守护进程启动（注册表: {self.registry.path}，工作线程: {self.workers}）")
+        self.running = True
+        self.pool = FairWorkPool(self.workers, on_error=lambda project, name, e: self.log(
+            f"{Path(project).name} 执行任务 {name} 时出错: {e}", "ERROR"))
+        
+        signal.signal(signal.SIGINT, self.signal_handler)
+        signal.signal(signal.SIGTERM, self.signal_handler)
+        
+        self.sync_projects()
+        self.control = _open_control_server(registry_socket_path(self.registry.path),
+                                            self.control_handlers(), self.log)
+        
         try:
-            with open(self.pid_file, 'r') as f:
-                pid = int(f.read().strip())
-            
-            # 检查进程是否存在
-            os.kill(pid, 0)
-            return True
-        except (OSError, ValueError):
-            # 进程不存在，删除过期的PID文件
-            self.pid_file.unlink()
-            return False
+            while self.running:
+                self.run_once()
+        except KeyboardInterrupt:
+            self.stop_daemon()
     
-    def get_status(self) -> dict:
-        """获取守护进程状态"""
+    def run_once(self):
+        """主循环的一轮：运行到期任务，等待文件变化、控制命令或下一个任务，处理就绪的变更批次"""
+        if self.registry.signature() != self._registry_signature:
+            self.sync_projects()
+        
+        for daemon in list(self.projects.values()):
+            daemon.reload_schedule_if_changed()
+            daemon.scheduler.run_pending()
+        
+        timeout = min([daemon.next_timeout() for daemon in self.projects.values()] + [CONFIG_POLL_SECONDS])
+        watchers = [daemon.watcher for daemon in self.projects.values() if daemon.watcher]
+        _wait_for_events(watchers, self.control, timeout)
+        
+        for daemon in list(self.projects.values()):
+            if self.running:
+                daemon.process_ready_batch()
+    
+    def control_handlers(self) -> dict:
+        """控制套接字命令；参数 project 指定单个项目，省略时作用于全部项目"""
+        return {
+            "status": lambda args: self.control_status(args),
+            "trigger-refresh": lambda args: self._for_projects(
+                args, lambda daemon: daemon.trigger_refresh(args.get("reason"), args.get("force", True))),
+            "pause": lambda args: self._for_projects(args, lambda daemon: daemon.set_paused(True)),
+            "resume": lambda args: self._for_projects(args, lambda daemon: daemon.set_paused(False)),
+            "reload-config": lambda args: self.reload_config(args),
+            "metrics": lambda args: dict(self._for_projects(args, lambda daemon: daemon.control_metrics()),
+                                         **_server_metrics(self.pool, self.control)),
+        }
+    
+    def control_status(self, args: dict) -> dict:
         status = {
-            "running": self.is_running(),
-            "pid_file": str(self.pid_file),
-            "log_file": str(self.log_file)
+            "pid": os.getpid(),
+            "uptime_seconds": round(time.time() - self.started_at, 1),
+            "registry": str(self.registry.path),
+            "workers": self.workers,
         }
+        status.update(self._for_projects(args, lambda daemon: daemon.control_status()))
+        return status
+    
+    def reload_config(self, args: dict) -> dict:
+        """重新加载注册表和各项目的定时任务配置"""
+        self.sync_projects()
+        return self._for_projects(args, lambda daemon: daemon.reload_config())
+    
+    def _for_projects(self, args: dict, action) -> dict:
+        """对参数指定的项目（省略时为全部项目）执行操作: {"projects": {项目: 结果}}"""
+        project = args.get("project")
+        if project:
+            daemon = self.projects.get(Path(project).expanduser().resolve())
+            if daemon is None:
+                raise ValueError(f"项目不在监听列表中: {project}")
+            daemons = [daemon]
+        else:
+            daemons = list(self.projects.values())
+        return {"projects": {str(daemon.project_root): action(daemon) for daemon in daemons}}
+    
+    def sync_projects(self):
+        """按注册表增删项目"""
+        self._registry_signature = self.registry.signature()
+        registered = self.registry.load()
         
-        if status["running"]:
-            with open(self.pid_file, 'r') as f:
-                status["pid"] = int(f.read().strip())
+        for project in list(self.projects):
+            if project not in registered:
+                daemon = self.projects.pop(project)
+                daemon.close_watcher()
+                daemon.logger.close()
+                self.pool.discard(str(project))
+                self.log(f"已移除项目: {project}")
         
-        # 获取最近的日志
-        if self.log_file.exists():
-            with open(self.log_file, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
-                status["recent_logs"] = lines[-10:]  # 最近10条日志
+        for project in registered:
+            if project in self.projects:
+                continue
+            if not (project / ".ai-context").is_dir():
+                self.log(f"项目未部署 .ai-context，跳过: {project}", "WARNING")
+                continue
+            daemon = AutoRefreshDaemon(str(project), watch_changes=self.watch_changes, pool=self.pool)
+            if daemon.is_running():
+                # 项目已有单独运行的守护进程，避免重复刷新
+                self.log(f"项目已有守护进程在运行，跳过: {project}", "WARNING")
+                continue
+            daemon.setup_schedule()
+            daemon.start_watcher()
+            self.projects[project] = daemon
+            self.log(f"已加入项目: {project}")
         
+        self.log(f"正在监听 {len(self.projects)} 个项目")
+    
+    def stop_daemon(self):
+        """停止多项目守护进程（执行中的任务完成后退出，排队中的任务丢弃）"""
+        self.running = False
+        for daemon in self.projects.values():
+            daemon.close_watcher()
+        if self.control:
+            self.control.close()
+            self.control = None
+        if self.pool:
+            self.pool.shutdown(wait=False)
+        if self.pid_file.exists():
+            self.pid_file.unlink()
+        self.log("多项目守护进程已停止")
+        self.logger.close()
+    
+    def signal_handler(self, signum, frame):
+        """信号处理器"""
+        self.log(f"收到信号 {signum}，正在停止多项目守护进程")
+        self.stop_daemon()
+        sys.exit(0)
+    
+    def is_running(self) -> bool:
+        """检查多项目守护进程是否运行"""
+        return _pid_file_running(self.pid_file)
+    
+    def get_status(self) -> dict:
+        """获取多项目守护进程状态（含注册的项目）"""
+        status = _daemon_status(self.pid_file, self.log_file)
+        status["registry"] = str(self.registry.path)
+        status["projects"] = [str(project) for project in self.registry.load()]
         return status
 
+
+def _open_control_server(path, handlers: dict, log):
+    """创建控制套接字，失败或平台不支持时返回 None（守护进程照常运行）"""
+    server = ControlServer(path, handlers)
+    try:
+        if server.open():
+            log(f"控制套接字已启用: {server.path}")
+            return server
+        log("当前平台不支持 Unix 域套接字，控制命令不可用", "WARNING")
+    except OSError as e:
+        log(f"无法创建控制套接字: {e}", "WARNING")
+    return None
+
+
+def _wait_for_events(watchers, control, timeout: float):
+    """在文件监听器和控制套接字上等待最多 timeout 秒，读取就绪的文件事件并处理控制命令"""
+    sources = list(watchers) + ([control] if control else [])
+    if not sources:
+        time.sleep(timeout)
+        return
+    try:
+        readable, _, _ = select.select(sources, [], [], timeout)
+    except InterruptedError:
+        return
+    for source in readable:
+        if source is control:
+            control.handle_ready()
+        else:
+            source.pump()
+
+
+def _server_metrics(pool, control) -> dict:
+    """线程池和控制套接字的统计"""
+    metrics = {"control_requests": control.requests if control else 0}
+    if pool:
+        metrics["pool"] = dict(pool.stats, pending=pool.pending(), running=pool.running())
+    return metrics
+
+
+def _isoformat(value):
+    return value.isoformat(timespec="seconds") if value else None
+
+
+def _daemon_status(pid_file: Path, log_file: Path) -> dict:
+    status = {
+        "running": _pid_file_running(pid_file),
+        "pid_file": str(pid_file),
+        "log_file": str(log_file)
+    }
+    
+    if status["running"]:
+        with open(pid_file, 'r') as f:
+            status["pid"] = int(f.read().strip())
+    
+    # 从日志末尾反向读取最近的日志，耗时与日志文件大小无关
+    recent = read_recent(log_file, RECENT_LOG_COUNT)
+    if recent:
+        status["recent_logs"] = [format_record(record) for record in recent]
+    
+    return status
+
 def create_parser():
     """创建命令行参数解析器"""
     import argparse
@@ -309,7 +789,17 @@ def create_parser():
     parser.add_argument("--start", action="store_true", help="启动守护进程")
     parser.add_argument("--stop", action="store_true", help="停止守护进程")
     parser.add_argument("--status", action="store_true", help="查看状态")
-    parser.add_argument("--project", default=".", help="项目路径")
+    parser.add_argument("--project", help="项目路径（默认当前目录）")
+    parser.add_argument("--no-watch", action="store_true", help="不监听文件变更，仅定时检查")
+    parser.add_argument("--registry", nargs="?", const=str(DEFAULT_REGISTRY_PATH), metavar="PATH",
+                        help=f"多项目模式：监听注册表中的全部项目（默认 {DEFAULT_REGISTRY_PATH}）")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="多项目模式的工作线程数")
+    parser.add_argument("--add-project", metavar="PATH", help="将项目加入注册表")
+    parser.add_argument("--remove-project", metavar="PATH", help="从注册表中移除项目")
+    parser.add_argument("--list-projects", action="store_true", help="列出注册表中的项目")
+    parser.add_argument("--ctl", choices=CONTROL_COMMANDS, metavar="COMMAND",
+                        help=f"向运行中的守护进程发送控制命令: {', '.join(CONTROL_COMMANDS)}")
+    parser.add_argument("--reason", help="trigger-refresh 的刷新原因")
     
     return parser
 
@@ -350,17 +840,84 @@ def handle_status(daemon):
     print(f"📁 PID文件: {status['pid_file']}")
     print(f"📄 日志文件: {status['log_file']}")
     
+    if "projects" in status:
+        print(f"🗂️  注册表: {status['registry']}")
+        print(f"\n📦 注册的项目 ({len(status['projects'])}):")
+        for project in status["projects"]:
+            print(f"  - {project}")
+    
     if "recent_logs" in status:
         print("\n📝 最近日志:")
         for log_line in status["recent_logs"]:
             print(f"  {log_line.strip()}")
 
+def handle_registry(args):
+    """处理注册表管理命令"""
+    registry = ProjectRegistry(args.registry)
+    if args.add_project:
+        if registry.add(args.add_project):
+            print(f"✅ 已注册项目: {Path(args.add_project).resolve()}")
+        else:
+            print("⚠️  项目已在注册表中")
+    if args.remove_project:
+        if registry.remove(args.remove_project):
+            print(f"✅ 已移除项目: {Path(args.remove_project).resolve()}")
+        else:
+            print("⚠️  项目不在注册表中")
+    if args.list_projects:
+        projects = registry.load()
+        print(f"🗂️  注册表: {registry.path}")
+        for project in projects:
+            print(f"  - {project}")
+        if not projects:
+            print("  (空)")
+
+def handle_control(args):
+    """通过控制套接字向运行中的守护进程发送命令，输出 JSON 结果"""
+    command_args = {"reason": args.reason} if args.reason else {}
+    if args.registry:
+        socket_path = registry_socket_path(args.registry)
+        if args.project:
+            command_args["project"] = str(Path(args.project).resolve())
+    else:
+        socket_path = project_socket_path(args.project or ".")
+    
+    started = time.perf_counter()
+    response = send_command(socket_path, args.ctl, command_args)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    
+    if response is None:
+        if args.ctl == "trigger-refresh" and not args.registry:
+            print("⚠️  守护进程未运行，直接在当前进程中刷新")
+            if not get_engine(str(Path(args.project or ".").resolve())).refresh(args.reason or "手动刷新"):
+                sys.exit(1)
+            return
+        print(f"❌ 守护进程未运行或控制套接字不可用: {socket_path}")
+        sys.exit(1)
+    if not response.get("ok"):
+        print(f"❌ {response.get('error')}")
+        sys.exit(1)
+    
+    print(json.dumps(response.get("result"), ensure_ascii=False, indent=2))
+    print(f"⏱️  响应耗时 {elapsed_ms:.2f} ms", file=sys.stderr)
+
 def main():
     """主函数"""
     parser = create_parser()
     args = parser.parse_args()
     
-    daemon = AutoRefreshDaemon(args.project)
+    if args.add_project or args.remove_project or args.list_projects:
+        handle_registry(args)
+        return
+    
+    if args.ctl:
+        handle_control(args)
+        return
+    
+    if args.registry:
+        daemon = MultiProjectDaemon(args.registry, watch_changes=not args.no_watch, workers=args.workers)
+    else:
+        daemon = AutoRefreshDaemon(args.project or ".", watch_changes=not args.no_watch)
     
     if args.start:
         handle_start(daemon)
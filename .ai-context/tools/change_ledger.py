@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+代码变更账本
+每个新提交只调用一次 git log --numstat 统计变更行数和文件，按提交追加到
+.ai-context/cache/change_tracking.json；"上次刷新以来变更了多少行/文件"
+只需沿第一父提交回溯新提交并累加账本记录，开销与新提交数成正比
+"""
+
+import os
+import json
+import subprocess
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from git_reader import GitReader, GitReaderError  # type: ignore
+
+CHANGE_LEDGER_VERSION = 1
+
+# 没有上次刷新记录（或记录的提交已不在历史中）时统计的提交数
+DEFAULT_WINDOW = 10
+
+# 回溯查找上次刷新提交的最大步数，超过后按默认窗口统计
+MAX_WALK = 1000
+
+# 账本最多保留的提交数（按提交时间淘汰最旧的记录）
+MAX_LEDGER_COMMITS = 2000
+
+# 单次 git log 传入的最大提交数
+GIT_BATCH_SIZE = 200
+
+COMMIT_MARKER = "\x00"
+CREATE_MODE_PREFIX = " create mode "
+
+
+class ChangeLedger:
+    """按提交记录的 numstat 变更账本"""
+
+    def __init__(self, project_root, ledger_file, git: Optional[GitReader] = None):
+        self.project_root = Path(project_root).resolve()
+        self.ledger_file = Path(ledger_file)
+        self.git = git or GitReader(self.project_root)
+        self._commits: Optional[Dict[str, Dict]] = None
+        self._dirty = False
+
+    def _load(self) -> Dict[str, Dict]:
+        if self._commits is None:
+            self._commits = {}
+            try:
+                with open(self.ledger_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get("version") == CHANGE_LEDGER_VERSION:
+                    self._commits = data.get("commits", {})
+            except (OSError, json.JSONDecodeError, AttributeError):
+                pass
+        return self._commits
+
+    def save(self):
+        """写回账本文件（超出上限时淘汰最旧的提交）"""
+        if not self._dirty:
+            return
+        commits = self._load()
+        if len(commits) > MAX_LEDGER_COMMITS:
+            newest = sorted(commits, key=lambda sha: commits[sha].get("committed_at", 0), reverse=True)
+            self._commits = commits = {sha: commits[sha] for sha in newest[:MAX_LEDGER_COMMITS]}
+
+        self.ledger_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = self.ledger_file.with_suffix(".tmp")
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump({"version": CHANGE_LEDGER_VERSION, "commits": commits}, f, ensure_ascii=False)
+        os.replace(tmp_file, self.ledger_file)
+        self._dirty = False
+
+    def commits_since(self, base: Optional[str], head: Optional[str] = None) -> List[str]:
+        """
+        返回 base..head 之间沿第一父提交的新提交（从新到旧）
+        base 为空或在 MAX_WALK 步内找不到时，返回最近 DEFAULT_WINDOW 个提交
+        """
+        head = head or self.git.head()
+        if not head:
+            return []
+
+        commits = []
+        try:
+            if not base:
+                # 没有基准提交时只需读取默认窗口内的提交
+                window = self.git.iter_commits(head, limit=DEFAULT_WINDOW, first_parent=True)
+                return [commit.sha for commit in window]
+            for commit in self.git.iter_commits(head, limit=MAX_WALK, first_parent=True):
+                if commit.sha == base:
+                    return commits
+                commits.append(commit.sha)
+        except GitReaderError:
+            pass
+        return commits[:DEFAULT_WINDOW]
+
+    def ensure(self, shas: List[str]):
+        """为账本中还没有的提交补充统计（每批只调用一次 git）"""
+        commits = self._load()
+        missing = [sha for sha in shas if sha not in commits]
+        for start in range(0, len(missing), GIT_BATCH_SIZE):
+            batch = missing[start:start + GIT_BATCH_SIZE]
+            result = subprocess.run([
+                "git", "log", "--no-walk=unsorted", "-m", "--first-parent",
+                "--numstat", "--summary", "--format=%x00%H %ct", *batch
+            ], capture_output=True, text=True, cwd=self.project_root)
+            if result.returncode != 0:
+                continue
+            for sha, stats in _parse_numstat_log(result.stdout).items():
+                commits[sha] = stats
+                self._dirty = True
+
+    def summarize(self, shas: List[str]) -> Dict:
+        """累加指定提交的变更统计"""
+        commits = self._load()
+        files = set()
+        new_files = set()
+        insertions = deletions = 0
+        for sha in shas:
+            stats = commits.get(sha)
+            if not stats:
+                continue
+            insertions += stats["insertions"]
+            deletions += stats["deletions"]
+            files.update(stats["files"])
+            new_files.update(stats["new_files"])
+        return {
+            "commits": len(shas),
+            "total_files": len(files),
+            "new_files": len(new_files),
+            "insertions": insertions,
+            "deletions": deletions,
+            "total_changes": insertions + deletions
+        }
+
+    def changes_since(self, base: Optional[str]) -> Dict:
+        """统计 base 以来的变更（自动补充并保存新提交的记录）"""
+        shas = self.commits_since(base)
+        self.ensure(shas)
+        self.save()
+        return self.summarize(shas)
+
+
+def _parse_numstat_log(output: str) -> Dict[str, Dict]:
+    """解析 git log --numstat --summary --format=%x00%H %ct 输出"""
+    commits = {}
+    for block in output.split(COMMIT_MARKER)[1:]:
+        lines = block.split("\n")
+        sha, _, committed_at = lines[0].partition(" ")
+        stats = {
+            "committed_at": int(committed_at) if committed_at.isdigit() else 0,
+            "insertions": 0,
+            "deletions": 0,
+            "files": [],
+            "new_files": []
+        }
+        for line in lines[1:]:
+            if line.startswith(CREATE_MODE_PREFIX):
+                # " create mode 100644 path"
+                stats["new_files"].append(line[len(CREATE_MODE_PREFIX):].split(" ", 1)[1])
+                continue
+            fields = line.split("\t", 2)
+            if len(fields) != 3:
+                continue
+            added, deleted, path = fields
+            # 二进制文件的行数为 "-"
+            if added.isdigit():
+                stats["insertions"] += int(added)
+            if deleted.isdigit():
+                stats["deletions"] += int(deleted)
+            stats["files"].append(path)
+        commits[sha] = stats
+    return commits
@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+"""
+文件变更监听器
+基于 Linux inotify（通过 ctypes 调用 libc，仅使用标准库）递归监听项目中
+未被排除的目录，对突发的大量事件进行去抖，只在相关路径变化时通知调用方。
+非 Linux 平台或 inotify 不可用时 create_change_watcher() 返回 None，
+调用方应退回原有的定时轮询
+每次等待还会记录文件级的变化类型（新增/修改/删除）和按 cookie 配对的重命名，
+供会话跟踪使用
+"""
+
+import os
+import sys
+import errno
+import select
+import struct
+import time
+import ctypes
+import ctypes.util
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# inotify 事件常量（见 <sys/inotify.h>）
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (IN_CLOSE_WRITE | IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO
+              | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+
+EVENT_HEADER = struct.Struct("iIII")
+READ_BUFFER_SIZE = 64 * 1024
+
+# 默认去抖参数：事件停止 DEBOUNCE 秒后触发，持续有事件时最多等待 MAX_DELAY 秒
+DEFAULT_DEBOUNCE_SECONDS = 3.0
+DEFAULT_MAX_DELAY_SECONDS = 30.0
+
+# 文件级变化类型
+CHANGE_CREATED = "created"
+CHANGE_MODIFIED = "modified"
+CHANGE_DELETED = "deleted"
+
+# 工具自身写入的目录，变化不应触发刷新（否则会形成刷新循环）
+DEFAULT_IGNORE_PREFIXES = (
+    ".ai-context/cache/",
+    ".ai-context/logs/",
+    ".ai-context/reports/",
+    ".ai-context/sessions/",
+)
+
+# 编辑器临时文件
+TEMP_FILE_SUFFIXES = ("~", ".swp", ".swx", ".swo", ".tmp", ".part", ".crdownload")
+TEMP_FILE_PREFIXES = (".#",)
+
+# 只关心 .git 中能反映新提交或切换分支的文件
+GIT_RELEVANT_FILES = (".git/HEAD", ".git/packed-refs")
+GIT_REFS_PREFIX = ".git/refs/heads/"
+
+
+class InotifyWatcher:
+    """基于 inotify 的递归目录监听器"""
+
+    def __init__(self, project_root, exclude_dirs: Optional[Iterable[str]] = None,
+                 ignore_prefixes: Iterable[str] = DEFAULT_IGNORE_PREFIXES,
+                 debounce: float = DEFAULT_DEBOUNCE_SECONDS,
+                 max_delay: float = DEFAULT_MAX_DELAY_SECONDS):
+        self.project_root = Path(project_root).resolve()
+        self.exclude_dirs = set(exclude_dirs or [])
+        self.ignore_prefixes = tuple(ignore_prefixes)
+        self.debounce = debounce
+        self.max_delay = max_delay
+
+        self._libc = _load_libc()
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 失败")
+
+        self._watches: Dict[int, str] = {}
+        self.watch_limit_reached = False
+        # 最近一次 wait_for_changes 收集到的文件级变化：路径 -> 变化类型，以及 (原路径, 新路径) 重命名
+        self.file_events: Dict[str, str] = {}
+        self.renames: List[Tuple[str, str]] = []
+        self._moves: Dict[int, Tuple[str, Optional[str]]] = {}
+        # 非阻塞模式（pump/ready_batch）下正在收集的一批变化
+        self._batch: Set[str] = set()
+        self._batch_first: Optional[float] = None
+        self._batch_last: Optional[float] = None
+        self._add_tree("")
+        self._add_git_watches()
+
+    def _add_watch(self, rel_dir: str) -> bool:
+        abs_dir = os.path.join(str(self.project_root), rel_dir) if rel_dir else str(self.project_root)
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(abs_dir), WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            if err == errno.ENOSPC:
+                # 超出 fs.inotify.max_user_watches，剩余目录不再监听
+                self.watch_limit_reached = True
+            return False
+        self._watches[wd] = rel_dir
+        return True
+
+    def _add_tree(self, rel_dir: str, files: Optional[List[str]] = None):
+        """递归为目录及其未被排除的子目录添加监听，files 不为 None 时收集遍历到的文件"""
+        stack = [rel_dir]
+        while stack and not self.watch_limit_reached:
+            current = stack.pop()
+            if not self._add_watch(current):
+                continue
+            abs_dir = os.path.join(str(self.project_root), current) if current else str(self.project_root)
+            try:
+                with os.scandir(abs_dir) as it:
+                    for entry in it:
+                        child = f"{current}/{entry.name}" if current else entry.name
+                        if not entry.is_dir(follow_symlinks=False):
+                            if files is not None:
+                                files.append(child)
+                            continue
+                        if entry.name not in self.exclude_dirs and not self._is_ignored_dir(child):
+                            stack.append(child)
+            except OSError:
+                continue
+
+    def _add_git_watches(self):
+        """.git 通常被排除，但需要监听 HEAD 和分支引用以发现新提交"""
+        if not (self.project_root / ".git").is_dir():
+            return
+        self._add_watch(".git")
+        if (self.project_root / ".git" / "refs" / "heads").is_dir():
+            self._add_tree(".git/refs/heads")
+
+    def _is_ignored_dir(self, rel_dir: str) -> bool:
+        return any((rel_dir + "/").startswith(prefix) for prefix in self.ignore_prefixes)
+
+    def is_relevant(self, rel_path: str) -> bool:
+        """判断变化的路径是否需要触发刷新"""
+        if rel_path.startswith(".git/") or rel_path == ".git":
+            if rel_path.endswith(".lock"):
+                return False
+            return rel_path in GIT_RELEVANT_FILES or rel_path.startswith(GIT_REFS_PREFIX)
+        if self._is_ignored_dir(rel_path):
+            return False
+        parts = rel_path.split("/")
+        if any(part in self.exclude_dirs for part in parts[:-1]):
+            return False
+        name = parts[-1]
+        if name.endswith(TEMP_FILE_SUFFIXES) or name.startswith(TEMP_FILE_PREFIXES):
+            return False
+        return True
+
+    def fileno(self) -> int:
+        return self._fd
+
+    def _read_events(self) -> Set[str]:
+        """读取当前所有待处理事件，返回相关的变化路径"""
+        changed: Set[str] = set()
+        while True:
+            try:
+                buf = os.read(self._fd, READ_BUFFER_SIZE)
+            except OSError:
+                # 非阻塞读取时没有更多事件（EAGAIN）
+                break
+            if not buf:
+                break
+
+            offset = 0
+            while offset + EVENT_HEADER.size <= len(buf):
+                wd, mask, cookie, name_len = EVENT_HEADER.unpack_from(buf, offset)
+                offset += EVENT_HEADER.size
+                raw_name = buf[offset:offset + name_len].rstrip(b"\0")
+                offset += name_len
+
+                if mask & IN_Q_OVERFLOW:
+                    # 事件队列溢出，无法知道具体路径，按整个项目变化处理
+                    changed.add(".")
+                    continue
+
+                rel_dir = self._watches.get(wd)
+                if rel_dir is None:
+                    continue
+                if mask & IN_IGNORED:
+                    self._watches.pop(wd, None)
+                    continue
+
+                name = os.fsdecode(raw_name)
+                rel_path = f"{rel_dir}/{name}" if rel_dir and name else (name or rel_dir)
+
+                if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                    if name not in self.exclude_dirs and not self._is_ignored_dir(rel_path):
+                        # 添加监听前已写入新目录的文件不会再产生事件，逐个记为新建
+                        existing: List[str] = []
+                        self._add_tree(rel_path, existing)
+                        for file_path in existing:
+                            if not file_path.startswith(".git/"):
+                                self._record_file_event(IN_CREATE, 0, file_path)
+                            if self.is_relevant(file_path):
+                                changed.add(file_path)
+
+                if name and not mask & IN_ISDIR and not rel_path.startswith(".git/"):
+                    self._record_file_event(mask, cookie, rel_path)
+
+                if rel_path and self.is_relevant(rel_path):
+                    changed.add(rel_path)
+        return changed
+
+    def _record_file_event(self, mask: int, cookie: int, rel_path: str):
+        """记录文件级变化类型，并按 cookie 将 IN_MOVED_FROM/IN_MOVED_TO 配对为重命名"""
+        relevant = self.is_relevant(rel_path)
+        if mask & IN_MOVED_FROM:
+            self._moves[cookie] = (rel_path, self.file_events.get(rel_path))
+            if relevant:
+                # 没有配对的 IN_MOVED_TO 时视为删除（移出了监听范围）
+                self.file_events[rel_path] = CHANGE_DELETED
+        elif mask & IN_MOVED_TO:
+            source, source_change = self._moves.pop(cookie, (None, None))
+            if not relevant:
+                return
+            if source is None:
+                self._set_file_event(rel_path, CHANGE_CREATED)
+            elif not self.is_relevant(source):
+                # 编辑器先写临时文件再改名覆盖目标，相当于修改
+                self._set_file_event(rel_path, CHANGE_MODIFIED)
+            else:
+                self.file_events.pop(source, None)
+                origin = self._renamed_from(source)
+                if origin is not None:
+                    # 本批中刚改名得到的文件再次改名：合并为一次重命名
+                    self.renames.remove((origin, source))
+                    self.renames.append((origin, rel_path))
+                elif source_change == CHANGE_CREATED:
+                    self.file_events[rel_path] = CHANGE_CREATED
+                else:
+                    self.renames.append((source, rel_path))
+        elif not relevant:
+            return
+        elif mask & IN_CREATE:
+            self._set_file_event(rel_path, CHANGE_CREATED)
+        elif mask & IN_DELETE:
+            self._set_file_event(rel_path, CHANGE_DELETED)
+        elif mask & IN_CLOSE_WRITE:
+            self._set_file_event(rel_path, CHANGE_MODIFIED)
+
+    def _set_file_event(self, rel_path: str, change: str):
+        # 新建后再写入仍记为新建
+        if not (change == CHANGE_MODIFIED and self.file_events.get(rel_path) == CHANGE_CREATED):
+            self.file_events[rel_path] = change
+
+    def _renamed_from(self, rel_path: str) -> Optional[str]:
+        return next((old for old, new in self.renames if new == rel_path), None)
+
+    def wait_for_changes(self, timeout: Optional[float] = None) -> Set[str]:
+        """
+        阻塞等待相关变化（空闲时不占用 CPU）
+        收到第一个相关事件后继续收集，直到 debounce 秒内没有新事件或累计等待超过 max_delay；
+        timeout 内没有任何相关变化时返回空集合
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        changed: Set[str] = set()
+        self.file_events, self.renames, self._moves = {}, [], {}
+        first_event_at = None
+
+        while True:
+            now = time.monotonic()
+            if first_event_at is None:
+                if deadline is not None and now >= deadline:
+                    return changed
+                wait = None if deadline is None else deadline - now
+            else:
+                remaining = first_event_at + self.max_delay - now
+                if remaining <= 0:
+                    return changed
+                wait = min(self.debounce, remaining)
+
+            try:
+                readable, _, _ = select.select([self._fd], [], [], wait)
+            except InterruptedError:
+                continue
+
+            if not readable:
+                # 超时（无变化）或已安静 debounce 秒
+                return changed
+
+            new_changes = self._read_events()
+            if new_changes:
+                changed |= new_changes
+                if first_event_at is None:
+                    first_event_at = time.monotonic()
+
+    def pump(self):
+        """
+        非阻塞读取待处理事件并加入当前批次，供在多个监听器上 select 的调用方使用；
+        批次就绪后由 ready_batch() 取出，file_events/renames 对应该批次
+        """
+        if self._batch_first is None:
+            self.file_events, self.renames, self._moves = {}, [], {}
+        new_changes = self._read_events()
+        if new_changes:
+            now = time.monotonic()
+            self._batch |= new_changes
+            self._batch_last = now
+            if self._batch_first is None:
+                self._batch_first = now
+
+    def batch_deadline(self) -> Optional[float]:
+        """当前批次就绪的时间（time.monotonic()），没有待处理批次时返回 None"""
+        if self._batch_first is None:
+            return None
+        return min(self._batch_last + self.debounce, self._batch_first + self.max_delay)
+
+    def ready_batch(self, now: Optional[float] = None) -> Set[str]:
+        """安静 debounce 秒或累计超过 max_delay 后取出当前批次，尚未就绪时返回空集合"""
+        deadline = self.batch_deadline()
+        if deadline is None or (time.monotonic() if now is None else now) < deadline:
+            return set()
+        changed, self._batch = self._batch, set()
+        self._batch_first = self._batch_last = None
+        return changed
+
+    def close(self):
+        """关闭 inotify 文件描述符"""
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+            self._watches.clear()
+
+    @property
+    def watch_count(self) -> int:
+        return len(self._watches)
+
+
+def _load_libc():
+    libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+    libc.inotify_init1.argtypes = [ctypes.c_int]
+    libc.inotify_init1.restype = ctypes.c_int
+    libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+    libc.inotify_add_watch.restype = ctypes.c_int
+    return libc
+
+
+def create_change_watcher(project_root, exclude_dirs: Optional[Iterable[str]] = None,
+                          **kwargs) -> Optional[InotifyWatcher]:
+    """创建变更监听器；当前平台不支持 inotify 时返回 None"""
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        return InotifyWatcher(project_root, exclude_dirs, **kwargs)
+    except (OSError, AttributeError):
+        return None
@@ -0,0 +1,404 @@
+#!/usr/bin/env python3
+"""
+上下文工具基准测试
+在合成项目上测量 ContextGenerator、ProjectDetector、SmartContextRefresher 和 SessionManager
+各公开入口及每个章节的耗时和峰值内存，并与保存的基线对比以发现性能回退。
+
+预设形状（也可用 --files / --depth / --fanout / --commits / --sessions / --docs 单独覆盖）:
+    small     1k 文件
+    medium    100k 文件
+    large     1M 文件、10k 会话
+    sessions  1k 文件、20k 会话（会话历史规模）
+
+合成项目生成在临时目录中，形状不变时复用；每次运行前清除项目的派生缓存。
+耗时取多次运行的中位数；峰值内存为额外一次在 tracemalloc 下运行时的 Python 分配峰值
+（不含 SQLite 等 C 扩展的内存），另外报告整个进程的最大常驻内存。
+中位数超过基线 (1 + tolerance) 倍且差值超过 --min-delta 秒时判定为回退，存在回退时退出码为 1
+
+使用方法:
+python context-benchmark.py --preset small                  # 运行并与基线对比
+python context-benchmark.py --preset small --save-baseline  # 保存为新的基线
+python context-benchmark.py --preset medium --cases "generator.*" --repeat 5
+"""
+
+import fnmatch
+import gc
+import hashlib
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+import argparse
+from contextlib import redirect_stdout
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+# 添加当前目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent))
+
+from refresh_engine import load_tool_module  # type: ignore
+from file_index import FileIndex  # type: ignore
+from project_detector import ProjectDetector  # type: ignore
+from session_store import SessionStore, CATALOG_DB_NAME  # type: ignore
+from section_cache import SECTION_CACHE_FILE_NAME  # type: ignore
+from synthetic_project import SyntheticShape, generate_project, shape_matches, remove_derived_state  # type: ignore
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+PRESETS = {
+    "small": {"shape": SyntheticShape(files=1000, depth=4, fanout=8, commits=200, sessions=200, docs=20),
+              "repeat": 5},
+    "medium": {"shape": SyntheticShape(files=100000, depth=6, fanout=10, files_per_dir=40, commits=2000,
+                                       sessions=2000, docs=200),
+               "repeat": 3},
+    "large": {"shape": SyntheticShape(files=1000000, depth=7, fanout=12, files_per_dir=60, commits=10000,
+                                      sessions=10000, docs=1000),
+              "repeat": 1},
+    "sessions": {"shape": SyntheticShape(files=1000, depth=4, fanout=8, commits=200, sessions=20000, docs=20),
+                 "repeat": 5},
+}
+
+BASELINE_DIR = Path(__file__).parent.parent / "benchmarks"
+WORK_DIR = Path(tempfile.gettempdir()) / "ai-context-benchmark"
+
+# 判定回退的默认阈值：相对增幅和最小绝对差值
+DEFAULT_TOLERANCE = 0.25
+DEFAULT_MIN_DELTA_SECONDS = 0.01
+MIN_MEMORY_DELTA_KIB = 512
+
+# 冷启动用例清除缓存时保留会话索引（会话索引的重建单独测量）
+SESSION_CATALOG_PREFIX = Path(CATALOG_DB_NAME).stem
+
+
+class BenchmarkCase(NamedTuple):
+    """
+    一个基准用例：每次运行前调用 setup（不计时）得到 state，计时调用 run(state)，
+    之后调用 teardown(state)
+    """
+    name: str
+    run: Callable
+    setup: Optional[Callable] = None
+    teardown: Optional[Callable] = None
+
+
+def build_cases(project_root: Path) -> List[BenchmarkCase]:
+    """按执行顺序排列的全部用例（后面的用例依赖前面生成的缓存）"""
+    root = str(project_root)
+    generator_module = load_tool_module("context-generator.py")
+    refresh_module = load_tool_module("smart-refresh.py")
+    session_module = load_tool_module("session-manager.py")
+    ContextGenerator = generator_module.ContextGenerator
+    exclude_dirs = ContextGenerator(root).scanning_config.get('exclude_dirs', [])
+
+    def cold_generator():
+        remove_derived_state(project_root, keep_prefixes=[SESSION_CATALOG_PREFIX])
+        return ContextGenerator(root)
+
+    warm = {}
+
+    def warm_generator():
+        if "generator" not in warm:
+            warm["generator"] = ContextGenerator(root)
+            warm["generator"].generate_context_summary()
+        return warm["generator"]
+
+    def section_generator():
+        # 只清除章节缓存，元数据索引保持预热，测量的是章节本身的计算
+        try:
+            (project_root / ".ai-context" / "cache" / SECTION_CACHE_FILE_NAME).unlink()
+        except FileNotFoundError:
+            pass
+        return ContextGenerator(root)
+
+    cases = [
+        BenchmarkCase("file_index.build", lambda _: FileIndex(root, exclude_dirs).build()),
+        BenchmarkCase("project_detector.detect_project_type",
+                      lambda detector: detector.detect_project_type(), lambda: ProjectDetector(root)),
+        BenchmarkCase("project_detector.get_tech_stack",
+                      lambda detector: detector.get_tech_stack(), lambda: ProjectDetector(root)),
+        BenchmarkCase("generator.generate_context_summary.cold",
+                      lambda generator: generator.generate_context_summary(), cold_generator),
+        BenchmarkCase("generator.generate_context_summary.warm",
+                      lambda generator: generator.generate_context_summary(), warm_generator),
+    ]
+    for name, _ in ContextGenerator(root).list_sections():
+        cases.append(BenchmarkCase(f"generator.section.{name}",
+                                   lambda generator, name=name: generator.generate_section(name),
+                                   section_generator))
+
+    def new_refresher():
+        return refresh_module.SmartContextRefresher(root)
+
+    cases += [
+        BenchmarkCase("refresher.refresh_context",
+                      lambda refresher: refresher.refresh_context("benchmark"), new_refresher),
+        BenchmarkCase("refresher.check_refresh_needed",
+                      lambda refresher: refresher.check_refresh_needed(), new_refresher),
+        BenchmarkCase("refresher.generate_refresh_report",
+                      lambda refresher: refresher.generate_refresh_report(), new_refresher),
+    ]
+
+    def new_session_manager():
+        return session_module.SessionManager(root)
+
+    def end_cycle(manager):
+        # 删除本次创建的会话，保持会话数量不变；随后重建索引，避免下一次运行计入索引重建
+        for session in manager.store.recent(limit=1):
+            if session.get("title") == "基准测试会话":
+                for suffix in (".json", ".journal"):
+                    try:
+                        (manager.sessions_dir / f"{session['session_id']}{suffix}").unlink()
+                    except OSError:
+                        pass
+        manager.store.rebuild()
+
+    def session_cycle(manager):
+        manager.start_session("基准测试会话", "benchmark")
+        manager.update_session("进展")
+        manager.end_session()
+
+    cases += [
+        BenchmarkCase("session_store.rebuild", lambda store: store.rebuild(), lambda: _session_store(project_root)),
+        BenchmarkCase("session_manager.get_active_session",
+                      lambda manager: manager.get_active_session(), new_session_manager),
+        BenchmarkCase("session_manager.list_sessions",
+                      lambda manager: manager.list_sessions(limit=10), new_session_manager),
+        BenchmarkCase("session_manager.get_recent_sessions",
+                      lambda manager: manager.get_recent_sessions(days=7), new_session_manager),
+        BenchmarkCase("session_manager.session_cycle", session_cycle, new_session_manager, end_cycle),
+    ]
+    return cases
+
+
+def run_case(case: BenchmarkCase, repeat: int, measure_memory: bool) -> Dict:
+    """运行用例 repeat 次计时，measure_memory 为真时再运行一次测量峰值内存"""
+    runs = [_run_once(case)[0] for _ in range(repeat)]
+    result = {
+        "median": round(statistics.median(runs), 6),
+        "min": round(min(runs), 6),
+        "runs": [round(seconds, 6) for seconds in runs],
+    }
+    if measure_memory:
+        result["peak_kib"] = _run_once(case, trace_memory=True)[1] // 1024
+    return result
+
+
+def _run_once(case: BenchmarkCase, trace_memory: bool = False) -> Tuple[float, int]:
+    """运行一次，返回 (耗时, 峰值分配字节数)；setup 和 teardown 不计入"""
+    # 被测工具的控制台输出不计入结果
+    with redirect_stdout(io.StringIO()):
+        state = case.setup() if case.setup else None
+        gc.collect()
+        peak = 0
+        if trace_memory:
+            tracemalloc.start()
+        started = time.perf_counter()
+        try:
+            case.run(state)
+            seconds = time.perf_counter() - started
+            if trace_memory:
+                peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            if trace_memory:
+                tracemalloc.stop()
+            if case.teardown:
+                case.teardown(state)
+    return seconds, peak
+
+
+def run_benchmarks(project_root: Path, repeat: int, measure_memory: bool = True,
+                   patterns: Optional[List[str]] = None) -> Dict[str, Dict]:
+    """清除派生缓存（会话索引除外，重建为最新状态）后按顺序运行匹配 patterns 的用例"""
+    remove_derived_state(project_root, keep_prefixes=[SESSION_CATALOG_PREFIX])
+    _session_store(project_root).rebuild()
+    results = {}
+    for case in build_cases(project_root):
+        if patterns and not any(fnmatch.fnmatch(case.name, pattern) for pattern in patterns):
+            continue
+        result = run_case(case, repeat, measure_memory)
+        results[case.name] = result
+        memory = f", 峰值 {result['peak_kib']} KiB" if "peak_kib" in result else ""
+        print(f"   {case.name}: {_format_seconds(result['median'])}{memory}")
+    return results
+
+
+def _session_store(project_root: Path) -> SessionStore:
+    return SessionStore(project_root / ".ai-context" / "sessions",
+                        project_root / ".ai-context" / "cache" / CATALOG_DB_NAME)
+
+
+def compare_results(current: Dict, baseline: Dict, tolerance: float = DEFAULT_TOLERANCE,
+                    min_delta: float = DEFAULT_MIN_DELTA_SECONDS) -> List[Dict]:
+    """逐个用例与基线对比，status 为 regression / improved / ok / new"""
+    rows = []
+    base_cases = baseline.get("cases", {})
+    for name, result in current["cases"].items():
+        base = base_cases.get(name)
+        row = {"name": name, "median": result["median"], "status": "new"}
+        if base is not None:
+            row["baseline"] = base["median"]
+            row["ratio"] = round(result["median"] / base["median"], 3) if base["median"] else None
+            delta = result["median"] - base["median"]
+            if delta > min_delta and result["median"] > base["median"] * (1 + tolerance):
+                row["status"] = "regression"
+            elif -delta > min_delta and base["median"] > result["median"] * (1 + tolerance):
+                row["status"] = "improved"
+            else:
+                row["status"] = "ok"
+            if "peak_kib" in result and "peak_kib" in base:
+                row["peak_kib"] = result["peak_kib"]
+                row["baseline_peak_kib"] = base["peak_kib"]
+                if (result["peak_kib"] - base["peak_kib"] > MIN_MEMORY_DELTA_KIB
+                        and result["peak_kib"] > base["peak_kib"] * (1 + tolerance)):
+                    row["status"] = "regression"
+                    row["memory_regression"] = True
+        rows.append(row)
+    return rows
+
+
+def format_comparison(rows: List[Dict]) -> str:
+    icons = {"regression": "❌", "improved": "🚀", "ok": "✅", "new": "🆕"}
+    lines = []
+    for row in rows:
+        line = f"{icons[row['status']]} {row['name']}: {_format_seconds(row['median'])}"
+        if "baseline" in row:
+            ratio = f" ×{row['ratio']}" if row.get("ratio") is not None else ""
+            line += f"（基线 {_format_seconds(row['baseline'])}{ratio}）"
+        if row.get("memory_regression"):
+            line += f" 内存 {row['peak_kib']} KiB（基线 {row['baseline_peak_kib']} KiB）"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def _format_seconds(seconds: float) -> str:
+    if seconds < 1:
+        return f"{seconds * 1000:.2f} ms"
+    return f"{seconds:.2f} s"
+
+
+def _environment() -> Dict:
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def _max_rss_kib() -> Optional[int]:
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS 单位为字节，Linux 为 KiB
+    return rss // 1024 if sys.platform == "darwin" else rss
+
+
+def _shape_digest(shape: SyntheticShape) -> str:
+    return hashlib.sha1(json.dumps(shape._asdict(), sort_keys=True).encode('utf-8')).hexdigest()[:8]
+
+
+def _load_json(path: Path) -> Optional[Dict]:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_json(path: Path, data: Dict):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="上下文工具基准测试")
+    parser.add_argument("--preset", choices=sorted(PRESETS), default="small", help="项目形状预设")
+    for field in SyntheticShape._fields:
+        parser.add_argument(f"--{field.replace('_', '-')}", type=int, help=f"覆盖预设的 {field}")
+    parser.add_argument("--repeat", type=int, help="每个用例的计时次数（默认取预设值）")
+    parser.add_argument("--cases", nargs="+", metavar="PATTERN", help="只运行名称匹配的用例（fnmatch 模式）")
+    parser.add_argument("--no-memory", action="store_true", help="不测量峰值内存")
+    parser.add_argument("--workdir", help="合成项目目录（默认在临时目录下按形状命名；重新生成时只清空合成项目或空目录）")
+    parser.add_argument("--regenerate", action="store_true", help="重新生成合成项目")
+    parser.add_argument("--baseline", help="基线文件（默认 .ai-context/benchmarks/baseline-<预设>.json）")
+    parser.add_argument("--save-baseline", action="store_true", help="将本次结果保存为基线")
+    parser.add_argument("--output", help="将本次结果写入 JSON 文件")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="允许的相对增幅")
+    parser.add_argument("--min-delta", type=float, default=DEFAULT_MIN_DELTA_SECONDS, help="判定回退的最小差值（秒）")
+    args = parser.parse_args()
+
+    preset = PRESETS[args.preset]
+    overrides = {field: getattr(args, field) for field in SyntheticShape._fields if getattr(args, field) is not None}
+    shape = preset["shape"]._replace(**overrides)
+    repeat = args.repeat or preset["repeat"]
+    project_root = Path(args.workdir).resolve() if args.workdir else WORK_DIR / f"{args.preset}-{_shape_digest(shape)}"
+    baseline_path = Path(args.baseline) if args.baseline else BASELINE_DIR / f"baseline-{args.preset}.json"
+
+    print(f"📐 形状: {json.dumps(shape._asdict())}")
+    generated = None
+    if args.regenerate or not shape_matches(project_root, shape):
+        print(f"🏗️  生成合成项目: {project_root}")
+        try:
+            generated = generate_project(project_root, shape, work_dir=WORK_DIR)
+        except ValueError as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+        print(f"   {json.dumps(generated, ensure_ascii=False)}")
+    else:
+        print(f"♻️  复用合成项目: {project_root}")
+
+    print(f"⏱️  运行基准测试（每个用例 {repeat} 次）...")
+    current = {
+        "preset": args.preset,
+        "shape": shape._asdict(),
+        "repeat": repeat,
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "environment": _environment(),
+        "generated": generated,
+        "cases": run_benchmarks(project_root, repeat, not args.no_memory, args.cases),
+        "max_rss_kib": _max_rss_kib(),
+    }
+    print(f"📈 进程最大常驻内存: {current['max_rss_kib']} KiB")
+
+    if args.output:
+        _write_json(Path(args.output), current)
+        print(f"💾 结果已写入: {args.output}")
+
+    baseline = _load_json(baseline_path)
+    regressions = []
+    if baseline is None:
+        print(f"ℹ️  没有基线: {baseline_path}")
+    elif baseline.get("shape") != current["shape"]:
+        print("⚠️  基线的项目形状与本次不同，跳过对比")
+    else:
+        if baseline.get("environment") != current["environment"]:
+            print("⚠️  基线在不同的环境中生成，对比结果仅供参考")
+        rows = compare_results(current, baseline, args.tolerance, args.min_delta)
+        print("\n📊 与基线对比:")
+        print(format_comparison(rows))
+        regressions = [row["name"] for row in rows if row["status"] == "regression"]
+
+    if args.save_baseline:
+        if baseline is not None and args.cases:
+            # 只运行了部分用例时保留基线中的其他用例
+            current["cases"] = dict(baseline.get("cases", {}), **current["cases"])
+        _write_json(baseline_path, current)
+        print(f"💾 基线已保存: {baseline_path}")
+
+    if regressions:
+        print(f"\n❌ {len(regressions)} 个用例出现性能回退: {', '.join(regressions)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -14,6 +14,36 @@ NO_CONSTRAINTS_MSG = "- 暂无约束信息"
 NO_FILES_MSG = "- 暂无识别到重要文件"
 AI_CONTEXT_DIR = ".ai-context"
 CONFIG_FILE_NAME = "context-config.json"
+CACHE_DIR_PREFIX = f"{AI_CONTEXT_DIR}/cache/"
+
+# 摘要档位保留的条目数（完整档位不限制，由长度预算决定使用哪一档）
+FEATURES_SUMMARY_LIMIT = 5
+CONSTRAINTS_SUMMARY_LIMIT = 5
+IMPORTANT_FILES_SUMMARY_LIMIT = 50
+RECENT_FILES_SUMMARY_LIMIT = 10
+STATUS_SUMMARY_LIMIT = 8
+
+CONTEXT_TITLE = "项目上下文总结"
+
+# 输出状态：上次写出内容的哈希、写出时间和最近一次验证时间
+OUTPUT_STATE_FILE_NAME = "latest-context.state.json"
+
+# 项目状态条目的类别及其在 Markdown 中的图标
+STATUS_ICONS = {"completed": "✅", "ongoing": "🔄", "issue": "❗"}
+
+# 每个会话在最近更新中列出的提交数
+SESSION_COMMITS_LIMIT = 5
+
+# 章节优先级（数值越小越先获得长度预算）
+SECTION_PRIORITIES = {
+    "project_info": 0,
+    "project_status": 1,
+    "development_status": 2,
+    "core_features": 3,
+    "recent_updates": 4,
+    "constraints": 5,
+    "important_files": 6,
+}
 
 # 添加当前目录到Python路径
 current_dir = Path(__file__).parent
@@ -31,6 +61,19 @@ except ImportError as e:
     print("   3. 如果文件缺失，请重新创建该文件")
     sys.exit(1)
 
+from file_index import FileIndex  # type: ignore
+from metadata_index import MetadataIndex, sqlite3  # type: ignore
+from section_cache import SectionCache, SECTION_CACHE_FILE_NAME, fingerprint_inputs  # type: ignore
+from refresh_engine import load_tool_module  # type: ignore
+from git_reader import GitReader, GitReaderError, SHORT_SHA_LENGTH  # type: ignore
+from session_store import SessionIntervals  # type: ignore
+from context_budget import (  # type: ignore
+    BudgetSection, DEFAULT_MAX_CONTEXT_LENGTH, LEVELS, OMITTED_LEVEL, plan_levels, section_block, stream_with_budget,
+)
+from context_model import (  # type: ignore
+    ContextModel, ContextSection, OUTPUT_FORMATS, content_hash, markdown_header, serialize, to_markdown,
+)
+
 class ContextGenerator:
     def __init__(self, project_root):
         self.project_root = Path(project_root).resolve()  # 确保是绝对路径
@@ -39,6 +82,47 @@ class ContextGenerator:
         # 读取扫描配置
         self.scanning_config = self._load_scanning_config()
         
+        # 文件索引、项目检测结果、最近修改文件和最近会话，每次生成时重建一次，各章节共享
+        self._file_index = None
+        self._detector = None
+        self._recent_files = None
+        self._recent_sessions = None
+        # 单独计算一个章节时，最近文件只浅层遍历（不建立全量索引）
+        self._single_section = False
+        self._shallow_index = None
+        
+        # 持久化元数据索引，常驻进程中跨多次生成复用
+        self._metadata_index = MetadataIndex(self.project_root, self.scanning_config.get('exclude_dirs', []))
+        
+        # 章节级缓存：输入指纹不变时复用上次生成的章节内容
+        self.section_cache = SectionCache(self.ai_context_dir / "cache" / SECTION_CACHE_FILE_NAME)
+        
+        # 最近一次生成时各章节使用的内容档位
+        self.render_levels = {}
+        
+        # 最近一次生成的结构化上下文模型
+        self.context_model = None
+        
+        # 最近一次生成是否实际写出了文件（内容未变化时为 False）
+        self.outputs_written = False
+    
+    def _get_file_index(self):
+        """获取文件索引（首次访问时通过持久化元数据索引增量刷新）"""
+        if self._file_index is None:
+            try:
+                self._file_index = self._metadata_index.refresh().to_file_index()
+            except (sqlite3.Error, OSError):
+                # 数据库不可用时退回单次遍历
+                exclude_dirs = self.scanning_config.get('exclude_dirs', [])
+                self._file_index = FileIndex(self.project_root, exclude_dirs).build()
+        return self._file_index
+    
+    def _get_detector(self):
+        """获取基于文件索引的项目检测器"""
+        if self._detector is None:
+            self._detector = ProjectDetector(str(self.project_root), self._get_file_index())
+        return self._detector
+        
     def _load_scanning_config(self):
         """加载扫描配置"""
         default_config = self._get_default_scanning_config()
@@ -86,78 +170,256 @@ class ContextGenerator:
         return base_scanning_config
     
     def generate_context_summary(self):
-        """生成简化的上下文总结"""
-        detector = ProjectDetector(str(self.project_root))
+        """
+        生成简化的上下文总结（按 settings.max_context_length 分配各章节长度）
+        同一次生成的结构化模型同时序列化为 Markdown / JSON / MessagePack
+        除生成时间外内容未变化时不重写文件（保留原文件及其生成时间），只记录验证时间
+        """
+        return self._save_summary(list(self._iter_sections()))
+    
+    def _save_summary(self, sections):
+        """按章节优先级分配档位并写出各格式的缓存文件，返回 Markdown 文档"""
+        self.section_cache.save()
+        
+        generated_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        plan = plan_levels(markdown_header(CONTEXT_TITLE, generated_at), sections, self._get_context_budget())
+        self.render_levels = {name: level for name, (level, _) in plan.items()}
+        model = ContextModel(
+            title=CONTEXT_TITLE,
+            generated_at=generated_at,
+            project_root=str(self.project_root),
+            sections=[ContextSection(section.name, section.title, *plan[section.name], self._section_data(section.variants))
+                      for section in sections],
+        )
+        
+        formats = self._output_formats()
+        model_hash = content_hash(model)
+        state = self._load_output_state()
+        self.outputs_written = not self._outputs_current(state, model_hash, formats)
+        if self.outputs_written:
+            self.context_model = model
+            summary_md = self._write_context_outputs(model, formats)["markdown"]
+            state = {"content_hash": model_hash, "generated_at": generated_at}
+        else:
+            self.context_model = model._replace(generated_at=state["generated_at"])
+            summary_md = to_markdown(self.context_model)
+        self._save_output_state(state)
+        return summary_md
+    
+    def stream_context_summary(self, out):
+        """
+        流式生成：先输出文档头，每个章节计算完成后立即写入 out。
+        章节逐个到达，输出时只能按顺序分配长度；全部章节完成后再按章节优先级分配档位写出缓存文件，
+        因此 latest-context.* 与非流式生成的文档相同，不会缓存顺序分配的结果。
+        生成时间要等内容哈希确定后才知道（内容未变化时沿用缓存文件的时间），因此在文档末尾输出
+        """
+        header = markdown_header(CONTEXT_TITLE, datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+        out.write(f"# {CONTEXT_TITLE}\n")
+        out.flush()
+        
+        sections = []
+        for section, level, content in stream_with_budget(header, self._iter_sections(), self._get_context_budget()):
+            if level != OMITTED_LEVEL:
+                out.write(section_block(section.title, content))
+                out.flush()
+            sections.append(section)
+        self._save_summary(sections)
+        out.write(f"\n生成时间: {self.context_model.generated_at}\n")
+        out.flush()
+    
+    def _iter_sections(self):
+        """按输出顺序逐个计算章节（生成器：首次取值时才建立文件索引，流式输出可先写出文档头）"""
+        self._start_generation()
+        for spec in self._section_specs():
+            yield self._compute_section(*spec)
+    
+    def list_sections(self):
+        """全部章节的 (章节名, 标题)，按输出顺序排列（不计算内容）"""
+        return [(name, title) for name, title, _, _ in self._section_specs()]
+    
+    def generate_section(self, name):
+        """
+        只计算单个章节，返回完整档位的 ContextSection（不受长度预算影响，不写输出文件）
+        只求值该章节声明的输入，例如"最近更新"只浅层遍历到 recent_files.max_depth，不建立全量文件索引
+        """
+        spec = next((spec for spec in self._section_specs() if spec[0] == name), None)
+        if spec is None:
+            raise KeyError(f"未知章节: {name}")
+        
+        self._start_generation()
+        self._single_section = True
+        try:
+            section = self._compute_section(*spec)
+        finally:
+            self._single_section = False
+        self.section_cache.save()
+        
+        variants = section.variants
+        content = variants if isinstance(variants, str) else next(
+            (variants[level] for level in LEVELS if level in variants), "")
+        return ContextSection(section.name, section.title, LEVELS[0], content, self._section_data(variants))
+    
+    def _start_generation(self):
+        """重置本次生成共享的文件索引、项目检测结果、最近修改文件和最近会话"""
+        self._file_index = None
+        self._detector = None
+        self._recent_files = None
+        self._recent_sessions = None
+        self._shallow_index = None
+    
+    def _section_specs(self):
+        """(章节名, 标题, 输入声明函数, 生成各档位内容的函数)，按输出顺序排列；输入在计算该章节时才求值"""
+        config_input = ("file", f"{AI_CONTEXT_DIR}/{CONFIG_FILE_NAME}")
+        overview_input = ("file", f"{AI_CONTEXT_DIR}/docs/project-overview.md")
+        
+        def structure_input():
+            return ("value", self._get_file_index().fingerprint(structure_only=True))
+        
+        return [
+            ("project_info", "项目信息",
+             lambda: [config_input, structure_input(), ("value", str(self.project_root))], self._get_project_info),
+            ("core_features", "核心功能", lambda: [overview_input], self._get_core_features),
+            ("important_files", "项目结构与重要文件",
+             lambda: [config_input, structure_input()], self._get_important_files),
+            ("recent_updates", "最近更新",
+             lambda: [config_input, ("dir", f"{AI_CONTEXT_DIR}/sessions"), ("value", self._get_recent_files()),
+                      ("value", [session.get("session_id") for session in self._get_recent_sessions()])],
+             lambda: self._get_recent_updates(self._get_recent_files())),
+            ("project_status", "项目管理状态",
+             lambda: [("file", f"{AI_CONTEXT_DIR}/status/latest-status.md")], self._get_project_status),
+            ("constraints", "技术约束", lambda: [overview_input], self._get_technical_constraints),
+            ("development_status", "当前开发状态",
+             lambda: [config_input, structure_input()], self._get_development_status),
+        ]
+    
+    def _compute_section(self, name, title, inputs, builder):
+        return BudgetSection(name, title, SECTION_PRIORITIES[name], self._cached_section(name, inputs(), builder))
+    
+    def _output_formats(self):
+        """需要写出的格式：始终包含 Markdown，启用 features.multi_format_output 时加上 JSON 和 MessagePack"""
+        if self._read_config_section('features').get('multi_format_output', False):
+            return list(OUTPUT_FORMATS)
+        return ["markdown"]
+    
+    def _output_path(self, output_format):
+        return self.ai_context_dir / "cache" / f"latest-context{OUTPUT_FORMATS[output_format]}"
+    
+    def _outputs_current(self, state, model_hash, formats):
+        """上次写出的内容与本次相同且各格式文件都存在时无需重写"""
+        if state.get("content_hash") != model_hash or "generated_at" not in state:
+            return False
+        return all(self._output_path(output_format).exists() for output_format in formats)
+    
+    def _load_output_state(self):
+        state_file = self.ai_context_dir / "cache" / OUTPUT_STATE_FILE_NAME
+        try:
+            with open(state_file, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return state if isinstance(state, dict) else {}
+    
+    def _save_output_state(self, state):
+        """保存输出状态，last_verified 为最近一次确认内容的时间（无论是否重写）"""
+        state = dict(state, last_verified=datetime.now().isoformat())
+        state_file = self.ai_context_dir / "cache" / OUTPUT_STATE_FILE_NAME
+        tmp_file = self._temp_path(state_file)
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_file, state_file)
+    
+    @staticmethod
+    def _temp_path(path):
+        return path.with_name(path.name + ".tmp")
+    
+    def _write_context_outputs(self, model, formats):
+        """保存到缓存（先写临时文件再原子替换）"""
+        (self.ai_context_dir / "cache").mkdir(exist_ok=True)
+        outputs = {}
+        for output_format in formats:
+            data = serialize(model, output_format)
+            cache_file = self._output_path(output_format)
+            tmp_file = self._temp_path(cache_file)
+            if isinstance(data, bytes):
+                tmp_file.write_bytes(data)
+            else:
+                with open(tmp_file, 'w', encoding='utf-8') as f:
+                    f.write(data)
+            os.replace(tmp_file, cache_file)
+            outputs[output_format] = data
+        return outputs
+    
+    @staticmethod
+    def _section_data(variants):
+        """章节的结构化数据（builder 返回的 data 键）"""
+        return variants.get("data", {}) if isinstance(variants, dict) else {}
+    
+    def _get_context_budget(self):
+        """上下文长度预算（估算 token 数），配置为 0 或负数时不限制"""
+        settings = self._read_config_section('settings')
+        try:
+            budget = int(settings.get('max_context_length', DEFAULT_MAX_CONTEXT_LENGTH))
+        except (TypeError, ValueError):
+            budget = DEFAULT_MAX_CONTEXT_LENGTH
+        return budget if budget > 0 else None
+    
+    def _cached_section(self, name, inputs, builder):
+        """按输入指纹获取章节内容，指纹未变化时不重新计算"""
+        fingerprint = fingerprint_inputs(self.project_root, inputs)
+        return self.section_cache.get_or_compute(name, fingerprint, builder)
+    
+    def _get_project_info(self):
+        """获取项目基本信息"""
+        detector = self._get_detector()
         proj_type, _ = detector.detect_project_type()  # 使用下划线忽略未使用的变量
         tech_stack = detector.get_tech_stack()
         
         # 读取项目配置信息
         project_info = self._read_project_config()
         
-        summary = ["# 项目上下文总结"]
-        
-        # 基本项目信息
-        summary.append(f"生成时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-        summary.append("")
-        summary.append("## 项目信息")
-        summary.append(f"- 名称: {project_info.get('name', self.project_root.name)}")
-        summary.append(f"- 类型: {project_info.get('type', proj_type)}")
-        summary.append(f"- 技术栈: {', '.join(project_info.get('tech_stack', tech_stack))}")
-        summary.append(f"- 路径: {self.project_root}")
-        summary.append("")
-        
-        # 核心功能
-        summary.append("## 核心功能")
-        summary.append(self._get_core_features())
-        
-        # 项目结构与重要文件
-        summary.append("## 项目结构与重要文件")
-        summary.append(self._get_important_files())
-        
-        # 最近更新
-        summary.append("## 最近更新")
-        recent_files = self._get_recently_modified_files()
-        summary.extend(self._format_recent_files_with_sessions(recent_files))
-        
-        # 项目状态（集成手动状态记录）
-        summary.append("")
-        summary.append("## 项目管理状态")
-        project_status = self._get_project_status()
-        summary.append(project_status)
-        
-        # 技术约束
-        summary.append("")
-        summary.append("## 技术约束")
-        summary.append(self._get_technical_constraints())
-        
-        # 当前开发状态
-        summary.append("")
-        summary.append("## 当前开发状态")
-        summary.append(self._get_development_status())
-        
-        # 将列表转换为Markdown格式的字符串
-        summary_md = "\n".join(summary)
-        
-        # 保存到缓存
-        cache_file = self.ai_context_dir / "cache" / "latest-context.md"
-        cache_file.parent.mkdir(exist_ok=True)
-        with open(cache_file, 'w', encoding='utf-8') as f:
-            f.write(summary_md)
-        
-        return summary_md
+        name = project_info.get('name', self.project_root.name)
+        project_type = project_info.get('type', proj_type)
+        tech_stack = list(project_info.get('tech_stack', tech_stack))
+        full = "\n".join([
+            f"- 名称: {name}",
+            f"- 类型: {project_type}",
+            f"- 技术栈: {', '.join(tech_stack)}",
+            f"- 路径: {self.project_root}",
+        ])
+        return {
+            "full": full,
+            "counts": f"- 名称: {name}\n- 类型: {project_type}",
+            "data": {"name": name, "type": project_type, "tech_stack": tech_stack, "path": str(self.project_root)},
+        }
     
     def _read_project_config(self):
         """读取项目配置信息"""
+        return self._read_config_section('project')
+    
+    def _read_config_section(self, section):
+        """读取 context-config.json 中的某一节"""
         config_file = self.ai_context_dir / CONFIG_FILE_NAME
         if config_file.exists():
             try:
                 with open(config_file, 'r', encoding='utf-8') as f:
                     config = json.load(f)
-                    return config.get('project', {})
+                    return config.get(section, {})
             except (json.JSONDecodeError, FileNotFoundError):
                 pass
         return {}
     
+    @staticmethod
+    def _list_variants(items, summary_limit, counts_line, empty_message, data=None):
+        """列表型章节的三档内容：完整列表 / 前 summary_limit 项 / 计数，以及结构化数据（默认为条目列表）"""
+        if data is None:
+            data = {"items": items}
+        if not items:
+            return {"full": empty_message, "data": data}
+        summary = items[:summary_limit]
+        if len(items) > summary_limit:
+            summary = summary + [f"- …… 另有 {len(items) - summary_limit} 项"]
+        return {"full": "\n".join(items), "summary": "\n".join(summary), "counts": counts_line, "data": data}
+    
     def _get_core_features(self):
         """获取核心功能信息"""
         overview_file = self.ai_context_dir / "docs" / "project-overview.md"
@@ -167,14 +429,18 @@ class ContextGenerator:
         try:
             with open(overview_file, 'r', encoding='utf-8') as f:
                 content = f.read()
-            return self._extract_section_content(content, "## 核心功能", NO_FEATURES_MSG)
         except FileNotFoundError:
             return NO_FEATURES_MSG
+        
+        features = self._extract_section_lines(content, "## 核心功能")
+        return self._list_variants(
+            features, FEATURES_SUMMARY_LIMIT,
+            f"- 共 {len(features)} 项核心功能，详见 {AI_CONTEXT_DIR}/docs/project-overview.md", NO_FEATURES_MSG)
     
-    def _extract_section_content(self, content, section_header, default_message):
-        """提取指定章节的内容"""
+    def _extract_section_lines(self, content, section_header):
+        """提取指定章节的全部非空行"""
         if section_header not in content:
-            return default_message
+            return []
         
         lines = content.split('\n')
         features = []
@@ -188,7 +454,7 @@ class ContextGenerator:
             elif in_section and line.strip():
                 features.append(line.strip())
         
-        return '\n'.join(features[:5]) if features else default_message
+        return features
     
     def _get_technical_constraints(self):
         """获取技术约束信息"""
@@ -199,50 +465,58 @@ class ContextGenerator:
         try:
             with open(overview_file, 'r', encoding='utf-8') as f:
                 content = f.read()
-            return self._extract_section_content(content, "## 技术约束", NO_CONSTRAINTS_MSG)
         except FileNotFoundError:
             return NO_CONSTRAINTS_MSG
+        
+        constraints = self._extract_section_lines(content, "## 技术约束")
+        return self._list_variants(
+            constraints, CONSTRAINTS_SUMMARY_LIMIT,
+            f"- 共 {len(constraints)} 项技术约束，详见 {AI_CONTEXT_DIR}/docs/project-overview.md", NO_CONSTRAINTS_MSG)
     
     def _get_important_files(self):
         """获取重要文件列表"""
         important_files = []
-        self._scan_directory(self.project_root, important_files)
-        return "\n".join(important_files[:50]) if important_files else NO_FILES_MSG  # 增加到50个文件
+        entries = []
+        self._scan_directory("", important_files, entries=entries)
+        
+        top_dirs = [line[len("- 📁 "):] for line in important_files if line.startswith("- 📁 ")]
+        file_count = sum(1 for line in important_files if "📄" in line)
+        counts_line = f"- 共 {len(important_files) - file_count} 个目录、{file_count} 个重要文件"
+        if top_dirs:
+            counts_line += f"\n- 顶层目录: {', '.join(top_dirs)}"
+        return self._list_variants(important_files, IMPORTANT_FILES_SUMMARY_LIMIT, counts_line, NO_FILES_MSG,
+                                   data={"entries": entries})
     
-    def _scan_directory(self, path, important_files, prefix="", current_depth=0):
-        """递归扫描目录结构（基于配置）"""
+    def _scan_directory(self, rel_dir, important_files, prefix="", current_depth=0, entries=None):
+        """递归输出目录结构（基于配置，查询文件索引），entries 收集对应的结构化条目"""
         max_depth = self.scanning_config.get('max_depth', 3)
         if current_depth >= max_depth:
             return
         
-        try:
-            items = list(path.iterdir())
-            dirs = [item for item in items if item.is_dir() and self._is_important_dir(item)]
-            files = [item for item in items if item.is_file() and self._is_important_file(item)]
-            
-            # 添加重要目录
-            for directory in sorted(dirs):
-                try:
-                    important_files.append(f"{prefix}- 📁 {directory.name}/")
-                    self._scan_directory(directory, important_files, prefix + "  ", current_depth + 1)
-                except UnicodeError:
-                    # 如果有编码问题，使用纯文本版本
-                    important_files.append(f"{prefix}- [DIR] {directory.name}/")
-                    self._scan_directory(directory, important_files, prefix + "  ", current_depth + 1)
-            
-            # 添加重要文件
-            for file_path in sorted(files):
-                try:
-                    important_files.append(f"{prefix}- 📄 {file_path.name}")
-                except UnicodeError:
-                    # 如果有编码问题，使用纯文本版本
-                    important_files.append(f"{prefix}- [FILE] {file_path.name}")
-                        
-        except PermissionError:
-            pass
-        except Exception as e:
-            # 添加通用异常处理以诊断问题
-            important_files.append(f"{prefix}- [ERROR] 扫描 {path.name} 时出错: {e}")
+        items = self._get_file_index().children(rel_dir)
+        dirs = [item for item in items if item.is_dir and self._is_important_dir(item)]
+        files = [item for item in items if not item.is_dir and self._is_important_file(item)]
+        
+        # 添加重要目录
+        for directory in dirs:
+            try:
+                important_files.append(f"{prefix}- 📁 {directory.name}/")
+            except UnicodeError:
+                # 如果有编码问题，使用纯文本版本
+                important_files.append(f"{prefix}- [DIR] {directory.name}/")
+            if entries is not None:
+                entries.append({"path": directory.path, "is_dir": True, "depth": current_depth})
+            self._scan_directory(directory.path, important_files, prefix + "  ", current_depth + 1, entries)
+        
+        # 添加重要文件
+        for file_path in files:
+            try:
+                important_files.append(f"{prefix}- 📄 {file_path.name}")
+            except UnicodeError:
+                # 如果有编码问题，使用纯文本版本
+                important_files.append(f"{prefix}- [FILE] {file_path.name}")
+            if entries is not None:
+                entries.append({"path": file_path.path, "is_dir": False, "depth": current_depth})
     
     def _is_important_dir(self, directory):
         """判断是否为重要目录（基于配置）"""
@@ -273,7 +547,7 @@ class ContextGenerator:
             return False
             
         # 检查文件扩展名
-        return file_path.suffix.lower() in important_extensions
+        return os.path.splitext(file_path.name)[1].lower() in important_extensions
     
     def _get_recent_changes(self):
         """获取最近变更（改进版）"""
@@ -283,7 +557,7 @@ class ContextGenerator:
             # 获取最近修改的文件
             recent_files = self._get_recently_modified_files()
             if recent_files:
-                changes.extend(self._format_recent_files(recent_files))
+                changes.extend(self._format_recent_files(recent_files[:RECENT_FILES_SUMMARY_LIMIT]))
             
             # 尝试获取Git历史
             git_history = self._get_git_history()
@@ -299,6 +573,18 @@ class ContextGenerator:
         
         return "\n".join(changes)
     
+    def _get_recent_files(self):
+        """本次生成的最近修改文件（首次使用时收集，章节输入和内容共用）"""
+        if self._recent_files is None:
+            self._recent_files = self._get_recently_modified_files()
+        return self._recent_files
+    
+    def _get_recent_sessions(self):
+        """本次生成的最近会话（时间窗口随当前时间移动，会话 ID 列表同时作为章节输入）"""
+        if self._recent_sessions is None:
+            self._recent_sessions = self._get_session_context() or []
+        return self._recent_sessions
+    
     def _get_recently_modified_files(self):
         """获取最近修改的文件列表（基于配置）"""
         recent_config = self._get_recent_files_config()
@@ -307,9 +593,18 @@ class ContextGenerator:
         cutoff_time = datetime.now().timestamp() - (days_threshold * 24 * 3600)
         
         recent_files = []
-        self._collect_recent_files(self.project_root, recent_files, cutoff_time, max_depth)
+        self._collect_recent_files(self._get_recent_files_index(max_depth), "", recent_files, cutoff_time, max_depth)
         return sorted(recent_files, key=lambda x: x[1], reverse=True)
     
+    def _get_recent_files_index(self, max_depth):
+        """最近文件使用的索引：已有全量索引时直接复用；单独计算章节时只遍历到 max_depth 层"""
+        if self._file_index is not None or not self._single_section:
+            return self._get_file_index()
+        if self._shallow_index is None:
+            exclude_dirs = self.scanning_config.get('exclude_dirs', [])
+            self._shallow_index = FileIndex(self.project_root, exclude_dirs, max_depth=max_depth).build()
+        return self._shallow_index
+    
     def _get_recent_files_config(self):
         """获取最近文件配置"""
         recent_config = self.scanning_config
@@ -324,53 +619,82 @@ class ContextGenerator:
                     pass
         return recent_config
     
-    def _collect_recent_files(self, path, recent_files, cutoff_time, max_depth, current_depth=0):
-        """递归收集最近修改的文件"""
+    def _collect_recent_files(self, index, rel_dir, recent_files, cutoff_time, max_depth, current_depth=0):
+        """递归收集最近修改的文件（查询文件索引）"""
         if current_depth >= max_depth:
             return
-            
-        try:
-            for item in path.iterdir():
-                if item.is_dir() and self._is_important_dir(item):
-                    self._collect_recent_files(item, recent_files, cutoff_time, max_depth, current_depth + 1)
-                elif item.is_file() and self._is_recent_file(item, cutoff_time):
-                    rel_path = item.relative_to(self.project_root)
-                    recent_files.append((str(rel_path), item.stat().st_mtime))
-        except PermissionError:
-            pass
+        
+        for item in index.children(rel_dir):
+            if item.is_dir:
+                if self._is_important_dir(item):
+                    self._collect_recent_files(index, item.path, recent_files, cutoff_time, max_depth,
+                                               current_depth + 1)
+            elif item.path.startswith(CACHE_DIR_PREFIX):
+                # 跳过工具自身生成的缓存文件
+                continue
+            elif self._is_recent_file(item, cutoff_time):
+                recent_files.append((os.path.normpath(item.path), item.mtime))
     
     def _is_recent_file(self, item, cutoff_time):
         """判断文件是否为最近修改的文件"""
-        if item.stat().st_mtime <= cutoff_time:
+        if item.mtime <= cutoff_time:
             return False
         return self._is_important_file(item) or not item.name.startswith('.')
     
+    def _get_recent_updates(self, recent_files):
+        """最近更新章节：完整列表 / 最近 10 个文件 / 计数"""
+        # 会话区间只解析一次；会话中跟踪到的文件直接归属，其余文件按 mtime 二分查找所属会话
+        sessions = SessionIntervals(self._get_recent_sessions())
+        tracked = self._tracked_files(sessions)
+        days_threshold = self._get_recent_files_config().get('days_threshold', 7)
+        data = self._recent_files_data(recent_files, sessions, tracked, days_threshold)
+        if not recent_files:
+            return {"full": "\n".join(self._format_recent_files_with_sessions(recent_files, sessions, tracked)),
+                    "data": data}
+        
+        latest_path, latest_mtime = recent_files[0]
+        latest_time = datetime.fromtimestamp(latest_mtime).strftime("%Y-%m-%d %H:%M")
+        summary_files = recent_files[:RECENT_FILES_SUMMARY_LIMIT]
+        return {
+            "full": "\n".join(self._format_recent_files_with_sessions(recent_files, sessions, tracked)),
+            "summary": "\n".join(self._format_recent_files_with_sessions(summary_files, sessions, tracked)),
+            "counts": f"- 最近 {days_threshold} 天修改了 {len(recent_files)} 个文件，最新: {latest_path} ({latest_time})",
+            "data": data,
+        }
+    
+    def _recent_files_data(self, recent_files, sessions, tracked, days_threshold):
+        """最近更新的结构化数据：文件（含所属会话）和最近的会话（含跟踪到的文件变化和提交）"""
+        files = []
+        for file_path, mtime in recent_files:
+            session = self._find_file_session(file_path, mtime, sessions, tracked)
+            files.append({"path": file_path, "mtime": mtime, "session_id": session["session_id"] if session else None})
+        
+        session_fields = ("session_id", "title", "description", "status", "start_time", "end_time",
+                          "files_modified", "git_commits")
+        session_list = [{field: session.get(field) for field in session_fields} for session in sessions.sessions]
+        return {"days_threshold": days_threshold, "files": files, "sessions": session_list}
+    
     def _format_recent_files(self, recent_files):
         """格式化最近修改的文件列表"""
         changes = ["## 最近修改的文件:"]
-        for file_path, mtime in recent_files[:10]:
+        for file_path, mtime in recent_files:
             mod_time = datetime.fromtimestamp(mtime).strftime("%Y-%m-%d %H:%M")
             changes.append(f"- {file_path} ({mod_time})")
         return changes
     
     def _get_git_history(self):
-        """获取Git提交历史"""
+        """获取Git提交历史（直接读取 .git，等同于 git log --oneline -5）"""
         try:
-            import subprocess
-            result = subprocess.run(
-                ["git", "log", "--oneline", "-5"],
-                capture_output=True, text=True, cwd=self.project_root
-            )
-            if result.returncode == 0 and result.stdout.strip():
-                return [f"- {line}" for line in result.stdout.strip().split('\n')]
-        except Exception:
-            pass
+            commits = GitReader(self.project_root).recent_commits(5)
+        except (OSError, GitReaderError):
+            return None
+        if commits:
+            return [f"- {commit.short_sha} {commit.subject}" for commit in commits]
         return None
     
     def _get_development_status(self):
         """获取当前开发状态"""
-        detector = ProjectDetector(str(self.project_root))
-        proj_type, _ = detector.detect_project_type()
+        proj_type, _ = self._get_detector().detect_project_type()
         
         status_info = []
         
@@ -382,7 +706,10 @@ class ContextGenerator:
         # 通用文档检查
         self._check_documentation_status(status_info)
         
-        return "\n".join([f"- {info}" for info in status_info]) or "- 项目刚开始"
+        return {
+            "full": "\n".join([f"- {info}" for info in status_info]) or "- 项目刚开始",
+            "data": {"items": status_info},
+        }
     
     def _check_context_system_status(self):
         """检查上下文管理系统状态"""
@@ -410,11 +737,12 @@ class ContextGenerator:
     
     def _check_tools_status(self):
         """检查工具脚本状态"""
-        tools_dir = self.project_root / AI_CONTEXT_DIR / "tools"
-        if not tools_dir.exists():
+        index = self._get_file_index()
+        tools_dir = f"{AI_CONTEXT_DIR}/tools"
+        if not index.exists(tools_dir):
             return "⏳ 核心工具脚本未开始"
         
-        tool_files = [f for f in tools_dir.glob("*.py") if f.name != "__init__.py"]
+        tool_files = [f for f in index.glob("*.py", under=tools_dir) if f.name != "__init__.py"]
         if tool_files:
             return f"✅ 核心工具脚本 ({len(tool_files)} 个工具)"
         else:
@@ -422,54 +750,51 @@ class ContextGenerator:
     
     def _check_config_status(self):
         """检查配置文件状态"""
-        config_file = self.project_root / AI_CONTEXT_DIR / CONFIG_FILE_NAME
-        return "✅ 配置系统已完成" if config_file.exists() else "⏳ 配置系统未完成"
+        config_file = f"{AI_CONTEXT_DIR}/{CONFIG_FILE_NAME}"
+        return "✅ 配置系统已完成" if self._get_file_index().exists(config_file) else "⏳ 配置系统未完成"
     
     def _check_vscode_integration(self):
         """检查VS Code集成状态"""
-        vscode_dir = self.project_root / ".vscode"
-        if not vscode_dir.exists():
+        index = self._get_file_index()
+        if not index.exists(".vscode"):
             return "⏳ VS Code集成未开始"
         
-        tasks_file = vscode_dir / "tasks.json"
-        return "✅ VS Code任务集成完成" if tasks_file.exists() else "⏳ VS Code任务集成未完成"
+        return "✅ VS Code任务集成完成" if index.exists(".vscode/tasks.json") else "⏳ VS Code任务集成未完成"
     
     def _check_templates_status(self):
         """检查模板系统状态"""
-        templates_dir = self.project_root / AI_CONTEXT_DIR / "templates"
-        if templates_dir.exists() and list(templates_dir.glob("*.md")):
+        if self._get_file_index().any("*.md", under=f"{AI_CONTEXT_DIR}/templates"):
             return "✅ 模板系统已完成"
         else:
             return "⏳ 模板系统未完成"
     
     def _check_cache_status(self):
         """检查缓存系统状态"""
-        cache_dir = self.project_root / AI_CONTEXT_DIR / "cache"
-        if cache_dir.exists() and list(cache_dir.glob("*.md")):
+        if self._get_file_index().any("*.md", under=f"{AI_CONTEXT_DIR}/cache"):
             return "✅ 缓存系统正常运行"
         else:
             return "⏳ 缓存系统未启用"
     
     def _check_deploy_script_status(self):
         """检查部署脚本状态"""
-        deploy_script = self.project_root / "deploy-ai-context.py"
-        return "✅ 快速部署脚本完成" if deploy_script.exists() else "⏳ 快速部署脚本未完成"
+        deploy_script = "deploy-ai-context.py"
+        return "✅ 快速部署脚本完成" if self._get_file_index().exists(deploy_script) else "⏳ 快速部署脚本未完成"
     
     def _check_traditional_project_status(self):
         """检查传统项目状态"""
         status_info = []
+        index = self._get_file_index()
         
         # 检查数据库
-        db_files = list(self.project_root.glob("**/*.db"))
+        db_files = index.glob("**/*.db")
         if db_files:
             status_info.append(f"✅ 数据库已创建 ({len(db_files)} 个数据库文件)")
         else:
             status_info.append("⏳ 数据库未创建")
         
         # 检查后端代码
-        backend_dir = self.project_root / "backend"
-        if backend_dir.exists():
-            backend_files = list(backend_dir.glob("**/*.py"))
+        if index.exists("backend"):
+            backend_files = index.glob("**/*.py", under="backend")
             if backend_files:
                 status_info.append(f"🔧 后端开发中 ({len(backend_files)} 个Python文件)")
             else:
@@ -489,14 +814,14 @@ class ContextGenerator:
     
     def _check_frontend_status(self):
         """检查前端代码状态"""
-        frontend_dir = self.project_root / "frontend"
-        if not frontend_dir.exists():
+        index = self._get_file_index()
+        if not index.exists("frontend"):
             return "⏳ 前端代码未开始"
         
         frontend_files = []
-        frontend_files.extend(list(frontend_dir.glob("**/*.html")))
-        frontend_files.extend(list(frontend_dir.glob("**/*.js")))
-        frontend_files.extend(list(frontend_dir.glob("**/*.css")))
+        frontend_files.extend(index.glob("**/*.html", under="frontend"))
+        frontend_files.extend(index.glob("**/*.js", under="frontend"))
+        frontend_files.extend(index.glob("**/*.css", under="frontend"))
         
         if frontend_files:
             return f"🎨 前端开发中 ({len(frontend_files)} 个前端文件)"
@@ -505,17 +830,17 @@ class ContextGenerator:
     
     def _check_test_status(self):
         """检查测试代码状态"""
-        tests_dir = self.project_root / "tests"
-        if tests_dir.exists():
-            test_files = list(tests_dir.glob("**/*.py"))
+        index = self._get_file_index()
+        if index.exists("tests"):
+            test_files = index.glob("**/*.py", under="tests")
             if test_files:
                 return f"🧪 测试代码 ({len(test_files)} 个测试文件)"
         return "⏳ 测试代码未编写"
     
     def _check_documentation_status(self, status_info):
         """检查文档状态"""
-        doc_files = list(self.project_root.glob("**/*.md"))
-        doc_count = len([f for f in doc_files if AI_CONTEXT_DIR not in str(f)])
+        doc_files = self._get_file_index().glob("**/*.md")
+        doc_count = len([f for f in doc_files if AI_CONTEXT_DIR not in f.path.split('/')])
         if doc_count > 0:
             status_info.append(f"📚 项目文档 ({doc_count} 个文档文件)")
     
@@ -532,7 +857,7 @@ class ContextGenerator:
                 
             # 提取关键信息
             lines = content.split('\n')
-            status_summary = []
+            status_items = []
             current_section = None
             
             for line in lines:
@@ -548,13 +873,18 @@ class ContextGenerator:
                 elif line.startswith('## 重要说明'):
                     current_section = 'notes'
                 elif line.startswith('- [x]') and current_section == 'completed':
-                    status_summary.append(f"✅ {line[6:].strip()}")
+                    status_items.append(("completed", line[6:].strip()))
                 elif line.startswith('- [ ]') and current_section == 'ongoing':
-                    status_summary.append(f"🔄 {line[6:].strip()}")
+                    status_items.append(("ongoing", line[6:].strip()))
                 elif line.startswith('1.') and current_section == 'issues':
-                    status_summary.append(f"❗ {line[3:].strip()}")
-                    
-            return '\n'.join(status_summary[:8])  # 限制显示条目
+                    status_items.append(("issue", line[3:].strip()))
+            
+            status_summary = [f"{STATUS_ICONS[state]} {text}" for state, text in status_items]
+            counts = {state: sum(1 for item_state, _ in status_items if item_state == state) for state in STATUS_ICONS}
+            counts_line = (f"✅ 已完成 {counts['completed']} 项，🔄 进行中 {counts['ongoing']} 项，"
+                           f"❗ 待处理问题 {counts['issue']} 项")
+            data = {"items": [{"state": state, "text": text} for state, text in status_items]}
+            return self._list_variants(status_summary, STATUS_SUMMARY_LIMIT, counts_line, "", data=data)
             
         except Exception as e:
             return f"读取项目状态时出错: {e}"
@@ -562,21 +892,8 @@ class ContextGenerator:
     def _get_session_context(self):
         """获取会话上下文信息"""
         try:
-            # 导入会话管理器
-            session_manager_path = self.ai_context_dir / "tools" / "session-manager.py"
-            if not session_manager_path.exists():
-                return None
-            
-            # 动态导入
-            import importlib.util
-            spec = importlib.util.spec_from_file_location("session_manager", session_manager_path)
-            
-            if spec is None or spec.loader is None:
-                print(f"无法从路径加载模块: {session_manager_path}")
-                return None
-                
-            session_manager_module = importlib.util.module_from_spec(spec)
-            spec.loader.exec_module(session_manager_module)
+            # 导入会话管理器（同一进程内只加载一次）
+            session_manager_module = load_tool_module("session-manager.py")
             
             # 创建会话管理器实例
             manager = session_manager_module.SessionManager(str(self.project_root))
@@ -588,15 +905,35 @@ class ContextGenerator:
         except Exception:
             return None
     
-    def _format_recent_files_with_sessions(self, recent_files):
+    def _tracked_files(self, sessions):
+        """会话中跟踪到的文件变化：路径 -> (会话, 条目)，同一路径以开始较晚的会话为准"""
+        tracked = {}
+        for session in sorted(sessions.sessions, key=lambda s: s.get("start_time") or ""):
+            for entry in session.get("files_modified") or []:
+                if isinstance(entry, dict) and entry.get("path"):
+                    tracked[entry["path"]] = (session, entry)
+        return tracked
+    
+    def _find_file_session(self, file_path, mtime, sessions, tracked):
+        """文件所属会话：优先使用会话跟踪记录，会话结束后又被修改的文件按 mtime 查找"""
+        hit = tracked.get(file_path.replace(os.sep, "/"))
+        if hit:
+            session = hit[0]
+            try:
+                ended = session.get("end_time") and mtime > datetime.fromisoformat(session["end_time"]).timestamp()
+            except (TypeError, ValueError):
+                ended = False
+            if not ended:
+                return session
+        return sessions.find(mtime)
+    
+    def _format_recent_files_with_sessions(self, recent_files, sessions, tracked=None):
         """格式化最近修改的文件列表，包含会话信息"""
-        session_context = self._get_session_context()
-        
-        if not session_context:
+        if not sessions:
             return self._format_recent_files(recent_files)
         
         changes = ["## 最近修改的文件:"]
-        sessions_by_time, unassigned_files = self._group_files_by_session(recent_files[:10], session_context)
+        sessions_by_time, unassigned_files = self._group_files_by_session(recent_files, sessions, tracked or {})
         
         # 输出按会话分组的文件
         self._append_session_files(changes, sessions_by_time)
@@ -606,35 +943,34 @@ class ContextGenerator:
         
         return changes
     
-    def _group_files_by_session(self, recent_files, session_context):
-        """按会话分组文件"""
+    def _group_files_by_session(self, recent_files, sessions, tracked=None):
+        """按会话分组文件（sessions 为 SessionIntervals，tracked 为会话跟踪到的文件变化）"""
+        tracked = tracked or {}
         sessions_by_time = {}
         unassigned_files = []
         
+        def group(session):
+            session_key = session["session_id"]
+            if session_key not in sessions_by_time:
+                sessions_by_time[session_key] = {"session": session, "files": [], "removed": []}
+            return sessions_by_time[session_key]
+        
+        listed = set()
         for file_path, mtime in recent_files:
-            file_time = datetime.fromtimestamp(mtime)
-            session_key = self._find_file_session(file_time, session_context)
-            
-            if session_key:
-                session = next(s for s in session_context if s["session_id"] == session_key)
-                if session_key not in sessions_by_time:
-                    sessions_by_time[session_key] = {"session": session, "files": []}
-                sessions_by_time[session_key]["files"].append((file_path, mtime))
+            session = self._find_file_session(file_path, mtime, sessions, tracked)
+            if session:
+                group(session)["files"].append((file_path, mtime))
+                listed.add(file_path.replace(os.sep, "/"))
             else:
                 unassigned_files.append((file_path, mtime))
         
+        # 已删除的文件和 mtime 不在时间范围内的重命名文件不会出现在扫描结果中，按跟踪记录补充
+        for path, (session, entry) in tracked.items():
+            if path not in listed and entry.get("change") in ("deleted", "renamed"):
+                group(session)["removed"].append(entry)
+        
         return sessions_by_time, unassigned_files
     
-    def _find_file_session(self, file_time, session_context):
-        """查找文件所属的会话"""
-        for session in session_context:
-            start_time = datetime.fromisoformat(session["start_time"])
-            end_time = datetime.fromisoformat(session["end_time"]) if session.get("end_time") else datetime.now()
-            
-            if start_time <= file_time <= end_time:
-                return session["session_id"]
-        return None
-    
     def _append_session_files(self, changes, sessions_by_time):
         """添加会话文件到输出"""
         for session_data in sessions_by_time.values():
@@ -648,12 +984,37 @@ class ContextGenerator:
             if session.get("description"):
                 changes.append(f"   📝 {session['description']}")
             
+            tracked_entries = {entry.get("path"): entry for entry in session.get("files_modified") or []
+                               if isinstance(entry, dict)}
             for file_path, mtime in sorted(files, key=lambda x: x[1], reverse=True):
                 mod_time = datetime.fromtimestamp(mtime).strftime("%H:%M")
-                changes.append(f"   - {file_path} ({mod_time})")
+                note = self._renamed_note(tracked_entries.get(file_path.replace(os.sep, "/")))
+                changes.append(f"   - {file_path} ({mod_time}{note})")
+            
+            for entry in session_data.get("removed", []):
+                entry_time = self._format_entry_time(entry.get("time"))
+                if entry.get("change") == "deleted":
+                    changes.append(f"   - {entry['path']} (已删除 {entry_time})")
+                else:
+                    changes.append(f"   - {entry['path']} ({entry_time}{self._renamed_note(entry)})")
+            
+            for commit in (session.get("git_commits") or [])[-SESSION_COMMITS_LIMIT:]:
+                if isinstance(commit, dict) and commit.get("sha"):
+                    changes.append(f"   🔖 {commit['sha'][:SHORT_SHA_LENGTH]} {commit.get('subject', '')}")
             
             changes.append("")
     
+    def _renamed_note(self, entry):
+        if entry and entry.get("change") == "renamed" and entry.get("from"):
+            return f", 由 {entry['from']} 重命名"
+        return ""
+    
+    def _format_entry_time(self, value):
+        try:
+            return datetime.fromisoformat(value).strftime("%H:%M")
+        except (TypeError, ValueError):
+            return "--:--"
+    
     def _format_session_time_range(self, session):
         """格式化会话时间范围"""
         start_time = datetime.fromisoformat(session["start_time"]).strftime("%H:%M")
@@ -672,8 +1033,38 @@ class ContextGenerator:
                 changes.append(f"- {file_path} ({mod_time})")
 
 if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="上下文信息生成器")
+    parser.add_argument("--cache-stats", action="store_true", help="显示章节缓存命中统计")
+    parser.add_argument("--auto-refresh", action="store_true", help="由智能刷新工具调用")
+    parser.add_argument("--reason", default="", help="刷新原因")
+    parser.add_argument("--format", choices=list(OUTPUT_FORMATS), default="markdown",
+                        help="输出到控制台的格式（缓存中的各格式文件由同一次生成写出）")
+    parser.add_argument("--stream", action="store_true", help="流式输出：每个章节生成后立即输出（仅 markdown）")
+    args = parser.parse_args()
+    
     generator = ContextGenerator(".")
+    if args.stream:
+        if args.format != "markdown":
+            parser.error("--stream 仅支持 markdown 格式")
+        try:
+            # 控制台编码无法显示的字符（如 Windows 下的 emoji）直接替换，不中断输出
+            sys.stdout.reconfigure(errors='replace')
+        except AttributeError:
+            pass
+        generator.stream_context_summary(sys.stdout)
+        if args.cache_stats:
+            print(generator.section_cache.format_stats())
+        sys.exit(0)
+    
     summary = generator.generate_context_summary()
+    if args.format != "markdown":
+        summary = serialize(generator.context_model, args.format)
+    if isinstance(summary, bytes):
+        sys.stdout.buffer.write(summary)
+        sys.stdout.buffer.flush()
+        sys.exit(0)
     
     # 处理 Windows 控制台编码问题
     try:
@@ -692,3 +1083,6 @@ if __name__ == "__main__":
             with open(output_file, 'w', encoding='utf-8') as f:
                 f.write(summary)
             print(f"上下文已输出到文件: {output_file}")
+    
+    if args.cache_stats:
+        print(generator.section_cache.format_stats())
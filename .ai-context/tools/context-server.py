@@ -0,0 +1,583 @@
+#!/usr/bin/env python3
+"""
+本地上下文服务
+在内存中保存最新生成的上下文（完整模型和各章节），通过 HTTP / JSON-RPC 提供给编辑器插件。
+响应带 ETag 和版本号，客户端携带 If-None-Match 时内容未变化直接返回 304，
+重复读取只是内存查找，不会重新生成或扫描项目；
+刷新完成（本服务、守护进程或命令行触发）后通过 Server-Sent Events 推送变更通知。
+只监听 127.0.0.1，并校验 Host / Origin 头，拒绝非本机访问；
+POST /rpc 要求 Content-Type: application/json（跨站表单无法不经预检发出这种请求）
+
+接口:
+    GET  /version              {"version", "etag", "generated_at"}（?wait=版本号 时长轮询到出现更新的版本）
+    GET  /context              完整上下文模型（JSON）
+    GET  /context.md           Markdown 上下文
+    GET  /sections             章节列表（名称、标题、档位、ETag）
+    GET  /sections/<name>      单个章节（含结构化数据）
+    GET  /events               刷新通知（text/event-stream，支持 Last-Event-ID 续传）
+    POST /rpc                  JSON-RPC 2.0: context.version / context.get / context.sections /
+                               context.section / context.wait / context.refresh
+
+使用方法:
+python context-server.py                  # 启动（随机端口，地址写入 .ai-context/cache/context-server.json）
+python context-server.py --port 8765      # 指定端口
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import signal
+import threading
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, NamedTuple, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlsplit
+
+# 添加当前目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent))
+
+from refresh_engine import get_engine, load_tool_module  # type: ignore
+from context_model import ContextModel, content_hash, load_context, to_markdown  # type: ignore
+from control_socket import request_daemon  # type: ignore
+
+SERVER_HOST = "127.0.0.1"
+SERVER_INFO_FILE_NAME = "context-server.json"
+# 检查输出状态文件（是否有新的刷新结果）的间隔
+STATE_POLL_SECONDS = 1.0
+# 长轮询和 context.wait 的最长等待时间
+MAX_WAIT_SECONDS = 60
+# 事件流在没有刷新时发送心跳的间隔
+EVENT_HEARTBEAT_SECONDS = 15
+MAX_RPC_BODY_BYTES = 1024 * 1024
+
+LOOPBACK_HOSTS = ("127.0.0.1", "localhost", "[::1]")
+# 允许的 Origin（VS Code webview 和本机页面）；插件宿主进程的请求不带 Origin
+ALLOWED_ORIGIN_SCHEMES = ("vscode-webview",)
+
+JSON_CONTENT_TYPE = "application/json; charset=utf-8"
+MARKDOWN_CONTENT_TYPE = "text/markdown; charset=utf-8"
+
+# JSON-RPC 错误码
+RPC_PARSE_ERROR = -32700
+RPC_INVALID_REQUEST = -32600
+RPC_METHOD_NOT_FOUND = -32601
+RPC_INVALID_PARAMS = -32602
+RPC_INTERNAL_ERROR = -32603
+
+
+class RawJSON(bytes):
+    """已序列化的 JSON，编码响应时原样拼接，避免重复序列化大对象"""
+
+
+def encode_json(value) -> bytes:
+    """序列化为紧凑 JSON，dict / list 中的 RawJSON 原样拼接"""
+    if isinstance(value, RawJSON):
+        return bytes(value)
+    if isinstance(value, dict):
+        return b"{" + b",".join(json.dumps(str(key), ensure_ascii=False).encode('utf-8') + b":" + encode_json(item)
+                                for key, item in value.items()) + b"}"
+    if isinstance(value, (list, tuple)):
+        return b"[" + b",".join(encode_json(item) for item in value) + b"]"
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode('utf-8')
+
+
+def _dumps(value) -> RawJSON:
+    return RawJSON(json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode('utf-8'))
+
+
+class ContextSnapshot(NamedTuple):
+    """某一版本上下文的预序列化快照（创建后只读，可在线程间共享）"""
+    version: int
+    etag: str
+    generated_at: str
+    model: ContextModel
+    context_body: RawJSON
+    markdown_body: bytes
+    sections_body: RawJSON
+    section_bodies: Dict[str, Tuple[str, RawJSON]]   # 章节名 -> (ETag, JSON)
+    changed_sections: Tuple[str, ...]                # 与上一版本相比内容变化的章节
+
+    def version_info(self) -> Dict:
+        return {"version": self.version, "etag": self.etag, "generated_at": self.generated_at}
+
+
+def build_snapshot(version: int, model: ContextModel, model_hash: str,
+                   previous: Optional[ContextSnapshot] = None) -> ContextSnapshot:
+    """序列化模型和各章节，计算章节 ETag 及相对上一版本的变化"""
+    section_bodies = {}
+    section_list = []
+    for section in model.sections:
+        body = _dumps(section._asdict())
+        etag = f'"{hashlib.blake2b(body, digest_size=8).hexdigest()}"'
+        section_bodies[section.name] = (etag, body)
+        section_list.append({"name": section.name, "title": section.title, "level": section.level, "etag": etag})
+
+    if previous is None:
+        changed = tuple(section_bodies)
+    else:
+        changed = tuple(name for name, (etag, _) in section_bodies.items()
+                        if previous.section_bodies.get(name, (None,))[0] != etag)
+    return ContextSnapshot(
+        version=version,
+        etag=f'"{model_hash}"',
+        generated_at=model.generated_at,
+        model=model,
+        context_body=_dumps(model.to_dict()),
+        markdown_body=to_markdown(model).encode('utf-8'),
+        sections_body=_dumps(section_list),
+        section_bodies=section_bodies,
+        changed_sections=changed,
+    )
+
+
+class ContextStore:
+    """
+    最新上下文的内存快照
+    后台线程定期检查输出状态文件，内容哈希变化时加载新结果（优先读取 latest-context.json，
+    未启用多格式输出时在本进程内生成），版本号加一并唤醒等待中的长轮询和事件流
+    """
+
+    def __init__(self, project_root: str = "."):
+        self.project_root = Path(project_root).resolve()
+        self.cache_dir = self.project_root / ".ai-context" / "cache"
+        self.state_file = self.cache_dir / load_tool_module("context-generator.py").OUTPUT_STATE_FILE_NAME
+        self.json_file = self.cache_dir / "latest-context.json"
+        self.engine = get_engine(str(self.project_root))
+        self._snapshot: Optional[ContextSnapshot] = None
+        self._state_mtime = None
+        self._condition = threading.Condition()
+        self._load_lock = threading.Lock()
+        self._engine_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._monitor = None
+
+    @property
+    def snapshot(self) -> Optional[ContextSnapshot]:
+        return self._snapshot
+
+    def start(self):
+        """加载当前上下文并启动状态文件监视线程"""
+        self.load()
+        self._monitor = threading.Thread(target=self._monitor_state, name="context-state-monitor", daemon=True)
+        self._monitor.start()
+
+    def stop(self):
+        self._stopped.set()
+        with self._condition:
+            self._condition.notify_all()
+
+    def load(self) -> bool:
+        """状态文件变化且内容哈希不同时加载新版本，返回是否产生了新版本"""
+        with self._load_lock:
+            mtime = self._stat_state()
+            if self._snapshot is not None and mtime == self._state_mtime:
+                return False
+            self._state_mtime = mtime
+            state = self._read_state()
+            model_hash = state.get("content_hash")
+            if self._snapshot is not None and model_hash and self._snapshot.etag == f'"{model_hash}"':
+                return False
+            model = self._read_model(model_hash) or self._generate_model()
+            return self._publish(model)
+
+    def _stat_state(self):
+        try:
+            return self.state_file.stat().st_mtime_ns
+        except OSError:
+            return None
+
+    def _read_state(self) -> Dict:
+        try:
+            with open(self.state_file, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return state if isinstance(state, dict) else {}
+
+    def _read_model(self, model_hash: Optional[str]) -> Optional[ContextModel]:
+        """读取 latest-context.json（与状态文件记录的内容哈希一致时才使用）"""
+        if not model_hash:
+            return None
+        try:
+            model = load_context(self.json_file)
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        return model if content_hash(model) == model_hash else None
+
+    def _generate_model(self) -> ContextModel:
+        """在本进程内生成上下文（章节缓存命中时很快）"""
+        with self._engine_lock:
+            self.engine.generate_context()
+            model = self.engine.generator.context_model
+        # 生成过程会更新状态文件，避免监视线程再次加载同一结果
+        self._state_mtime = self._stat_state()
+        return model
+
+    def _publish(self, model: ContextModel) -> bool:
+        model_hash = content_hash(model)
+        with self._condition:
+            previous = self._snapshot
+            if previous is not None and previous.etag == f'"{model_hash}"':
+                return False
+            version = previous.version + 1 if previous else 1
+            self._snapshot = build_snapshot(version, model, model_hash, previous)
+            self._condition.notify_all()
+        return True
+
+    def wait_for_version(self, since: int, timeout: float) -> Optional[ContextSnapshot]:
+        """等待版本号大于 since 的快照，超时返回当前快照"""
+        deadline = time.monotonic() + min(max(timeout, 0.0), MAX_WAIT_SECONDS)
+        with self._condition:
+            while not self._stopped.is_set() and (self._snapshot is None or self._snapshot.version <= since):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            return self._snapshot
+
+    def refresh(self, reason: str) -> Dict:
+        """请求刷新：优先交给运行中的守护进程，否则在后台线程中刷新；完成后由监视线程发布新版本"""
+        if request_daemon(self.project_root, "trigger-refresh", {"reason": reason}):
+            return {"queued": True, "by": "daemon"}
+        threading.Thread(target=self._refresh_in_process, args=(reason,), name="context-refresh", daemon=True).start()
+        return {"queued": True, "by": "server"}
+
+    def _refresh_in_process(self, reason: str):
+        try:
+            with self._engine_lock:
+                self.engine.refresh(reason)
+            self.load()
+        except Exception as e:
+            print(f"⚠️  刷新上下文时出错: {e}")
+
+    def _monitor_state(self):
+        while not self._stopped.wait(STATE_POLL_SECONDS):
+            try:
+                if self.load():
+                    print(f"🔄 上下文已更新到版本 {self._snapshot.version}")
+            except Exception as e:
+                print(f"⚠️  加载上下文时出错: {e}")
+
+
+class ContextRequestHandler(BaseHTTPRequestHandler):
+    """HTTP 请求处理（长连接，编辑器重复读取不必重新建立连接）"""
+
+    server_version = "AIContextServer/1.0"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    @property
+    def store(self) -> ContextStore:
+        return self.server.store
+
+    def do_GET(self):
+        if not self._check_access():
+            return
+        url = urlsplit(self.path)
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        snapshot = self.store.snapshot
+        path = url.path.rstrip("/") or "/"
+
+        if path == "/version":
+            if "wait" in params:
+                snapshot = self.store.wait_for_version(_int(params["wait"]), _float(params.get("timeout"), 30.0))
+            self._send_json(200, snapshot.version_info())
+        elif path == "/context":
+            self._send_cached(snapshot, snapshot.etag, snapshot.context_body, JSON_CONTENT_TYPE)
+        elif path == "/context.md":
+            self._send_cached(snapshot, snapshot.etag, snapshot.markdown_body, MARKDOWN_CONTENT_TYPE)
+        elif path == "/sections":
+            self._send_cached(snapshot, snapshot.etag, snapshot.sections_body, JSON_CONTENT_TYPE)
+        elif path.startswith("/sections/"):
+            entry = snapshot.section_bodies.get(unquote(path[len("/sections/"):]))
+            if entry is None:
+                self._send_json(404, {"error": "章节不存在", "sections": list(snapshot.section_bodies)})
+            else:
+                self._send_cached(snapshot, entry[0], entry[1], JSON_CONTENT_TYPE)
+        elif path == "/events":
+            self._stream_events(_int(self.headers.get("Last-Event-ID") or params.get("since"), snapshot.version))
+        else:
+            self._send_json(404, {"error": f"未知路径: {url.path}"})
+
+    def do_POST(self):
+        if not self._check_access():
+            return
+        if urlsplit(self.path).path != "/rpc":
+            self._send_json(404, {"error": f"未知路径: {self.path}"})
+            return
+        media_type = self.headers.get("Content-Type", "").split(";")[0].strip().lower()
+        if media_type != "application/json":
+            self._send_json(415, {"error": "请求体必须是 application/json"})
+            self.close_connection = True
+            return
+        length = _int(self.headers.get("Content-Length"), -1)
+        if not 0 <= length <= MAX_RPC_BODY_BYTES:
+            self._send_json(413, {"error": "请求体缺失或过大"})
+            self.close_connection = True
+            return
+        response = self.server.rpc.handle(self.rfile.read(length))
+        if response is None:
+            # 只包含通知的请求没有响应内容
+            self.send_response(204)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self._send_body(200, encode_json(response), JSON_CONTENT_TYPE)
+
+    def _check_access(self) -> bool:
+        """只接受以本机地址访问、且来自本机页面或编辑器的请求（防止 DNS 重绑定和跨站请求）"""
+        if _host_name(self.headers.get("Host", "")) not in LOOPBACK_HOSTS:
+            self._send_json(403, {"error": "只允许通过本机地址访问"})
+            return False
+        # 沙箱页面和 file:// 页面的 Origin 为 "null"，无法确认来源，同样拒绝
+        origin = self.headers.get("Origin")
+        if origin:
+            parts = urlsplit(origin)
+            if parts.scheme not in ALLOWED_ORIGIN_SCHEMES and _host_name(parts.netloc) not in LOOPBACK_HOSTS:
+                self._send_json(403, {"error": "不允许的来源"})
+                return False
+        return True
+
+    def _send_cached(self, snapshot: ContextSnapshot, etag: str, body: bytes, content_type: str):
+        """内容未变化（If-None-Match 命中）时返回 304"""
+        if _etag_matches(self.headers.get("If-None-Match"), etag):
+            self.send_response(304)
+            self._send_version_headers(snapshot, etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self._send_version_headers(snapshot, etag)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_version_headers(self, snapshot: ContextSnapshot, etag: str):
+        self.send_header("ETag", etag)
+        self.send_header("X-Context-Version", str(snapshot.version))
+        self.send_header("Cache-Control", "no-cache")
+
+    def _send_json(self, status: int, value):
+        self._send_body(status, encode_json(value), JSON_CONTENT_TYPE)
+
+    def _send_body(self, status: int, body: bytes, content_type: str):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream_events(self, since: int):
+        """推送刷新通知，没有更新时定期发送心跳（连接断开时结束）"""
+        self.close_connection = True
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream; charset=utf-8")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        try:
+            while not self.server.stopping:
+                snapshot = self.store.wait_for_version(since, EVENT_HEARTBEAT_SECONDS)
+                if snapshot is not None and snapshot.version > since:
+                    since = snapshot.version
+                    data = encode_json(dict(snapshot.version_info(), changed_sections=list(snapshot.changed_sections)))
+                    self.wfile.write(b"id: %d\nevent: refresh\ndata: %s\n\n" % (since, data))
+                else:
+                    self.wfile.write(b": keepalive\n\n")
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            return
+
+
+class ContextRPC:
+    """JSON-RPC 2.0 方法（结果中的上下文和章节直接使用快照中预序列化的 JSON）"""
+
+    def __init__(self, store: ContextStore):
+        self.store = store
+        self.methods = {
+            "context.version": self.version,
+            "context.get": self.get,
+            "context.sections": self.sections,
+            "context.section": self.section,
+            "context.wait": self.wait,
+            "context.refresh": self.refresh,
+        }
+
+    def handle(self, body: bytes):
+        try:
+            request = json.loads(body.decode('utf-8'))
+        except (UnicodeDecodeError, ValueError):
+            return _rpc_error(None, RPC_PARSE_ERROR, "请求不是有效的 JSON")
+        if isinstance(request, list):
+            responses = [self._call(item) for item in request]
+            return [response for response in responses if response is not None] or None
+        return self._call(request)
+
+    def _call(self, request):
+        if not isinstance(request, dict) or request.get("jsonrpc") != "2.0" or "method" not in request:
+            return _rpc_error(None, RPC_INVALID_REQUEST, "不是有效的 JSON-RPC 2.0 请求")
+        request_id = request.get("id")
+        method = self.methods.get(request["method"])
+        if method is None:
+            return _rpc_error(request_id, RPC_METHOD_NOT_FOUND, f"未知方法: {request['method']}")
+        params = request.get("params") or {}
+        if not isinstance(params, dict):
+            return _rpc_error(request_id, RPC_INVALID_PARAMS, "params 必须是对象")
+        try:
+            result = method(**params)
+        except TypeError as e:
+            return _rpc_error(request_id, RPC_INVALID_PARAMS, str(e))
+        except Exception as e:
+            return _rpc_error(request_id, RPC_INTERNAL_ERROR, str(e))
+        if "id" not in request:
+            # 通知不需要响应
+            return None
+        return {"jsonrpc": "2.0", "id": request_id, "result": result}
+
+    def version(self) -> Dict:
+        return self.store.snapshot.version_info()
+
+    def get(self, if_none_match: Optional[str] = None) -> Dict:
+        """完整上下文；if_none_match 与当前 ETag 相同时只返回版本信息"""
+        snapshot = self.store.snapshot
+        return _cached_result(snapshot, snapshot.etag, snapshot.context_body, if_none_match, "context")
+
+    def sections(self) -> Dict:
+        snapshot = self.store.snapshot
+        return dict(snapshot.version_info(), sections=snapshot.sections_body)
+
+    def section(self, name: str, if_none_match: Optional[str] = None) -> Dict:
+        snapshot = self.store.snapshot
+        entry = snapshot.section_bodies.get(name)
+        if entry is None:
+            raise ValueError(f"章节不存在: {name}")
+        return _cached_result(snapshot, entry[0], entry[1], if_none_match, "section")
+
+    def wait(self, since_version: int, timeout: float = 30.0) -> Dict:
+        """等待出现比 since_version 更新的版本（最长 MAX_WAIT_SECONDS 秒）"""
+        snapshot = self.store.wait_for_version(int(since_version), float(timeout))
+        return dict(snapshot.version_info(), changed_sections=list(snapshot.changed_sections))
+
+    def refresh(self, reason: str = "编辑器请求刷新") -> Dict:
+        return self.store.refresh(reason)
+
+
+def _cached_result(snapshot: ContextSnapshot, etag: str, body: RawJSON, if_none_match, key: str) -> Dict:
+    result = {"version": snapshot.version, "etag": etag}
+    if if_none_match == etag:
+        result["not_modified"] = True
+    else:
+        result[key] = body
+    return result
+
+
+def _rpc_error(request_id, code: int, message: str) -> Dict:
+    return {"jsonrpc": "2.0", "id": request_id, "error": {"code": code, "message": message}}
+
+
+def _etag_matches(header: Optional[str], etag: str) -> bool:
+    if not header:
+        return False
+    candidates = [candidate.strip() for candidate in header.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+def _host_name(host: str) -> str:
+    """去掉端口的主机名（IPv6 地址保留方括号）"""
+    if host.startswith("["):
+        return host[:host.find("]") + 1]
+    return host.split(":", 1)[0].lower()
+
+
+def _int(value, default: int = 0) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _float(value, default: float) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+class ContextServer(ThreadingHTTPServer):
+    """只监听本机回环地址的上下文服务"""
+
+    daemon_threads = True
+
+    def __init__(self, project_root: str = ".", port: int = 0, verbose: bool = False):
+        self.store = ContextStore(project_root)
+        self.rpc = ContextRPC(self.store)
+        self.verbose = verbose
+        self.stopping = False
+        self.info_file = self.store.cache_dir / SERVER_INFO_FILE_NAME
+        super().__init__((SERVER_HOST, port), ContextRequestHandler)
+
+    @property
+    def url(self) -> str:
+        return f"http://{SERVER_HOST}:{self.server_address[1]}"
+
+    def start(self):
+        """加载上下文，并写入服务地址供编辑器插件发现"""
+        self.store.start()
+        self.info_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = self.info_file.with_name(self.info_file.name + ".tmp")
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump({
+                "url": self.url,
+                "port": self.server_address[1],
+                "pid": os.getpid(),
+                "started_at": datetime.now().isoformat(timespec="seconds"),
+            }, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_file, self.info_file)
+
+    def close(self):
+        self.stopping = True
+        self.store.stop()
+        self.server_close()
+        try:
+            with open(self.info_file, 'r', encoding='utf-8') as f:
+                owned = json.load(f).get("pid") == os.getpid()
+            if owned:
+                self.info_file.unlink()
+        except (OSError, ValueError, AttributeError):
+            pass
+
+
+def main():
+    """主函数"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="本地上下文服务（仅本机访问）")
+    parser.add_argument("--project", default=".", help="项目路径")
+    parser.add_argument("--port", type=int, default=0, help="监听端口（默认随机分配）")
+    parser.add_argument("--verbose", action="store_true", help="输出每个请求的访问日志")
+    args = parser.parse_args()
+
+    server = ContextServer(args.project, args.port, args.verbose)
+    # SIGTERM 与 Ctrl+C 一样正常退出，删除服务地址文件
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        server.start()
+        snapshot = server.store.snapshot
+        print(f"🌐 上下文服务已启动: {server.url}（版本 {snapshot.version}，{len(snapshot.section_bodies)} 个章节）")
+        print(f"📄 服务地址已写入: {server.info_file}")
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        print("👋 上下文服务已停止")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+上下文长度预算
+按 settings.max_context_length（估算 token 数）渲染上下文总结：
+每个章节提供 full（完整列表）/ summary（摘要）/ counts（仅计数）三档内容，
+先按最低档计算总开销，再按章节优先级逐个升级到预算允许的最高档。
+各章节的开销在渲染前就已确定，整篇文档一次生成即满足预算，无需二次调整。
+流式渲染时章节逐个到达，改为按输出顺序逐个取剩余预算内的最高档
+"""
+
+import re
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+# 由详细到简略的内容档位
+LEVELS = ("full", "summary", "counts")
+
+# 连最低档都放不下的章节整体省略（不输出标题）
+OMITTED_LEVEL = "omitted"
+
+DEFAULT_MAX_CONTEXT_LENGTH = 15000
+
+# 中日韩文字（含全角标点）大致每字 1 个 token
+CJK_PATTERN = re.compile("[\u2e80-\u9fff\uac00-\ud7af\uf900-\ufaff\ufe30-\ufe4f\uff00-\uffef]")
+NON_ASCII_PATTERN = re.compile(r"[^\x00-\x7f]")
+# 英文、数字、路径等 ASCII 文本大致每 4 个字符 1 个 token
+ASCII_CHARS_PER_TOKEN = 4
+# emoji 等其他非 ASCII 字符通常被拆成多个 token
+OTHER_TOKENS_PER_CHAR = 2
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    快速估算文本的 token 数（偏保守）
+    估算值对拼接满足次可加性：estimate(a + b) <= estimate(a) + estimate(b)，
+    因此各章节开销之和不超过预算时，整篇文档也不会超出预算
+    """
+    if not text:
+        return 0
+    cjk = len(CJK_PATTERN.findall(text))
+    non_ascii = len(NON_ASCII_PATTERN.findall(text))
+    ascii_chars = len(text) - non_ascii
+    other = non_ascii - cjk
+    return cjk + other * OTHER_TOKENS_PER_CHAR + -(-ascii_chars // ASCII_CHARS_PER_TOKEN)
+
+
+class BudgetSection(NamedTuple):
+    """参与预算分配的章节"""
+    name: str
+    title: str
+    priority: int                # 数值越小越重要，越先获得预算
+    variants: Union[str, Dict]   # 档位 -> 内容，缺少的档位沿用更详细的档位；字符串表示只有一档
+                                 # 其余键（如 data）不参与渲染
+
+
+def section_block(title: str, content: str) -> str:
+    """章节在文档中的完整文本（含标题和前置空行）"""
+    return f"\n## {title}\n{content}\n"
+
+
+def _resolve_variants(variants: Union[str, Dict]) -> Dict[str, str]:
+    if isinstance(variants, str):
+        variants = {LEVELS[0]: variants}
+    resolved = {}
+    previous = None
+    for level in LEVELS:
+        content = variants.get(level, previous)
+        if content is None:
+            content = next((variants[lvl] for lvl in LEVELS if lvl in variants), "")
+        resolved[level] = content
+        previous = content
+    return resolved
+
+
+def plan_levels(header: str, sections: List[BudgetSection],
+                budget: Optional[int]) -> Dict[str, Tuple[str, str]]:
+    """
+    只分配档位不拼接文档，返回 {章节名: (使用的档位, 该档位的内容)}
+    budget 为 None 时所有章节使用完整内容；省略的章节内容为空字符串
+    """
+    contents: Dict[str, Dict[str, str]] = {}
+    costs: Dict[str, Dict[str, int]] = {}
+    for section in sections:
+        contents[section.name] = _resolve_variants(section.variants)
+        contents[section.name][OMITTED_LEVEL] = ""
+        costs[section.name] = {
+            level: estimate_tokens(section_block(section.title, content)) if level != OMITTED_LEVEL else 0
+            for level, content in contents[section.name].items()
+        }
+
+    if budget is None:
+        chosen = {section.name: LEVELS[0] for section in sections}
+    else:
+        chosen = _allocate(sections, costs, budget - estimate_tokens(header))
+    return {name: (level, contents[name][level]) for name, level in chosen.items()}
+
+
+def stream_with_budget(header: str, sections: Iterable[BudgetSection],
+                       budget: Optional[int]) -> Iterator[Tuple[BudgetSection, str, str]]:
+    """
+    流式分配档位：每收到一个章节就立即确定其档位，产出 (章节, 档位, 内容)
+    无法预知后续章节的开销，因此按输出顺序而非优先级分配；总开销同样不超过预算
+    """
+    remaining = None if budget is None else budget - estimate_tokens(header)
+    for section in sections:
+        variants = _resolve_variants(section.variants)
+        chosen, content = OMITTED_LEVEL, ""
+        for level in LEVELS:
+            cost = estimate_tokens(section_block(section.title, variants[level]))
+            if remaining is None or cost <= remaining:
+                chosen, content = level, variants[level]
+                if remaining is not None:
+                    remaining -= cost
+                break
+        yield section, chosen, content
+
+
+def _allocate(sections: List[BudgetSection], costs: Dict[str, Dict[str, int]], remaining: int) -> Dict[str, str]:
+    """先全部使用最低档，再按优先级升级到预算允许的最高档"""
+    lowest = LEVELS[-1]
+    chosen = {section.name: lowest for section in sections}
+    remaining -= sum(costs[section.name][lowest] for section in sections)
+
+    by_priority = sorted(sections, key=lambda s: s.priority)
+
+    # 连最低档都放不下时，从最不重要的章节开始省略
+    for section in reversed(by_priority):
+        if remaining >= 0:
+            break
+        cost = costs[section.name]
+        chosen[section.name] = OMITTED_LEVEL
+        remaining += cost[lowest] - cost[OMITTED_LEVEL]
+
+    for section in by_priority:
+        current = chosen[section.name]
+        if current == OMITTED_LEVEL:
+            continue
+        cost = costs[section.name]
+        for level in LEVELS:
+            extra = cost[level] - cost[current]
+            if extra <= remaining:
+                chosen[section.name] = level
+                remaining -= extra
+                break
+    return chosen
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""
+结构化上下文模型
+一次生成得到的上下文（章节、文件条目、会话、状态等）保存在 ContextModel 中，
+再分别序列化为 Markdown（供 AI 阅读）、JSON 和紧凑二进制格式 MessagePack
+（供编辑器插件和脚本直接加载，无需解析 Markdown）
+
+使用方法:
+    model = load_context(".ai-context/cache/latest-context.json")
+    model = load_context(".ai-context/cache/latest-context.msgpack")
+    for section in model.sections:
+        print(section.name, section.data)
+"""
+
+import hashlib
+import json
+import struct
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional
+
+from context_budget import OMITTED_LEVEL, section_block  # type: ignore
+
+CONTEXT_MODEL_VERSION = 1
+
+# 输出格式 -> 文件扩展名
+OUTPUT_FORMATS = {
+    "markdown": ".md",
+    "json": ".json",
+    "msgpack": ".msgpack",
+}
+
+
+class ContextSection(NamedTuple):
+    """上下文中的一个章节"""
+    name: str
+    title: str
+    level: str       # Markdown 中使用的内容档位（full/summary/counts/omitted）
+    content: str     # 该档位的 Markdown 内容
+    data: Dict       # 完整的结构化数据（不受长度预算影响）
+
+
+class ContextModel(NamedTuple):
+    """一次生成得到的完整上下文"""
+    title: str
+    generated_at: str
+    project_root: str
+    sections: List[ContextSection]
+
+    def section(self, name: str) -> Optional[ContextSection]:
+        return next((s for s in self.sections if s.name == name), None)
+
+    def to_dict(self) -> Dict:
+        return {
+            "version": CONTEXT_MODEL_VERSION,
+            "title": self.title,
+            "generated_at": self.generated_at,
+            "project_root": self.project_root,
+            "sections": [section._asdict() for section in self.sections],
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "ContextModel":
+        if data.get("version") != CONTEXT_MODEL_VERSION:
+            raise ValueError(f"不支持的上下文模型版本: {data.get('version')}")
+        return cls(
+            title=data["title"],
+            generated_at=data["generated_at"],
+            project_root=data["project_root"],
+            sections=[ContextSection(**section) for section in data["sections"]],
+        )
+
+
+class ContentHasher:
+    """
+    上下文内容哈希：不含生成时间等易变字段，内容相同则哈希相同
+    可逐个章节累加
+    """
+
+    def __init__(self, title: str, project_root: str):
+        self._hash = hashlib.blake2b(digest_size=16)
+        self._update([CONTEXT_MODEL_VERSION, title, project_root])
+
+    def add_section(self, section: ContextSection):
+        self._update(list(section))
+
+    def hexdigest(self) -> str:
+        return self._hash.hexdigest()
+
+    def _update(self, value):
+        self._hash.update(json.dumps(value, ensure_ascii=False, sort_keys=True).encode('utf-8'))
+        self._hash.update(b"\0")
+
+
+def content_hash(model: ContextModel) -> str:
+    """模型的内容哈希（忽略 generated_at）"""
+    hasher = ContentHasher(model.title, model.project_root)
+    for section in model.sections:
+        hasher.add_section(section)
+    return hasher.hexdigest()
+
+
+def markdown_header(title: str, generated_at: str) -> str:
+    """Markdown 文档头（标题和生成时间）"""
+    return f"# {title}\n生成时间: {generated_at}\n"
+
+
+def to_markdown(model: ContextModel) -> str:
+    """序列化为 Markdown（省略的章节不输出）"""
+    return markdown_header(model.title, model.generated_at) + "".join(section_block(section.title, section.content)
+                            for section in model.sections if section.level != OMITTED_LEVEL)
+
+
+def to_json(model: ContextModel) -> str:
+    """序列化为 JSON"""
+    return json.dumps(model.to_dict(), ensure_ascii=False, indent=2)
+
+
+def to_msgpack(model: ContextModel) -> bytes:
+    """序列化为 MessagePack"""
+    return packb(model.to_dict())
+
+
+def serialize(model: ContextModel, output_format: str):
+    """按格式名序列化，返回 str（文本格式）或 bytes（二进制格式）"""
+    if output_format == "markdown":
+        return to_markdown(model)
+    if output_format == "json":
+        return to_json(model)
+    if output_format == "msgpack":
+        return to_msgpack(model)
+    raise ValueError(f"未知的输出格式: {output_format}")
+
+
+def load_context(path) -> ContextModel:
+    """从 JSON 或 MessagePack 文件加载上下文模型"""
+    path = Path(path)
+    if path.suffix == OUTPUT_FORMATS["msgpack"]:
+        return ContextModel.from_dict(unpackb(path.read_bytes()))
+    return ContextModel.from_dict(json.loads(path.read_text(encoding='utf-8')))
+
+
+# ----------------------------------------------------------------------
+# 最小 MessagePack 实现（仅标准库，覆盖 JSON 可表示的类型）
+
+def packb(obj) -> bytes:
+    """将对象编码为 MessagePack"""
+    out = bytearray()
+    _pack(obj, out)
+    return bytes(out)
+
+
+def _pack(obj, out: bytearray):
+    if obj is None:
+        out.append(0xc0)
+    elif obj is True:
+        out.append(0xc3)
+    elif obj is False:
+        out.append(0xc2)
+    elif isinstance(obj, int):
+        _pack_int(obj, out)
+    elif isinstance(obj, float):
+        out.append(0xcb)
+        out += struct.pack(">d", obj)
+    elif isinstance(obj, str):
+        data = obj.encode('utf-8', 'surrogateescape')
+        _pack_length(len(data), out, fix_base=0xa0, fix_max=31, codes=(0xd9, 0xda, 0xdb))
+        out += data
+    elif isinstance(obj, (bytes, bytearray)):
+        _pack_length(len(obj), out, fix_base=None, fix_max=-1, codes=(0xc4, 0xc5, 0xc6))
+        out += obj
+    elif isinstance(obj, (list, tuple)):
+        _pack_length(len(obj), out, fix_base=0x90, fix_max=15, codes=(None, 0xdc, 0xdd))
+        for item in obj:
+            _pack(item, out)
+    elif isinstance(obj, dict):
+        _pack_length(len(obj), out, fix_base=0x80, fix_max=15, codes=(None, 0xde, 0xdf))
+        for key, value in obj.items():
+            _pack(key, out)
+            _pack(value, out)
+    else:
+        raise TypeError(f"无法编码为 MessagePack 的类型: {type(obj).__name__}")
+
+
+def _pack_int(value: int, out: bytearray):
+    if 0 <= value <= 0x7f:
+        out.append(value)
+    elif -32 <= value < 0:
+        out.append(value & 0xff)
+    elif value >= 0:
+        for code, fmt, limit in ((0xcc, ">B", 0xff), (0xcd, ">H", 0xffff),
+                                 (0xce, ">I", 0xffffffff), (0xcf, ">Q", 0xffffffffffffffff)):
+            if value <= limit:
+                out.append(code)
+                out += struct.pack(fmt, value)
+                return
+        raise OverflowError("整数超出 MessagePack 范围")
+    else:
+        for code, fmt, limit in ((0xd0, ">b", 0x80), (0xd1, ">h", 0x8000),
+                                 (0xd2, ">i", 0x80000000), (0xd3, ">q", 0x8000000000000000)):
+            if value >= -limit:
+                out.append(code)
+                out += struct.pack(fmt, value)
+                return
+        raise OverflowError("整数超出 MessagePack 范围")
+
+
+def _pack_length(length: int, out: bytearray, fix_base, fix_max: int, codes):
+    """写入 fix 格式或 8/16/32 位长度头"""
+    if fix_base is not None and length <= fix_max:
+        out.append(fix_base | length)
+        return
+    code8, code16, code32 = codes
+    if code8 is not None and length <= 0xff:
+        out.append(code8)
+        out += struct.pack(">B", length)
+    elif length <= 0xffff:
+        out.append(code16)
+        out += struct.pack(">H", length)
+    else:
+        out.append(code32)
+        out += struct.pack(">I", length)
+
+
+def unpackb(data: bytes):
+    """解码 MessagePack"""
+    obj, pos = _unpack(data, 0)
+    if pos != len(data):
+        raise ValueError("MessagePack 数据末尾有多余内容")
+    return obj
+
+
+_FIXED_FORMATS = {
+    0xca: ">f", 0xcb: ">d",
+    0xcc: ">B", 0xcd: ">H", 0xce: ">I", 0xcf: ">Q",
+    0xd0: ">b", 0xd1: ">h", 0xd2: ">i", 0xd3: ">q",
+}
+_STR_LENGTHS = {0xd9: ">B", 0xda: ">H", 0xdb: ">I"}
+_BIN_LENGTHS = {0xc4: ">B", 0xc5: ">H", 0xc6: ">I"}
+_ARRAY_LENGTHS = {0xdc: ">H", 0xdd: ">I"}
+_MAP_LENGTHS = {0xde: ">H", 0xdf: ">I"}
+
+
+def _read(fmt: str, data: bytes, pos: int):
+    size = struct.calcsize(fmt)
+    return struct.unpack_from(fmt, data, pos)[0], pos + size
+
+
+def _unpack(data: bytes, pos: int):
+    code = data[pos]
+    pos += 1
+    if code <= 0x7f:
+        return code, pos
+    if code >= 0xe0:
+        return code - 0x100, pos
+    if 0xa0 <= code <= 0xbf:
+        return _unpack_str(data, pos, code & 0x1f)
+    if 0x90 <= code <= 0x9f:
+        return _unpack_array(data, pos, code & 0x0f)
+    if 0x80 <= code <= 0x8f:
+        return _unpack_map(data, pos, code & 0x0f)
+    if code == 0xc0:
+        return None, pos
+    if code == 0xc2:
+        return False, pos
+    if code == 0xc3:
+        return True, pos
+    if code in _FIXED_FORMATS:
+        return _read(_FIXED_FORMATS[code], data, pos)
+    if code in _STR_LENGTHS:
+        length, pos = _read(_STR_LENGTHS[code], data, pos)
+        return _unpack_str(data, pos, length)
+    if code in _BIN_LENGTHS:
+        length, pos = _read(_BIN_LENGTHS[code], data, pos)
+        return bytes(data[pos:pos + length]), pos + length
+    if code in _ARRAY_LENGTHS:
+        length, pos = _read(_ARRAY_LENGTHS[code], data, pos)
+        return _unpack_array(data, pos, length)
+    if code in _MAP_LENGTHS:
+        length, pos = _read(_MAP_LENGTHS[code], data, pos)
+        return _unpack_map(data, pos, length)
+    raise ValueError(f"不支持的 MessagePack 类型码: 0x{code:02x}")
+
+
+def _unpack_str(data: bytes, pos: int, length: int):
+    return data[pos:pos + length].decode('utf-8', 'surrogateescape'), pos + length
+
+
+def _unpack_array(data: bytes, pos: int, length: int):
+    items = []
+    for _ in range(length):
+        item, pos = _unpack(data, pos)
+        items.append(item)
+    return items, pos
+
+
+def _unpack_map(data: bytes, pos: int, length: int):
+    result = {}
+    for _ in range(length):
+        key, pos = _unpack(data, pos)
+        value, pos = _unpack(data, pos)
+        result[key] = value
+    return result, pos
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+守护进程控制通道
+守护进程在 Unix 域套接字上接收 JSON 命令，每个连接一行请求、一行响应:
+    请求: {"command": "status", "args": {...}}
+    响应: {"ok": true, "result": ...} 或 {"ok": false, "error": "..."}
+命令由守护进程注册（status / trigger-refresh / pause / resume / reload-config / metrics），
+服务端在守护进程主循环中与文件监听一起 select，不额外启动线程。
+套接字权限为 0600，只有当前用户可以连接；平台不支持 AF_UNIX 时不启用
+
+使用方法:
+    response = send_command(".ai-context/cache/daemon.sock", "status")
+    response = request_daemon(".", "trigger-refresh", {"reason": "会话结束"})
+"""
+
+import hashlib
+import json
+import os
+import socket
+import tempfile
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+from project_registry import DEFAULT_REGISTRY_PATH  # type: ignore
+
+CONTROL_SOCKET_NAME = "daemon.sock"
+CONTROL_COMMANDS = ("status", "trigger-refresh", "pause", "resume", "reload-config", "metrics")
+
+# sun_path 最长 108 字节（macOS 为 104），留出余量
+MAX_SOCKET_PATH_BYTES = 100
+REQUEST_TIMEOUT_SECONDS = 1.0
+CLIENT_TIMEOUT_SECONDS = 2.0
+MAX_MESSAGE_BYTES = 1024 * 1024
+
+Handler = Callable[[Dict], object]
+
+
+def is_supported() -> bool:
+    return hasattr(socket, "AF_UNIX")
+
+
+def control_socket_path(preferred) -> Path:
+    """实际使用的套接字路径；超过长度限制时改用临时目录下按路径哈希命名的文件"""
+    preferred = Path(preferred)
+    if len(os.fsencode(str(preferred))) <= MAX_SOCKET_PATH_BYTES:
+        return preferred
+    digest = hashlib.sha1(str(preferred).encode('utf-8')).hexdigest()[:16]
+    uid = os.getuid() if hasattr(os, "getuid") else 0
+    return Path(tempfile.gettempdir()) / f"ai-context-{uid}-{digest}.sock"
+
+
+def project_socket_path(project_root) -> Path:
+    """单项目守护进程的套接字"""
+    return control_socket_path(Path(project_root).resolve() / ".ai-context" / "cache" / CONTROL_SOCKET_NAME)
+
+
+def registry_socket_path(registry_path=None) -> Path:
+    """多项目守护进程的套接字（与注册表同目录）"""
+    return control_socket_path(Path(registry_path or DEFAULT_REGISTRY_PATH).expanduser().with_suffix(".sock"))
+
+
+class ControlServer:
+    """非阻塞的控制套接字服务端，由调用方在 select 到可读后调用 handle_ready()"""
+
+    def __init__(self, path, handlers: Dict[str, Handler]):
+        self.path = control_socket_path(path)
+        self.handlers = handlers
+        self.requests = 0
+        self._sock: Optional[socket.socket] = None
+
+    def open(self) -> bool:
+        """创建并监听套接字（调用方已确认没有其他守护进程在运行），不支持时返回 False"""
+        if not is_supported():
+            return False
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        old_umask = os.umask(0o177)
+        try:
+            sock.bind(str(self.path))
+        except OSError:
+            sock.close()
+            raise
+        finally:
+            os.umask(old_umask)
+        sock.listen(16)
+        sock.setblocking(False)
+        self._sock = sock
+        return True
+
+    def fileno(self) -> int:
+        return self._sock.fileno() if self._sock else -1
+
+    def handle_ready(self):
+        """接受所有等待中的连接并逐个处理"""
+        while self._sock is not None:
+            try:
+                conn, _ = self._sock.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                return
+            with conn:
+                try:
+                    conn.settimeout(REQUEST_TIMEOUT_SECONDS)
+                    response = self.dispatch(_recv_line(conn))
+                    conn.sendall(json.dumps(response, ensure_ascii=False, default=str).encode('utf-8') + b"\n")
+                except OSError:
+                    # 客户端超时或提前断开
+                    continue
+
+    def dispatch(self, raw: bytes) -> Dict:
+        """解析一条请求并调用对应的处理函数"""
+        self.requests += 1
+        try:
+            request = json.loads(raw.decode('utf-8'))
+        except (UnicodeDecodeError, ValueError):
+            return {"ok": False, "error": "请求不是有效的 JSON"}
+        if not isinstance(request, dict):
+            return {"ok": False, "error": "请求必须是 JSON 对象"}
+
+        handler = self.handlers.get(request.get("command"))
+        if handler is None:
+            return {"ok": False, "error": f"未知命令: {request.get('command')}", "commands": sorted(self.handlers)}
+        args = request.get("args") or {}
+        if not isinstance(args, dict):
+            return {"ok": False, "error": "args 必须是 JSON 对象"}
+        try:
+            return {"ok": True, "result": handler(args)}
+        except Exception as e:
+            return {"ok": False, "error": str(e)}
+
+    def close(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+            try:
+                self.path.unlink()
+            except OSError:
+                pass
+
+
+def _recv_line(sock: socket.socket) -> bytes:
+    chunks = []
+    received = 0
+    while True:
+        chunk = sock.recv(65536)
+        if not chunk:
+            break
+        newline = chunk.find(b"\n")
+        if newline >= 0:
+            chunks.append(chunk[:newline])
+            break
+        chunks.append(chunk)
+        received += len(chunk)
+        if received > MAX_MESSAGE_BYTES:
+            raise OSError("消息过长")
+    return b"".join(chunks)
+
+
+def send_command(path, command: str, args: Optional[Dict] = None,
+                 timeout: float = CLIENT_TIMEOUT_SECONDS) -> Optional[Dict]:
+    """发送命令并返回响应；守护进程未运行（套接字不存在或拒绝连接）时返回 None"""
+    if not is_supported():
+        return None
+    path = control_socket_path(path)
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(str(path))
+            request = {"command": command, "args": args or {}}
+            sock.sendall(json.dumps(request, ensure_ascii=False).encode('utf-8') + b"\n")
+            data = _recv_line(sock)
+    except OSError:
+        return None
+    try:
+        return json.loads(data.decode('utf-8'))
+    except (UnicodeDecodeError, ValueError):
+        return None
+
+
+def request_daemon(project_root, command: str, args: Optional[Dict] = None) -> Optional[Dict]:
+    """
+    向负责该项目的守护进程发送命令：先尝试项目自己的守护进程，再尝试默认注册表的多项目守护进程；
+    没有守护进程处理时返回 None
+    """
+    project_root = Path(project_root).resolve()
+    response = send_command(project_socket_path(project_root), command, args)
+    if response is not None:
+        return response
+    response = send_command(registry_socket_path(), command, dict(args or {}, project=str(project_root)))
+    if response is not None and response.get("ok"):
+        return response
+    return None
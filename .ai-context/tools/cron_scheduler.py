@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+定时任务调度器
+任务按 cron 表达式（分 时 日 月 周）计算下次运行时间，放入按时间排序的堆中；
+调用方只需休眠到 seconds_until_next() 即可，无需每分钟轮询。
+错过的运行（刷新耗时过长、系统休眠、守护进程停止期间）按补跑策略处理：
+    skip  超过宽限时间的错过运行直接跳过
+    once  无论错过多少次只补跑一次（默认）
+    all   逐次补跑，最多 MAX_CATCHUP_RUNS 次
+上次运行时间保存在状态文件中，守护进程重启后也能补跑停止期间错过的任务
+"""
+
+import heapq
+import itertools
+import json
+import os
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+SCHEDULER_STATE_FILE_NAME = "scheduler-state.json"
+
+CATCHUP_SKIP = "skip"
+CATCHUP_ONCE = "once"
+CATCHUP_ALL = "all"
+CATCHUP_POLICIES = (CATCHUP_SKIP, CATCHUP_ONCE, CATCHUP_ALL)
+
+# skip 策略下仍视为按时运行的延迟（秒）
+MISFIRE_GRACE_SECONDS = 300
+# all 策略单次最多补跑的次数
+MAX_CATCHUP_RUNS = 24
+# 查找下次运行时间时最多向后搜索的天数（如 "0 0 29 2 *" 需要跨越闰年）
+MAX_SEARCH_DAYS = 366 * 8
+
+CRON_MACROS = {
+    "@yearly": "0 0 1 1 *",
+    "@annually": "0 0 1 1 *",
+    "@monthly": "0 0 1 * *",
+    "@weekly": "0 0 * * 0",
+    "@daily": "0 0 * * *",
+    "@midnight": "0 0 * * *",
+    "@hourly": "0 * * * *",
+}
+
+_MONTH_NAMES = {name: i + 1 for i, name in enumerate(
+    ["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"])}
+_WEEKDAY_NAMES = {name: i for i, name in enumerate(["sun", "mon", "tue", "wed", "thu", "fri", "sat"])}
+
+# 各字段的取值范围和名称（周字段中 0 和 7 都表示周日）
+_FIELDS = (
+    ("minute", 0, 59, {}),
+    ("hour", 0, 23, {}),
+    ("day", 1, 31, {}),
+    ("month", 1, 12, _MONTH_NAMES),
+    ("weekday", 0, 7, _WEEKDAY_NAMES),
+)
+
+
+class CronExpression:
+    """五字段 cron 表达式，支持 *、列表、范围、步长、月份/星期名称和 @daily 等宏"""
+
+    def __init__(self, expression: str):
+        self.expression = expression.strip()
+        fields = CRON_MACROS.get(self.expression.lower(), self.expression).split()
+        if len(fields) != len(_FIELDS):
+            raise ValueError(f"cron 表达式需要 5 个字段: {expression!r}")
+
+        values = [_parse_field(text, low, high, names) for text, (_, low, high, names) in zip(fields, _FIELDS)]
+        self.minutes, self.hours, self.days, self.months, weekdays = values
+        self.weekdays = {0 if day == 7 else day for day in weekdays}
+        self._sorted_hours = sorted(self.hours)
+        self._sorted_minutes = sorted(self.minutes)
+        # 与 cron 一致：日和周都有限制时满足其一即可
+        self._day_restricted = fields[2] != "*"
+        self._weekday_restricted = fields[4] != "*"
+
+    def __repr__(self):
+        return f"CronExpression({self.expression!r})"
+
+    def _day_matches(self, dt: datetime) -> bool:
+        day_ok = dt.day in self.days
+        weekday_ok = (dt.weekday() + 1) % 7 in self.weekdays
+        if self._day_restricted and self._weekday_restricted:
+            return day_ok or weekday_ok
+        return day_ok and weekday_ok
+
+    def next_after(self, after: datetime) -> datetime:
+        """严格晚于 after 的下一个运行时间（精确到分钟）"""
+        current = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        for _ in range(MAX_SEARCH_DAYS):
+            if current.month in self.months and self._day_matches(current):
+                for hour in self._sorted_hours:
+                    if hour < current.hour:
+                        continue
+                    first_minute = current.minute if hour == current.hour else 0
+                    minute = next((m for m in self._sorted_minutes if m >= first_minute), None)
+                    if minute is not None:
+                        return current.replace(hour=hour, minute=minute)
+            current = (current + timedelta(days=1)).replace(hour=0, minute=0)
+        raise ValueError(f"cron 表达式没有可运行的时间: {self.expression!r}")
+
+
+def _parse_field(text: str, low: int, high: int, names: Dict[str, int]) -> set:
+    values = set()
+    for part in text.lower().split(","):
+        step = 1
+        if "/" in part:
+            part, step_text = part.split("/", 1)
+            step = int(step_text)
+            if step <= 0:
+                raise ValueError(f"cron 步长必须为正数: {text!r}")
+        if part == "*":
+            start, end = low, high
+        elif "-" in part:
+            start_text, end_text = part.split("-", 1)
+            start, end = _parse_value(start_text, names), _parse_value(end_text, names)
+        else:
+            start = _parse_value(part, names)
+            end = high if step > 1 else start
+        if not low <= start <= end <= high:
+            raise ValueError(f"cron 字段超出范围 {low}-{high}: {text!r}")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+def _parse_value(text: str, names: Dict[str, int]) -> int:
+    if text in names:
+        return names[text]
+    try:
+        return int(text)
+    except ValueError:
+        raise ValueError(f"无法解析的 cron 取值: {text!r}")
+
+
+class ScheduledJob:
+    """调度器中的一个任务"""
+
+    def __init__(self, name: str, cron: CronExpression, func: Callable[[], object],
+                 catchup: str = CATCHUP_ONCE):
+        if catchup not in CATCHUP_POLICIES:
+            raise ValueError(f"未知的补跑策略: {catchup}")
+        self.name = name
+        self.cron = cron
+        self.func = func
+        self.catchup = catchup
+        self.next_run: Optional[datetime] = None
+        self.last_run: Optional[datetime] = None
+        self.cancelled = False
+
+
+class CronScheduler:
+    """按下次运行时间排序的任务堆"""
+
+    def __init__(self, state_file=None, on_error: Optional[Callable[[ScheduledJob, Exception], None]] = None):
+        self.state_file = Path(state_file) if state_file else None
+        self.on_error = on_error
+        self.jobs: Dict[str, ScheduledJob] = {}
+        self._heap: List[Tuple[float, int, ScheduledJob]] = []
+        self._counter = itertools.count()
+        self._last_runs = self._load_state()
+
+    def add_job(self, name: str, expression: str, func: Callable[[], object],
+                catchup: str = CATCHUP_ONCE, now: Optional[datetime] = None) -> ScheduledJob:
+        """添加（或替换同名）任务；有上次运行记录时从该时间起计算，停止期间错过的运行会被补跑"""
+        job = ScheduledJob(name, CronExpression(expression), func, catchup)
+        self.remove_job(name)
+        last_run = self._last_runs.get(name)
+        job.last_run = last_run
+        job.next_run = job.cron.next_after(last_run or now or datetime.now())
+        self.jobs[name] = job
+        self._push(job)
+        return job
+
+    def remove_job(self, name: str) -> bool:
+        """删除任务（堆中的旧条目在弹出时丢弃）"""
+        job = self.jobs.pop(name, None)
+        if job is None:
+            return False
+        job.cancelled = True
+        return True
+
+    def configure(self, schedule: Dict[str, Tuple[str, Callable[[], object], str]],
+                  now: Optional[datetime] = None) -> List[str]:
+        """
+        按配置整体更新任务: {名称: (cron 表达式, 函数, 补跑策略)}
+        表达式和策略未变化的任务保持原有的下次运行时间；返回发生变化的任务名
+        """
+        changed = []
+        for name in list(self.jobs):
+            if name not in schedule:
+                self.remove_job(name)
+                changed.append(name)
+        for name, (expression, func, catchup) in schedule.items():
+            job = self.jobs.get(name)
+            if job and job.cron.expression == expression.strip() and job.catchup == catchup:
+                job.func = func
+                continue
+            self.add_job(name, expression, func, catchup, now)
+            changed.append(name)
+        return changed
+
+    def seconds_until_next(self, now: Optional[float] = None) -> Optional[float]:
+        """距离下一个任务到期的秒数（已到期返回 0，没有任务返回 None）"""
+        self._drop_cancelled()
+        if not self._heap:
+            return None
+        now = time.time() if now is None else now
+        return max(0.0, self._heap[0][0] - now)
+
+    def next_job(self) -> Optional[ScheduledJob]:
+        self._drop_cancelled()
+        return self._heap[0][2] if self._heap else None
+
+    def run_pending(self, now: Optional[datetime] = None) -> int:
+        """运行所有已到期的任务（按补跑策略处理错过的运行），返回实际执行次数"""
+        now = now or datetime.now()
+        executed = 0
+        while True:
+            self._drop_cancelled()
+            if not self._heap or self._heap[0][0] > now.timestamp():
+                break
+            _, _, job = heapq.heappop(self._heap)
+            runs, next_run = self._plan_runs(job, now)
+            for _ in range(runs):
+                self._run(job, now)
+                executed += 1
+            job.next_run = next_run
+            if not job.cancelled:
+                self._push(job)
+        return executed
+
+    def _plan_runs(self, job: ScheduledJob, now: datetime) -> Tuple[int, datetime]:
+        """根据补跑策略决定本次执行次数，并计算晚于 now 的下次运行时间"""
+        due = job.next_run
+        missed = 1
+        next_run = job.cron.next_after(due)
+        while next_run <= now:
+            missed += 1
+            if missed > MAX_CATCHUP_RUNS:
+                next_run = job.cron.next_after(now)
+                break
+            next_run = job.cron.next_after(next_run)
+
+        if job.catchup == CATCHUP_ALL:
+            return min(missed, MAX_CATCHUP_RUNS), next_run
+        if job.catchup == CATCHUP_SKIP:
+            # 只有宽限期内存在应运行的时间时才执行
+            grace_start = now - timedelta(seconds=MISFIRE_GRACE_SECONDS)
+            on_time = due >= grace_start or job.cron.next_after(grace_start) <= now
+            return (1 if on_time else 0), next_run
+        return 1, next_run
+
+    def _run(self, job: ScheduledJob, now: datetime):
+        try:
+            job.func()
+        except Exception as e:
+            if self.on_error:
+                self.on_error(job, e)
+        job.last_run = now
+        self._last_runs[job.name] = now
+        self._save_state()
+
+    def _push(self, job: ScheduledJob):
+        heapq.heappush(self._heap, (job.next_run.timestamp(), next(self._counter), job))
+
+    def _drop_cancelled(self):
+        while self._heap and self._heap[0][2].cancelled:
+            heapq.heappop(self._heap)
+
+    def _load_state(self) -> Dict[str, datetime]:
+        if not self.state_file:
+            return {}
+        try:
+            with open(self.state_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return {name: datetime.fromisoformat(value) for name, value in data.get("last_runs", {}).items()}
+        except (OSError, ValueError, AttributeError, TypeError):
+            return {}
+
+    def _save_state(self):
+        if not self.state_file:
+            return
+        self.state_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = self.state_file.with_name(self.state_file.name + ".tmp")
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump({"last_runs": {name: value.isoformat() for name, value in self._last_runs.items()}}, f)
+        os.replace(tmp_file, self.state_file)
+
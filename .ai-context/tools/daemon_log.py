@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+守护进程结构化日志
+每条日志写为一行 JSON（time/level/message 及附加字段），文件保持打开并缓冲写入，
+警告及以上级别立即落盘，其余最多延迟 FLUSH_INTERVAL_SECONDS 秒；
+文件超过 max_bytes 时轮转为 .1、.2 …（保留 backup_count 个）。
+读取最近日志时从文件末尾按块反向查找换行，耗时与日志总量无关
+"""
+
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+LOG_MAX_BYTES = 5 * 1024 * 1024
+LOG_BACKUP_COUNT = 5
+FLUSH_INTERVAL_SECONDS = 1.0
+TAIL_BLOCK_SIZE = 8192
+
+# 立即落盘的级别
+_URGENT_LEVELS = ("WARNING", "ERROR", "CRITICAL")
+
+
+class JsonLineLogger:
+    """按大小轮转的 JSON Lines 日志（线程安全）"""
+
+    def __init__(self, path, max_bytes: int = LOG_MAX_BYTES, backup_count: int = LOG_BACKUP_COUNT,
+                 flush_interval: float = FLUSH_INTERVAL_SECONDS):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._file = None
+        self._size = 0
+        self._dirty = False
+        self._last_flush = 0.0
+        self._flush_timer: Optional[threading.Timer] = None
+
+    def write(self, level: str, message: str, **fields) -> Dict:
+        """写入一条日志，返回日志记录"""
+        record = {"time": datetime.now().isoformat(timespec="seconds"), "level": level, "message": message}
+        record.update(fields)
+        data = (json.dumps(record, ensure_ascii=False) + "\n").encode('utf-8')
+
+        with self._lock:
+            if self._file is None:
+                self._open()
+            elif self._size + len(data) > self.max_bytes and self._size > 0:
+                self._rotate()
+            self._file.write(data)
+            self._size += len(data)
+            self._dirty = True
+            if level in _URGENT_LEVELS or time.monotonic() - self._last_flush >= self.flush_interval:
+                self._flush_locked()
+            elif self._flush_timer is None:
+                # 短时间内的多条日志合并为一次写入
+                self._flush_timer = threading.Timer(self.flush_interval, self.flush)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+        return record
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def close(self):
+        with self._lock:
+            self._flush_locked()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _open(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, 'ab')
+        self._size = self._file.seek(0, os.SEEK_END)
+
+    def _flush_locked(self):
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        if self._file is not None and self._dirty:
+            self._file.flush()
+            self._dirty = False
+        self._last_flush = time.monotonic()
+
+    def _rotate(self):
+        """当前文件改名为 .1，原有备份依次后移，超出数量的删除"""
+        self._flush_locked()
+        self._file.close()
+        for index in range(self.backup_count, 0, -1):
+            source = self.path if index == 1 else _backup_path(self.path, index - 1)
+            target = _backup_path(self.path, index)
+            try:
+                os.replace(source, target)
+            except FileNotFoundError:
+                pass
+        if self.backup_count <= 0:
+            self.path.unlink()
+        self._open()
+
+
+def _backup_path(path: Path, index: int) -> Path:
+    return path.with_name(f"{path.name}.{index}")
+
+
+def tail_lines(path, count: int, block_size: int = TAIL_BLOCK_SIZE) -> List[str]:
+    """文件最后 count 行（从末尾按块反向读取，不读取整个文件）"""
+    try:
+        f = open(path, 'rb')
+    except OSError:
+        return []
+    with f:
+        end = f.seek(0, os.SEEK_END)
+        position = end
+        data = b""
+        # 需要 count 个完整行，即 count + 1 个换行（最后一行末尾的换行除外）
+        while position > 0 and data.count(b"\n") <= count:
+            read_size = min(block_size, position)
+            position -= read_size
+            f.seek(position)
+            data = f.read(read_size) + data
+    lines = data.decode('utf-8', 'replace').splitlines()
+    if position > 0:
+        # 第一行可能不完整
+        lines = lines[1:]
+    return lines[-count:] if count > 0 else []
+
+
+def read_recent(path, count: int = 10) -> List[Dict]:
+    """最近 count 条日志记录；当前文件不足时继续读取最近一个轮转文件，非 JSON 行按原文返回"""
+    path = Path(path)
+    lines = tail_lines(path, count)
+    if len(lines) < count:
+        lines = tail_lines(_backup_path(path, 1), count - len(lines)) + lines
+    return [_parse_record(line) for line in lines if line.strip()]
+
+
+def _parse_record(line: str) -> Dict:
+    try:
+        record = json.loads(line)
+        if isinstance(record, dict):
+            return record
+    except ValueError:
+        pass
+    return {"time": "", "level": "", "message": line}
+
+
+def format_record(record: Dict) -> str:
+    """格式化为 [时间] [级别] 消息"""
+    if not record.get("level"):
+        return record.get("message", "")
+    timestamp = record.get("time", "").replace("T", " ")
+    project = f"[{record['project']}] " if record.get("project") else ""
+    return f"[{timestamp}] [{record['level']}] {project}{record.get('message', '')}"
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+文件系统索引
+基于 os.scandir 单次遍历项目目录，构建内存中的文件元数据索引，
+供上下文生成器各章节查询，避免重复遍历磁盘
+"""
+
+import os
+import re
+import fnmatch
+import hashlib
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+
+class FileEntry(NamedTuple):
+    """索引中的单个文件或目录"""
+    path: str      # 相对项目根目录的路径（使用 / 分隔）
+    name: str
+    is_dir: bool
+    size: int
+    mtime: float
+    inode: int
+    depth: int     # 根目录下的直接子项深度为 0
+
+
+class FileIndex:
+    """项目文件索引（单次 os.scandir 遍历）"""
+
+    def __init__(self, project_root, exclude_dirs: Optional[Iterable[str]] = None,
+                 max_depth: Optional[int] = None):
+        self.project_root = Path(project_root).resolve()
+        self.exclude_dirs = set(exclude_dirs or [])
+        # 只索引深度小于 max_depth 的条目（None 表示不限制），用于只需浅层结构的场景
+        self.max_depth = max_depth
+        self._entries: Dict[str, FileEntry] = {}
+        self._children: Dict[str, List[FileEntry]] = {}
+        self._by_suffix: Optional[Dict[str, List[FileEntry]]] = None
+        self._fingerprints: Dict[bool, str] = {}
+        self._built = False
+        self.symlink_loops: List[str] = []
+
+    def build(self) -> "FileIndex":
+        """遍历项目目录并构建索引"""
+        self._entries = {}
+        self._children = {"": []}
+        self._by_suffix = None
+        self._fingerprints = {}
+        self.symlink_loops = []
+
+        try:
+            root_stat = self.project_root.stat()
+        except OSError:
+            self._built = True
+            return self
+
+        # 栈中保存 (绝对路径, 相对路径, 深度, 祖先目录的 (st_dev, st_ino) 集合)
+        stack = [(str(self.project_root), "", 0, frozenset([(root_stat.st_dev, root_stat.st_ino)]))]
+        while stack:
+            abs_dir, rel_dir, depth, ancestors = stack.pop()
+            children = self._children.setdefault(rel_dir, [])
+
+            try:
+                with os.scandir(abs_dir) as it:
+                    dir_entries = list(it)
+            except OSError:
+                # 无权限访问或在遍历过程中被删除的目录
+                continue
+
+            for dir_entry in dir_entries:
+                try:
+                    is_dir = dir_entry.is_dir()
+                    if is_dir and dir_entry.name in self.exclude_dirs:
+                        continue
+                    st = dir_entry.stat()
+                except OSError:
+                    # 失效的符号链接或无权限访问的条目
+                    continue
+
+                rel_path = f"{rel_dir}/{dir_entry.name}" if rel_dir else dir_entry.name
+                entry = FileEntry(
+                    path=rel_path,
+                    name=dir_entry.name,
+                    is_dir=is_dir,
+                    size=0 if is_dir else st.st_size,
+                    mtime=st.st_mtime,
+                    inode=st.st_ino,
+                    depth=depth,
+                )
+                self._entries[rel_path] = entry
+                children.append(entry)
+
+                if is_dir and (self.max_depth is None or depth + 1 < self.max_depth):
+                    key = (st.st_dev, st.st_ino)
+                    if key in ancestors:
+                        # 符号链接指向了自身的祖先目录，停止深入
+                        self.symlink_loops.append(rel_path)
+                        continue
+                    stack.append((dir_entry.path, rel_path, depth + 1, ancestors | {key}))
+
+        for children in self._children.values():
+            children.sort(key=lambda e: e.name)
+
+        self._built = True
+        return self
+
+    def load_entries(self, entries: Iterable[FileEntry], symlink_loops: Optional[List[str]] = None) -> "FileIndex":
+        """直接从已有条目构建索引（例如持久化的元数据索引），不访问磁盘"""
+        self._entries = {}
+        self._children = {"": []}
+        self._by_suffix = None
+        self._fingerprints = {}
+        self.symlink_loops = list(symlink_loops or [])
+
+        for entry in entries:
+            self._entries[entry.path] = entry
+            parent = entry.path.rpartition("/")[0]
+            self._children.setdefault(parent, []).append(entry)
+
+        for children in self._children.values():
+            children.sort(key=lambda e: e.name)
+
+        self._built = True
+        return self
+
+    def _ensure_built(self):
+        if not self._built:
+            self.build()
+
+    def __len__(self) -> int:
+        self._ensure_built()
+        return len(self._entries)
+
+    def get(self, rel_path: str) -> Optional[FileEntry]:
+        """按相对路径获取条目"""
+        self._ensure_built()
+        return self._entries.get(self._normalize(rel_path))
+
+    def exists(self, rel_path: str) -> bool:
+        """判断路径是否存在于索引中"""
+        return self.get(rel_path) is not None
+
+    def is_dir(self, rel_path: str) -> bool:
+        entry = self.get(rel_path)
+        return entry is not None and entry.is_dir
+
+    def is_file(self, rel_path: str) -> bool:
+        entry = self.get(rel_path)
+        return entry is not None and not entry.is_dir
+
+    def children(self, rel_dir: str = "") -> List[FileEntry]:
+        """获取目录的直接子项（按名称排序）"""
+        self._ensure_built()
+        return self._children.get(self._normalize(rel_dir), [])
+
+    def entries(self, under: str = "") -> Iterable[FileEntry]:
+        """遍历索引中的条目，可限定在某个目录下"""
+        self._ensure_built()
+        prefix = self._normalize(under)
+        if not prefix:
+            return self._entries.values()
+        prefix += "/"
+        return (e for e in self._entries.values() if e.path.startswith(prefix))
+
+    def files(self, under: str = "") -> Iterable[FileEntry]:
+        """遍历索引中的文件"""
+        return (e for e in self.entries(under) if not e.is_dir)
+
+    def glob(self, pattern: str, under: str = "") -> List[FileEntry]:
+        """
+        在索引中按模式匹配条目，语义与 Path.glob 相近：
+        - "*.py" 只匹配 under 目录的直接子项
+        - "**/*.py" 匹配 under 目录下任意深度
+        - 以 / 结尾的模式只匹配目录
+        """
+        self._ensure_built()
+        dirs_only = pattern.endswith("/")
+        pattern = pattern.rstrip("/")
+        recursive = pattern.startswith("**/")
+        name_pattern = pattern[3:] if recursive else pattern
+
+        if recursive:
+            candidates = self._recursive_candidates(name_pattern, under)
+        else:
+            candidates = self.children(under)
+
+        regex = re.compile(fnmatch.translate(name_pattern))
+        return [
+            e for e in candidates
+            if regex.match(e.name) and (e.is_dir or not dirs_only)
+        ]
+
+    def any(self, pattern: str, under: str = "") -> bool:
+        """判断是否存在匹配模式的条目"""
+        return bool(self.glob(pattern, under))
+
+    def fingerprint(self, structure_only: bool = False) -> str:
+        """
+        索引内容的指纹
+        structure_only=True 时只包含路径和类型，文件内容修改不会改变结构指纹
+        """
+        self._ensure_built()
+        if structure_only not in self._fingerprints:
+            digest = hashlib.sha1()
+            for path in sorted(self._entries):
+                entry = self._entries[path]
+                if structure_only:
+                    digest.update(f"{path}\0{int(entry.is_dir)}\n".encode('utf-8', 'surrogateescape'))
+                else:
+                    digest.update(f"{path}\0{int(entry.is_dir)}\0{entry.size}\0{entry.mtime!r}\n"
+                                  .encode('utf-8', 'surrogateescape'))
+            self._fingerprints[structure_only] = digest.hexdigest()
+        return self._fingerprints[structure_only]
+
+    def _recursive_candidates(self, name_pattern: str, under: str) -> Iterable[FileEntry]:
+        """递归匹配的候选条目，"*.ext" 形式的模式直接走后缀索引"""
+        suffix = self._simple_suffix(name_pattern)
+        if suffix is None:
+            return self.entries(under)
+
+        if self._by_suffix is None:
+            self._by_suffix = {}
+            for entry in self._entries.values():
+                self._by_suffix.setdefault(os.path.splitext(entry.name)[1], []).append(entry)
+
+        candidates = self._by_suffix.get(suffix, [])
+        prefix = self._normalize(under)
+        if prefix:
+            prefix += "/"
+            candidates = [e for e in candidates if e.path.startswith(prefix)]
+        return candidates
+
+    @staticmethod
+    def _simple_suffix(name_pattern: str) -> Optional[str]:
+        """提取 "*.ext" 形式模式的后缀（索引按单个扩展名分组，"*.tar.gz" 等多段后缀走通配匹配）"""
+        if not name_pattern.startswith("*."):
+            return None
+        suffix = name_pattern[1:]
+        if any(ch in suffix for ch in "*?[]") or "." in suffix[1:]:
+            return None
+        return suffix
+
+    @staticmethod
+    def _normalize(rel_path: str) -> str:
+        normalized = str(rel_path).replace("\\", "/").strip("/")
+        while normalized.startswith("./"):
+            normalized = normalized[2:]
+        return "" if normalized == "." else normalized
@@ -0,0 +1,654 @@
+#!/usr/bin/env python3
+"""
+只读 Git 仓库读取器
+直接解析 .git 目录（HEAD、refs/、packed-refs、松散对象和 pack 文件），
+解析引用、读取提交元数据、列出最近提交，并通过比较引用值发现新提交，
+不启动 git 子进程。守护进程和刷新检查频繁调用这些操作，
+在 git 命令缺失、缓慢或被沙箱限制时也能正常工作
+
+手写的 pack 索引、pack 条目和增量解析可以与 git 命令的输出逐项对比校验
+（只有校验时才调用 git）:
+    python git_reader.py                     # 生成 gc 后的临时仓库（pack 文件、增量对象）并校验
+    python git_reader.py --project /path     # 校验指定仓库
+"""
+
+import os
+import sys
+import zlib
+import heapq
+import struct
+import argparse
+import subprocess
+import tempfile
+from pathlib import Path
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+OBJECT_TYPES = {1: "commit", 2: "tree", 3: "blob", 4: "tag"}
+OFS_DELTA = 6
+REF_DELTA = 7
+
+PACK_INDEX_SIGNATURE = b"\377tOc"
+PACK_READ_CHUNK = 16 * 1024
+
+# git log --oneline 的默认缩写长度
+SHORT_SHA_LENGTH = 7
+
+# 简写引用的查找顺序（见 git-rev-parse 文档）
+REF_SEARCH_PREFIXES = ("", "refs/", "refs/tags/", "refs/heads/", "refs/remotes/")
+
+# 最多跟随的符号引用层数
+MAX_SYMREF_DEPTH = 5
+
+
+class GitReaderError(Exception):
+    """仓库格式无法解析或对象缺失"""
+
+
+class Commit(NamedTuple):
+    """提交对象的元数据"""
+    sha: str
+    tree: str
+    parents: Tuple[str, ...]
+    author: str
+    author_time: int
+    committer_time: int
+    message: str
+
+    @property
+    def short_sha(self) -> str:
+        return self.sha[:SHORT_SHA_LENGTH]
+
+    @property
+    def subject(self) -> str:
+        return self.message.split("\n", 1)[0].strip()
+
+
+class _PackIndex:
+    """pack 索引（.idx 第 2 版），按对象名二分查找偏移量"""
+
+    def __init__(self, idx_path: Path):
+        with open(idx_path, 'rb') as f:
+            data = f.read()
+        if data[:4] != PACK_INDEX_SIGNATURE or struct.unpack(">I", data[4:8])[0] != 2:
+            raise GitReaderError(f"不支持的 pack 索引格式: {idx_path}")
+
+        fanout = struct.unpack(">256I", data[8:8 + 1024])
+        self.count = fanout[255]
+        names_start = 8 + 1024
+        crc_start = names_start + 20 * self.count
+        offsets_start = crc_start + 4 * self.count
+        self._large_offsets_start = offsets_start + 4 * self.count
+        self._data = data
+        self._names_start = names_start
+        self._offsets_start = offsets_start
+        self._fanout = fanout
+        self.pack_path = idx_path.with_suffix(".pack")
+
+    def _name(self, i: int) -> bytes:
+        start = self._names_start + 20 * i
+        return self._data[start:start + 20]
+
+    def find(self, binsha: bytes) -> Optional[int]:
+        """返回对象在 pack 中的偏移量，不存在时返回 None"""
+        first = binsha[0]
+        lo = self._fanout[first - 1] if first else 0
+        hi = self._fanout[first]
+        while lo < hi:
+            mid = (lo + hi) // 2
+            name = self._name(mid)
+            if name < binsha:
+                lo = mid + 1
+            elif name > binsha:
+                hi = mid
+            else:
+                return self._offset(mid)
+        return None
+
+    def _offset(self, i: int) -> int:
+        start = self._offsets_start + 4 * i
+        offset = struct.unpack(">I", self._data[start:start + 4])[0]
+        if offset & 0x80000000:
+            # 大于 2GB 的 pack 使用 64 位偏移表
+            start = self._large_offsets_start + 8 * (offset & 0x7fffffff)
+            offset = struct.unpack(">Q", self._data[start:start + 8])[0]
+        return offset
+
+
+class GitReader:
+    """只读访问项目的 Git 仓库"""
+
+    def __init__(self, project_root="."):
+        self.project_root = Path(project_root).resolve()
+        self.git_dir, self.common_dir = self._discover()
+        self._commits: Dict[str, Commit] = {}
+        self._packs: Optional[List[_PackIndex]] = None
+        self._packs_signature = None
+        self._packed_refs: Optional[Dict[str, str]] = None
+        self._packed_refs_signature = None
+
+    # ------------------------------------------------------------------
+    # 仓库发现
+
+    def _discover(self) -> Tuple[Optional[Path], Optional[Path]]:
+        """从项目目录向上查找 .git（支持 worktree/子模块的 gitdir 文件）"""
+        for directory in [self.project_root] + list(self.project_root.parents):
+            candidate = directory / ".git"
+            if candidate.is_dir():
+                git_dir = candidate
+            elif candidate.is_file():
+                try:
+                    content = candidate.read_text(encoding='utf-8').strip()
+                except OSError:
+                    continue
+                if not content.startswith("gitdir:"):
+                    continue
+                git_dir = (directory / content[len("gitdir:"):].strip()).resolve()
+            else:
+                continue
+
+            if not (git_dir / "HEAD").is_file():
+                continue
+            common_dir = git_dir
+            commondir_file = git_dir / "commondir"
+            if commondir_file.is_file():
+                try:
+                    common_dir = (git_dir / commondir_file.read_text(encoding='utf-8').strip()).resolve()
+                except OSError:
+                    pass
+            return git_dir, common_dir
+        return None, None
+
+    def is_repository(self) -> bool:
+        return self.git_dir is not None
+
+    # ------------------------------------------------------------------
+    # 引用
+
+    def _ref_file(self, ref: str) -> Path:
+        # HEAD 和 worktree 私有引用位于 git_dir，其余引用位于公共目录
+        if ref == "HEAD" or "/" not in ref:
+            return self.git_dir / ref
+        return self.common_dir / ref
+
+    def _read_packed_refs(self) -> Dict[str, str]:
+        path = self.common_dir / "packed-refs"
+        try:
+            st = os.stat(path)
+            signature = (st.st_mtime_ns, st.st_size)
+        except OSError:
+            signature = None
+
+        if signature != self._packed_refs_signature or self._packed_refs is None:
+            refs: Dict[str, str] = {}
+            if signature is not None:
+                with open(path, 'r', encoding='utf-8', errors='replace') as f:
+                    for line in f:
+                        line = line.strip()
+                        # 跳过注释头和 ^ 开头的剥离标签行
+                        if not line or line[0] in "#^":
+                            continue
+                        sha, _, name = line.partition(" ")
+                        refs[name] = sha
+            self._packed_refs = refs
+            self._packed_refs_signature = signature
+        return self._packed_refs
+
+    def _read_ref(self, ref: str) -> Optional[str]:
+        """读取单个引用的原始值（sha 或 "ref: ..."），松散引用优先于 packed-refs"""
+        try:
+            with open(self._ref_file(ref), 'r', encoding='utf-8') as f:
+                return f.read().strip()
+        except (OSError, UnicodeDecodeError):
+            return self._read_packed_refs().get(ref)
+
+    def resolve_ref(self, ref: str) -> Optional[str]:
+        """解析引用（跟随符号引用）为提交 sha，不存在时返回 None"""
+        if not self.is_repository():
+            return None
+        for _ in range(MAX_SYMREF_DEPTH):
+            value = self._read_ref(ref)
+            if value is None:
+                return None
+            if not value.startswith("ref:"):
+                return value
+            ref = value[len("ref:"):].strip()
+        return None
+
+    def head(self) -> Optional[str]:
+        """HEAD 指向的提交 sha（空仓库返回 None）"""
+        return self.resolve_ref("HEAD")
+
+    def refs(self, prefix: str = "refs/") -> Dict[str, str]:
+        """列出所有引用及其 sha（松散引用覆盖 packed-refs）"""
+        if not self.is_repository():
+            return {}
+        result = {name: sha for name, sha in self._read_packed_refs().items() if name.startswith(prefix)}
+        base = self.common_dir / prefix
+        for dirpath, _dirnames, filenames in os.walk(base):
+            for filename in filenames:
+                full = Path(dirpath) / filename
+                name = prefix + full.relative_to(base).as_posix()
+                value = self.resolve_ref(name)
+                if value:
+                    result[name] = value
+        return result
+
+    def snapshot(self) -> Dict[str, str]:
+        """
+        当前引用快照（HEAD 和所有分支），用于比较两次检查之间是否有新提交
+        快照可直接 JSON 序列化保存
+        """
+        snapshot = self.refs("refs/heads/")
+        head = self.head()
+        if head:
+            snapshot["HEAD"] = head
+        return snapshot
+
+    def resolve(self, rev: str) -> Optional[str]:
+        """
+        解析版本表达式：完整 sha、HEAD、分支/标签简写，以及 ~N 后缀（沿第一父提交回溯）
+        无法解析时返回 None
+        """
+        if not self.is_repository():
+            return None
+        base, _, steps = rev.partition("~")
+        try:
+            count = int(steps) if steps else (1 if "~" in rev else 0)
+        except ValueError:
+            return None
+
+        sha = None
+        if len(base) == 40 and all(c in "0123456789abcdef" for c in base):
+            sha = base
+        else:
+            for prefix in REF_SEARCH_PREFIXES:
+                sha = self.resolve_ref(prefix + base)
+                if sha:
+                    break
+        if not sha:
+            return None
+
+        try:
+            for _ in range(count):
+                parents = self.commit(sha).parents
+                if not parents:
+                    return None
+                sha = parents[0]
+        except GitReaderError:
+            return None
+        return sha
+
+    # ------------------------------------------------------------------
+    # 对象
+
+    def _object_dirs(self) -> List[Path]:
+        dirs = [self.common_dir / "objects"]
+        alternates = dirs[0] / "info" / "alternates"
+        try:
+            with open(alternates, 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if line and not line.startswith("#"):
+                        dirs.append((dirs[0] / line).resolve())
+        except OSError:
+            pass
+        return dirs
+
+    def _pack_indexes(self) -> List[_PackIndex]:
+        """加载 pack 索引，pack 目录变化（gc/fetch）后重新加载"""
+        pack_dirs = [d / "pack" for d in self._object_dirs()]
+        signature = []
+        for pack_dir in pack_dirs:
+            try:
+                signature.append(os.stat(pack_dir).st_mtime_ns)
+            except OSError:
+                signature.append(None)
+        signature = tuple(signature)
+
+        if self._packs is None or signature != self._packs_signature:
+            packs = []
+            for pack_dir in pack_dirs:
+                try:
+                    idx_files = sorted(pack_dir.glob("*.idx"))
+                except OSError:
+                    continue
+                for idx_path in idx_files:
+                    try:
+                        packs.append(_PackIndex(idx_path))
+                    except (OSError, GitReaderError, struct.error):
+                        continue
+            self._packs = packs
+            self._packs_signature = signature
+        return self._packs
+
+    def read_object(self, sha: str) -> Tuple[str, bytes]:
+        """读取对象，返回 (类型, 内容)"""
+        if not self.is_repository():
+            raise GitReaderError("不是 Git 仓库")
+
+        for objects_dir in self._object_dirs():
+            path = objects_dir / sha[:2] / sha[2:]
+            try:
+                with open(path, 'rb') as f:
+                    raw = zlib.decompress(f.read())
+            except OSError:
+                continue
+            except zlib.error as e:
+                raise GitReaderError(f"损坏的松散对象 {sha}: {e}")
+            header, _, body = raw.partition(b"\0")
+            obj_type = header.split(b" ", 1)[0].decode('ascii')
+            return obj_type, body
+
+        binsha = bytes.fromhex(sha)
+        for pack in self._pack_indexes():
+            offset = pack.find(binsha)
+            if offset is not None:
+                return self._read_packed(pack.pack_path, offset)
+
+        raise GitReaderError(f"找不到对象: {sha}")
+
+    def _read_packed(self, pack_path: Path, offset: int) -> Tuple[str, bytes]:
+        with open(pack_path, 'rb') as f:
+            return self._read_pack_entry(f, offset)
+
+    def _read_pack_entry(self, f, offset: int) -> Tuple[str, bytes]:
+        f.seek(offset)
+        byte = f.read(1)[0]
+        type_num = (byte >> 4) & 0x7
+        shift = 4
+        while byte & 0x80:
+            byte = f.read(1)[0]
+            shift += 7
+
+        if type_num == OFS_DELTA:
+            byte = f.read(1)[0]
+            base_distance = byte & 0x7f
+            while byte & 0x80:
+                byte = f.read(1)[0]
+                base_distance = ((base_distance + 1) << 7) | (byte & 0x7f)
+            delta = self._inflate(f)
+            base_type, base = self._read_pack_entry(f, offset - base_distance)
+            return base_type, _apply_delta(base, delta)
+
+        if type_num == REF_DELTA:
+            base_sha = f.read(20).hex()
+            delta = self._inflate(f)
+            base_type, base = self.read_object(base_sha)
+            return base_type, _apply_delta(base, delta)
+
+        if type_num not in OBJECT_TYPES:
+            raise GitReaderError(f"未知的 pack 对象类型: {type_num}")
+        return OBJECT_TYPES[type_num], self._inflate(f)
+
+    @staticmethod
+    def _inflate(f) -> bytes:
+        """从当前位置解压一个 zlib 流"""
+        decompressor = zlib.decompressobj()
+        chunks = []
+        while not decompressor.eof:
+            data = f.read(PACK_READ_CHUNK)
+            if not data:
+                break
+            chunks.append(decompressor.decompress(data))
+        return b"".join(chunks)
+
+    # ------------------------------------------------------------------
+    # 提交
+
+    def commit(self, sha: str) -> Commit:
+        """读取并解析提交对象（同一实例内缓存）"""
+        cached = self._commits.get(sha)
+        if cached is not None:
+            return cached
+
+        obj_type, body = self.read_object(sha)
+        if obj_type == "tag":
+            return self.commit(_parse_headers(body)[0].get("object", [""])[0])
+        if obj_type != "commit":
+            raise GitReaderError(f"{sha} 不是提交对象: {obj_type}")
+
+        headers, message = _parse_headers(body)
+        author, author_time = _parse_signature(headers.get("author", [""])[0])
+        _committer, committer_time = _parse_signature(headers.get("committer", [""])[0])
+        commit = Commit(
+            sha=sha,
+            tree=headers.get("tree", [""])[0],
+            parents=tuple(headers.get("parent", [])),
+            author=author,
+            author_time=author_time,
+            committer_time=committer_time,
+            message=message,
+        )
+        self._commits[sha] = commit
+        return commit
+
+    def iter_commits(self, start: str = "HEAD", limit: Optional[int] = None,
+                     first_parent: bool = False, stop_at: Optional[str] = None) -> Iterator[Commit]:
+        """
+        按提交时间从新到旧遍历历史（与 git log 默认顺序一致）
+        stop_at 指定的提交及其祖先不再输出（相当于 git log stop_at..start）
+        """
+        sha = self.resolve(start)
+        if not sha:
+            return
+
+        excluded = self._ancestors(stop_at) if stop_at else set()
+        seen = {sha}
+        heap = [(-self.commit(sha).committer_time, 0, sha)]
+        counter = 1
+        emitted = 0
+
+        while heap and (limit is None or emitted < limit):
+            _, _, current = heapq.heappop(heap)
+            if current in excluded:
+                continue
+            commit = self.commit(current)
+            yield commit
+            emitted += 1
+
+            parents = commit.parents[:1] if first_parent else commit.parents
+            for parent in parents:
+                if parent in seen or parent in excluded:
+                    continue
+                seen.add(parent)
+                try:
+                    parent_time = self.commit(parent).committer_time
+                except GitReaderError:
+                    # 浅克隆中缺失的父提交
+                    continue
+                heapq.heappush(heap, (-parent_time, counter, parent))
+                counter += 1
+
+    def _ancestors(self, rev: str) -> set:
+        sha = self.resolve(rev)
+        if not sha:
+            return set()
+        ancestors = set()
+        stack = [sha]
+        while stack:
+            current = stack.pop()
+            if current in ancestors:
+                continue
+            ancestors.add(current)
+            try:
+                stack.extend(self.commit(current).parents)
+            except GitReaderError:
+                continue
+        return ancestors
+
+    def recent_commits(self, limit: int = 5) -> List[Commit]:
+        """最近的提交（git log -n limit）"""
+        try:
+            return list(self.iter_commits("HEAD", limit=limit))
+        except GitReaderError:
+            return []
+
+
+def _parse_headers(body: bytes) -> Tuple[Dict[str, List[str]], str]:
+    """解析提交/标签对象的头部（多行头部以空格续行，如 gpgsig）"""
+    header_part, _, message = body.partition(b"\n\n")
+    headers: Dict[str, List[str]] = {}
+    last_key = None
+    for line in header_part.decode('utf-8', 'replace').split("\n"):
+        if line.startswith(" ") and last_key:
+            headers[last_key][-1] += "\n" + line[1:]
+            continue
+        key, _, value = line.partition(" ")
+        headers.setdefault(key, []).append(value)
+        last_key = key
+    return headers, message.decode('utf-8', 'replace')
+
+
+def _parse_signature(value: str) -> Tuple[str, int]:
+    """解析 "Name <email> 1700000000 +0800"，返回 (Name <email>, 时间戳)"""
+    identity, _, rest = value.rpartition("> ")
+    try:
+        timestamp = int(rest.split()[0])
+    except (IndexError, ValueError):
+        timestamp = 0
+    return (identity + ">" if identity else value), timestamp
+
+
+def _read_varint(data: bytes, pos: int) -> Tuple[int, int]:
+    result = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7f) << shift
+        shift += 7
+        if not byte & 0x80:
+            return result, pos
+
+
+def _apply_delta(base: bytes, delta: bytes) -> bytes:
+    """应用 pack 增量（copy/insert 指令）"""
+    _src_size, pos = _read_varint(delta, 0)
+    dst_size, pos = _read_varint(delta, pos)
+    out = bytearray()
+    while pos < len(delta):
+        op = delta[pos]
+        pos += 1
+        if op & 0x80:
+            copy_offset = copy_size = 0
+            for i in range(4):
+                if op & (1 << i):
+                    copy_offset |= delta[pos] << (8 * i)
+                    pos += 1
+            for i in range(3):
+                if op & (1 << (4 + i)):
+                    copy_size |= delta[pos] << (8 * i)
+                    pos += 1
+            out += base[copy_offset:copy_offset + (copy_size or 0x10000)]
+        elif op:
+            out += delta[pos:pos + op]
+            pos += op
+        else:
+            raise GitReaderError("无效的增量指令")
+    if len(out) != dst_size:
+        raise GitReaderError("增量应用后大小不一致")
+    return bytes(out)
+
+
+# ----------------------------------------------------------------------
+# 与 git 命令对比校验
+
+VERIFY_COMMIT_LIMIT = 200
+VERIFY_OBJECT_LIMIT = 5000
+
+
+def verify_against_git(project_root=".", limit: int = VERIFY_COMMIT_LIMIT,
+                       max_objects: int = VERIFY_OBJECT_LIMIT) -> List[str]:
+    """
+    将 iter_commits 的遍历结果与 git log、read_object 读取的对象与 git cat-file 逐项对比，
+    返回不一致项的描述（为空表示全部一致）
+    """
+    reader = GitReader(project_root)
+    if not reader.is_repository():
+        return [f"不是 Git 仓库: {reader.project_root}"]
+
+    def git(*args, data: Optional[bytes] = None) -> bytes:
+        return subprocess.run(["git", *args], cwd=reader.project_root, input=data,
+                              capture_output=True, check=True).stdout
+
+    problems = []
+    for first_parent in (False, True):
+        options = ["--first-parent"] if first_parent else []
+        expected = git("log", "--format=%H", "-n", str(limit), *options).decode().split()
+        actual = [commit.sha for commit in reader.iter_commits("HEAD", limit=limit, first_parent=first_parent)]
+        if actual != expected:
+            problems.append(f"iter_commits(first_parent={first_parent}) 与 git log {' '.join(options)} 不一致")
+
+    shas = git("cat-file", "--batch-all-objects", "--batch-check=%(objectname)").decode().split()[:max_objects]
+    output = git("cat-file", "--batch", data="".join(sha + "\n" for sha in shas).encode())
+    pos = 0
+    for sha in shas:
+        header_end = output.index(b"\n", pos)
+        _name, obj_type, size = output[pos:header_end].decode().split()
+        content = output[header_end + 1:header_end + 1 + int(size)]
+        pos = header_end + 1 + int(size) + 1
+        try:
+            actual_object = reader.read_object(sha)
+        except GitReaderError as e:
+            problems.append(f"{sha}: {e}")
+            continue
+        if actual_object != (obj_type, content):
+            problems.append(f"{sha}: 与 git cat-file 读取的 {obj_type} 对象不一致")
+    return problems
+
+
+def _build_sample_repository(path: Path):
+    """生成带分支合并、多次修改同一文件（产生增量对象）并执行过 gc 的仓库，gc 后再留下一个松散提交"""
+    env = dict(os.environ, GIT_CONFIG_NOSYSTEM="1", GIT_AUTHOR_NAME="verify", GIT_AUTHOR_EMAIL="verify@example.com",
+               GIT_COMMITTER_NAME="verify", GIT_COMMITTER_EMAIL="verify@example.com")
+    timestamp = [1700000000]
+
+    def git(*args):
+        timestamp[0] += 60
+        date = f"{timestamp[0]} +0000"
+        subprocess.run(["git", *args], cwd=path, check=True, capture_output=True,
+                       env=dict(env, GIT_AUTHOR_DATE=date, GIT_COMMITTER_DATE=date))
+
+    def write_and_commit(name: str, revision: int):
+        lines = [f"line {i}: {'changed' if i % 40 == revision % 40 else 'stable'} content\n" for i in range(400)]
+        (path / name).write_text("".join(lines) + f"revision {revision}\n", encoding='utf-8')
+        git("add", name)
+        git("commit", "-q", "-m", f"{name} 第 {revision} 次修改")
+
+    git("init", "-q")
+    git("symbolic-ref", "HEAD", "refs/heads/main")
+    for revision in range(30):
+        write_and_commit("main.txt", revision)
+    git("checkout", "-q", "-b", "feature")
+    for revision in range(10):
+        write_and_commit("feature.txt", revision)
+    git("checkout", "-q", "main")
+    write_and_commit("main.txt", 30)
+    git("merge", "-q", "--no-ff", "-m", "合并 feature", "feature")
+    git("tag", "-a", "v1", "-m", "附注标签")
+    git("gc", "-q", "--aggressive")
+    write_and_commit("main.txt", 31)
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="校验 Git 读取器与 git 命令的输出是否一致")
+    parser.add_argument("--project", help="要校验的仓库（默认生成一个 gc 后的临时仓库）")
+    parser.add_argument("--limit", type=int, default=VERIFY_COMMIT_LIMIT, help="对比的提交数")
+    args = parser.parse_args()
+
+    if args.project:
+        problems = verify_against_git(args.project, args.limit)
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            _build_sample_repository(Path(tmp))
+            problems = verify_against_git(tmp, args.limit)
+
+    if problems:
+        print(f"❌ 发现 {len(problems)} 处不一致:")
+        for problem in problems:
+            print(f"  - {problem}")
+        sys.exit(1)
+    print("✅ Git 读取器与 git 命令的输出一致")
+
+if __name__ == "__main__":
+    main()
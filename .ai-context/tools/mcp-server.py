@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""
+MCP（Model Context Protocol）服务器
+通过标准输入输出（每行一条 JSON-RPC 2.0 消息）向 AI 客户端提供项目上下文：
+    资源 ai-context://sections/<章节名>   上下文总结的单个章节（Markdown）
+    资源 ai-context://sessions            最近的工作会话（JSON）
+    资源 ai-context://refresh-report      刷新需求报告（文本）
+每个资源同时提供同名工具（get_<章节名> / list_sessions / get_refresh_report）。
+内容在首次读取时才计算，并在进程内缓存 RESOURCE_CACHE_SECONDS 秒；
+章节只求值自身声明的输入（磁盘上的章节缓存按输入指纹复用），
+读取"最近更新"不会触发"项目结构与重要文件"所需的全量目录遍历。
+需要在 context-config.json 中启用 integrations.mcp
+
+使用方法（在 MCP 客户端中配置为 stdio 服务器）:
+python .ai-context/tools/mcp-server.py --project /path/to/project
+"""
+
+import sys
+import json
+import time
+import argparse
+from contextlib import redirect_stdout
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+# 添加当前目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent))
+
+from refresh_engine import get_engine, load_tool_module  # type: ignore
+from session_store import SessionStore, CATALOG_DB_NAME  # type: ignore
+
+SERVER_NAME = "ai-context"
+SERVER_VERSION = "1.0.0"
+# 支持的协议版本（新的在前）；客户端请求的版本不在列表中时使用第一个
+SUPPORTED_PROTOCOL_VERSIONS = ("2025-06-18", "2025-03-26", "2024-11-05")
+
+URI_SCHEME = "ai-context://"
+SECTION_URI_PREFIX = URI_SCHEME + "sections/"
+SESSIONS_URI = URI_SCHEME + "sessions"
+REFRESH_REPORT_URI = URI_SCHEME + "refresh-report"
+
+# 计算结果在进程内的缓存时间（秒）
+RESOURCE_CACHE_SECONDS = 30
+DEFAULT_SESSION_LIMIT = 20
+
+# JSON-RPC / MCP 错误码
+RPC_PARSE_ERROR = -32700
+RPC_INVALID_REQUEST = -32600
+RPC_METHOD_NOT_FOUND = -32601
+RPC_INVALID_PARAMS = -32602
+RPC_INTERNAL_ERROR = -32603
+RESOURCE_NOT_FOUND = -32002
+
+
+class MCPError(Exception):
+    """返回给客户端的 JSON-RPC 错误"""
+
+    def __init__(self, code: int, message: str):
+        super().__init__(message)
+        self.code = code
+
+
+class ResourceCache:
+    """按键缓存计算结果，过期后下次读取时重新计算"""
+
+    def __init__(self, ttl: float = RESOURCE_CACHE_SECONDS):
+        self.ttl = ttl
+        self._entries: Dict[str, Tuple[float, object]] = {}
+        self.stats = {"hits": 0, "misses": 0}
+
+    def get(self, key: str, compute: Callable[[], object]):
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > now:
+            self.stats["hits"] += 1
+            return entry[1]
+        self.stats["misses"] += 1
+        value = compute()
+        self._entries[key] = (now + self.ttl, value)
+        return value
+
+
+class ContextProvider:
+    """按需计算各章节、会话列表和刷新报告（共用进程内刷新引擎）"""
+
+    def __init__(self, project_root: str = "."):
+        self.project_root = Path(project_root).resolve()
+        self.ai_context_dir = self.project_root / ".ai-context"
+        self.engine = get_engine(str(self.project_root))
+        self.cache = ResourceCache()
+        self._sections: Optional[List[Tuple[str, str]]] = None
+
+    def sections(self) -> List[Tuple[str, str]]:
+        """(章节名, 标题) 列表（不计算内容）"""
+        if self._sections is None:
+            self._sections = self.engine.generator.list_sections()
+        return self._sections
+
+    def section(self, name: str):
+        """单个章节的 ContextSection（完整档位）"""
+        if name not in dict(self.sections()):
+            raise MCPError(RESOURCE_NOT_FOUND, f"未知章节: {name}")
+        return self.cache.get(f"section:{name}", lambda: self.engine.generator.generate_section(name))
+
+    def section_markdown(self, name: str) -> str:
+        section = self.section(name)
+        return f"## {section.title}\n{section.content}\n"
+
+    def section_json(self, name: str) -> str:
+        section = self.section(name)
+        return json.dumps({"name": section.name, "title": section.title, "content": section.content,
+                           "data": section.data}, ensure_ascii=False, indent=2)
+
+    def sessions(self, limit: int = DEFAULT_SESSION_LIMIT) -> List[Dict]:
+        """最近的会话（按开始时间倒序）"""
+        def load():
+            store = SessionStore(self.ai_context_dir / "sessions", self.ai_context_dir / "cache" / CATALOG_DB_NAME)
+            fields = ("session_id", "title", "description", "status", "start_time", "end_time", "tags")
+            return [{field: session.get(field) for field in fields} for session in store.recent(limit=limit)]
+        return self.cache.get(f"sessions:{limit}", load)
+
+    def refresh_report(self) -> str:
+        """刷新需求报告（文本）"""
+        def build():
+            report = self.engine.report()
+            return load_tool_module("smart-refresh.py").format_refresh_report(report)
+        return self.cache.get("refresh-report", build)
+
+
+class MCPServer:
+    """MCP 请求处理：resources/* 和 tools/* 均映射到 ContextProvider"""
+
+    def __init__(self, provider: ContextProvider):
+        self.provider = provider
+        self.methods = {
+            "initialize": self.initialize,
+            "ping": lambda params: {},
+            "resources/list": self.list_resources,
+            "resources/templates/list": lambda params: {"resourceTemplates": []},
+            "resources/read": self.read_resource,
+            "tools/list": self.list_tools,
+            "tools/call": self.call_tool,
+        }
+
+    def handle(self, message) -> Optional[Dict]:
+        """处理一条消息，通知（没有 id）不返回响应"""
+        if not isinstance(message, dict) or message.get("jsonrpc") != "2.0" or "method" not in message:
+            return _error(None, RPC_INVALID_REQUEST, "不是有效的 JSON-RPC 2.0 请求")
+        request_id = message.get("id")
+        is_notification = "id" not in message
+        handler = self.methods.get(message["method"])
+        if handler is None:
+            if is_notification:
+                # notifications/initialized 等通知无需处理
+                return None
+            return _error(request_id, RPC_METHOD_NOT_FOUND, f"未知方法: {message['method']}")
+        params = message.get("params") or {}
+        if not isinstance(params, dict):
+            return None if is_notification else _error(request_id, RPC_INVALID_PARAMS, "params 必须是对象")
+        try:
+            # 工具模块的提示信息输出到标准错误，标准输出只用于协议消息
+            with redirect_stdout(sys.stderr):
+                result = handler(params)
+        except MCPError as e:
+            return None if is_notification else _error(request_id, e.code, str(e))
+        except Exception as e:
+            return None if is_notification else _error(request_id, RPC_INTERNAL_ERROR, str(e))
+        return None if is_notification else {"jsonrpc": "2.0", "id": request_id, "result": result}
+
+    def initialize(self, params: Dict) -> Dict:
+        requested = params.get("protocolVersion")
+        version = requested if requested in SUPPORTED_PROTOCOL_VERSIONS else SUPPORTED_PROTOCOL_VERSIONS[0]
+        return {
+            "protocolVersion": version,
+            "capabilities": {"resources": {}, "tools": {}},
+            "serverInfo": {"name": SERVER_NAME, "version": SERVER_VERSION},
+            "instructions": "项目上下文按章节提供，只读取需要的章节即可，无需获取完整上下文。",
+        }
+
+    def list_resources(self, params: Dict) -> Dict:
+        resources = [{
+            "uri": SECTION_URI_PREFIX + name,
+            "name": name,
+            "title": title,
+            "description": f"上下文章节「{title}」",
+            "mimeType": "text/markdown",
+        } for name, title in self.provider.sections()]
+        resources.append({"uri": SESSIONS_URI, "name": "sessions", "title": "工作会话",
+                          "description": f"最近 {DEFAULT_SESSION_LIMIT} 个工作会话", "mimeType": "application/json"})
+        resources.append({"uri": REFRESH_REPORT_URI, "name": "refresh-report", "title": "刷新报告",
+                          "description": "上下文是否需要刷新及原因", "mimeType": "text/plain"})
+        return {"resources": resources}
+
+    def read_resource(self, params: Dict) -> Dict:
+        uri = params.get("uri")
+        if not isinstance(uri, str):
+            raise MCPError(RPC_INVALID_PARAMS, "缺少 uri")
+        if uri.startswith(SECTION_URI_PREFIX):
+            mime_type, text = "text/markdown", self.provider.section_markdown(uri[len(SECTION_URI_PREFIX):])
+        elif uri == SESSIONS_URI:
+            mime_type, text = "application/json", json.dumps(self.provider.sessions(), ensure_ascii=False, indent=2)
+        elif uri == REFRESH_REPORT_URI:
+            mime_type, text = "text/plain", self.provider.refresh_report()
+        else:
+            raise MCPError(RESOURCE_NOT_FOUND, f"资源不存在: {uri}")
+        return {"contents": [{"uri": uri, "mimeType": mime_type, "text": text}]}
+
+    def list_tools(self, params: Dict) -> Dict:
+        format_schema = {
+            "type": "object",
+            "properties": {"format": {"type": "string", "enum": ["markdown", "json"], "default": "markdown",
+                                      "description": "markdown 为章节文本，json 包含结构化数据"}},
+        }
+        tools = [{
+            "name": f"get_{name}",
+            "description": f"获取上下文章节「{title}」（按需计算并缓存）",
+            "inputSchema": format_schema,
+        } for name, title in self.provider.sections()]
+        tools.append({
+            "name": "list_sessions",
+            "description": "列出最近的工作会话",
+            "inputSchema": {"type": "object", "properties": {
+                "limit": {"type": "integer", "minimum": 1, "default": DEFAULT_SESSION_LIMIT}}},
+        })
+        tools.append({
+            "name": "get_refresh_report",
+            "description": "获取上下文刷新需求报告",
+            "inputSchema": {"type": "object", "properties": {}},
+        })
+        return {"tools": tools}
+
+    def call_tool(self, params: Dict) -> Dict:
+        name = params.get("name")
+        arguments = params.get("arguments") or {}
+        sections = dict(self.provider.sections())
+        try:
+            if isinstance(name, str) and name.startswith("get_") and name[len("get_"):] in sections:
+                section_name = name[len("get_"):]
+                if arguments.get("format") == "json":
+                    text = self.provider.section_json(section_name)
+                else:
+                    text = self.provider.section_markdown(section_name)
+            elif name == "list_sessions":
+                limit = int(arguments.get("limit", DEFAULT_SESSION_LIMIT))
+                text = json.dumps(self.provider.sessions(max(1, limit)), ensure_ascii=False, indent=2)
+            elif name == "get_refresh_report":
+                text = self.provider.refresh_report()
+            else:
+                raise MCPError(RPC_INVALID_PARAMS, f"未知工具: {name}")
+        except MCPError:
+            raise
+        except Exception as e:
+            # 工具执行失败作为结果返回，客户端可以把错误交给模型处理
+            return {"content": [{"type": "text", "text": f"执行 {name} 时出错: {e}"}], "isError": True}
+        return {"content": [{"type": "text", "text": text}], "isError": False}
+
+
+def _error(request_id, code: int, message: str) -> Dict:
+    return {"jsonrpc": "2.0", "id": request_id, "error": {"code": code, "message": message}}
+
+
+def mcp_enabled(project_root: Path) -> bool:
+    """context-config.json 中 integrations.mcp 显式设为 true（缺少配置或该项时不启用）"""
+    try:
+        with open(project_root / ".ai-context" / "context-config.json", 'r', encoding='utf-8') as f:
+            integrations = json.load(f).get("integrations") or {}
+    except (OSError, ValueError, AttributeError):
+        return False
+    return integrations.get("mcp") is True
+
+
+def serve(server: MCPServer, stdin=None, stdout=None):
+    """逐行读取请求并写出响应，直到输入结束"""
+    stdin = stdin or sys.stdin.buffer
+    stdout = stdout or sys.stdout.buffer
+    for line in stdin:
+        if not line.strip():
+            continue
+        try:
+            message = json.loads(line.decode('utf-8'))
+        except (UnicodeDecodeError, ValueError):
+            response = _error(None, RPC_PARSE_ERROR, "消息不是有效的 JSON")
+        else:
+            if isinstance(message, list):
+                responses = [response for response in map(server.handle, message) if response is not None]
+                response = responses or None
+            else:
+                response = server.handle(message)
+        if response is not None:
+            stdout.write(json.dumps(response, ensure_ascii=False).encode('utf-8') + b"\n")
+            stdout.flush()
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="AI上下文 MCP 服务器（stdio）")
+    parser.add_argument("--project", default=".", help="项目路径")
+    args = parser.parse_args()
+
+    project_root = Path(args.project).resolve()
+    if not mcp_enabled(project_root):
+        print("❌ MCP 集成未启用：请在 .ai-context/context-config.json 中将 integrations.mcp 设为 true",
+              file=sys.stderr)
+        sys.exit(1)
+
+    print(f"🌐 AI上下文 MCP 服务器已启动: {project_root}", file=sys.stderr)
+    try:
+        serve(MCPServer(ContextProvider(str(project_root))))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+项目内容 Merkle 树
+叶子为文件内容哈希（复用持久化元数据索引中 mtime 未变化文件的哈希，
+其余文件在线程池中计算），目录节点哈希由子项的名称、类型和哈希组成。
+根哈希即项目内容指纹："上次刷新以来是否有相关变化"只需比较一次根哈希，
+不依赖 git
+"""
+
+import hashlib
+from typing import Dict, Iterable, List, Optional
+
+from change_watcher import DEFAULT_IGNORE_PREFIXES  # type: ignore
+from metadata_index import MetadataIndex  # type: ignore
+
+# 无法读取的文件使用的占位哈希
+UNREADABLE_HASH = "-"
+
+
+class MerkleTree:
+    """目录路径 -> 节点哈希（根目录路径为 ""）"""
+
+    def __init__(self, nodes: Dict[str, str]):
+        self.nodes = nodes
+
+    @property
+    def root(self) -> str:
+        return self.nodes.get("", _node_hash([]))
+
+    def top_level(self) -> Dict[str, str]:
+        """根目录直接子项的哈希，用于定位变化区域"""
+        return {path: self.nodes[path] for path in sorted(self.nodes) if path and "/" not in path}
+
+    @staticmethod
+    def changed_paths(current: Dict[str, str], previous: Optional[Dict[str, str]]) -> List[str]:
+        """比较两组节点哈希，返回新增、删除或内容变化的路径"""
+        previous = previous or {}
+        return sorted(path for path in current.keys() | previous.keys()
+                      if current.get(path) != previous.get(path))
+
+
+def build_merkle_tree(index: MetadataIndex, ignore_prefixes: Iterable[str] = DEFAULT_IGNORE_PREFIXES,
+                      max_workers: Optional[int] = None) -> MerkleTree:
+    """
+    根据元数据索引构建 Merkle 树
+    ignore_prefixes 下的文件（工具自身生成的缓存、日志、会话等）不计入指纹
+    """
+    ignore_prefixes = tuple(ignore_prefixes)
+    entries = [entry for entry in index.to_file_index().entries()
+               if not (entry.path + "/").startswith(ignore_prefixes)]
+
+    file_hashes = index.ensure_content_hashes(
+        (entry.path for entry in entries if not entry.is_dir), max_workers=max_workers)
+
+    children: Dict[str, List] = {"": []}
+    for entry in entries:
+        children.setdefault(entry.path.rpartition("/")[0], []).append(entry)
+        if entry.is_dir:
+            children.setdefault(entry.path, [])
+
+    # 从最深的目录开始自底向上计算
+    nodes: Dict[str, str] = {}
+    for directory in sorted(children, key=lambda path: path.count("/") if path else -1, reverse=True):
+        items = []
+        for entry in children[directory]:
+            if entry.is_dir:
+                items.append((entry.name, "d", nodes.get(entry.path, _node_hash([]))))
+            else:
+                items.append((entry.name, "f", file_hashes.get(entry.path) or UNREADABLE_HASH))
+        nodes[directory] = _node_hash(items)
+
+    # 文件节点也保留，便于 changed_paths 精确到文件
+    for path, digest in file_hashes.items():
+        nodes[path] = digest or UNREADABLE_HASH
+    return MerkleTree(nodes)
+
+
+def _node_hash(items) -> str:
+    digest = hashlib.blake2b(digest_size=20)
+    for name, kind, child_hash in sorted(items):
+        digest.update(f"{name}\0{kind}\0{child_hash}\n".encode('utf-8', 'surrogateescape'))
+    return digest.hexdigest()
@@ -0,0 +1,416 @@
+#!/usr/bin/env python3
+"""
+持久化文件元数据索引
+在 .ai-context/cache/file-index.db 中保存文件的路径、修改时间、大小、
+内容哈希和语言信息；刷新时只重新列出自身 mtime 发生变化的目录，
+其余目录复用上次的结果
+
+使用方法:
+    index = MetadataIndex.for_project(".").refresh()
+    file_index = index.to_file_index()   # 供 ContextGenerator / ProjectDetector 查询
+    index.query(language="Python")
+"""
+
+import os
+import json
+import time
+import hashlib
+import sqlite3
+from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from file_index import FileEntry, FileIndex
+
+INDEX_DB_NAME = "file-index.db"
+SCHEMA_VERSION = "1"
+
+# 目录 mtime 距扫描开始不足该时间时视为“不可信”，下次强制重新列出
+# （同一时间片内的后续修改不会改变 mtime）
+RACY_MTIME_NS = 2 * 1_000_000_000
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+LANGUAGE_BY_EXTENSION = {
+    ".py": "Python",
+    ".js": "JavaScript",
+    ".jsx": "JavaScript",
+    ".mjs": "JavaScript",
+    ".ts": "TypeScript",
+    ".tsx": "TypeScript",
+    ".vue": "Vue",
+    ".java": "Java",
+    ".kt": "Kotlin",
+    ".go": "Go",
+    ".rs": "Rust",
+    ".c": "C",
+    ".h": "C",
+    ".cpp": "C++",
+    ".hpp": "C++",
+    ".cs": "C#",
+    ".rb": "Ruby",
+    ".php": "PHP",
+    ".swift": "Swift",
+    ".sh": "Shell",
+    ".ps1": "PowerShell",
+    ".sql": "SQL",
+    ".html": "HTML",
+    ".css": "CSS",
+    ".scss": "CSS",
+    ".md": "Markdown",
+    ".json": "JSON",
+    ".yml": "YAML",
+    ".yaml": "YAML",
+    ".toml": "TOML",
+    ".ipynb": "Jupyter",
+}
+
+# files 表的列顺序
+COLUMNS = ("path", "parent", "name", "is_dir", "size", "mtime", "inode", "depth", "content_hash", "language")
+PATH, PARENT, NAME, IS_DIR, SIZE, MTIME, INODE, DEPTH, CONTENT_HASH, LANGUAGE = range(len(COLUMNS))
+
+
+def hash_file(file_path) -> Optional[str]:
+    """计算文件内容哈希，读取失败时返回 None"""
+    digest = hashlib.blake2b(digest_size=20)
+    try:
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+                digest.update(chunk)
+    except OSError:
+        return None
+    return digest.hexdigest()
+
+
+def detect_language(name: str) -> Optional[str]:
+    """根据扩展名推断文件语言"""
+    return LANGUAGE_BY_EXTENSION.get(os.path.splitext(name)[1].lower())
+
+
+def load_exclude_dirs(project_root) -> List[str]:
+    """从 context-config.json 读取扫描排除目录（包含项目特定配置）"""
+    exclude_dirs = ["__pycache__", "node_modules", ".git"]
+    config_file = Path(project_root) / ".ai-context" / "context-config.json"
+    try:
+        with open(config_file, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return exclude_dirs
+
+    scanning = config.get('scanning', {})
+    exclude_dirs = scanning.get('exclude_dirs', exclude_dirs)
+    project_type = config.get('project', {}).get('type', 'general')
+    specific = scanning.get('project_specific', {}).get(project_type, {})
+    return specific.get('exclude_dirs', exclude_dirs)
+
+
+class MetadataIndex:
+    """基于 SQLite 的持久化文件元数据索引"""
+
+    def __init__(self, project_root, exclude_dirs: Optional[Iterable[str]] = None, db_path=None):
+        self.project_root = Path(project_root).resolve()
+        self.exclude_dirs = sorted(set(exclude_dirs or []))
+        self.db_path = Path(db_path) if db_path else self.project_root / ".ai-context" / "cache" / INDEX_DB_NAME
+        # 索引数据库自身（含 WAL 等附属文件）不计入索引
+        self._own_paths = self._own_index_paths()
+        self._rows: Dict[str, list] = {}
+        self._dirs: Dict[str, int] = {}
+        # 与数据库中 generation 一致时，常驻进程可直接复用内存中的数据
+        self._generation: Optional[int] = None
+        self._loaded = False
+        self.symlink_loops: List[str] = []
+        self.stats = {"dirs_listed": 0, "dirs_reused": 0, "files_changed": 0, "files_removed": 0}
+
+    def _own_index_paths(self) -> set:
+        try:
+            rel_db = self.db_path.resolve().relative_to(self.project_root).as_posix()
+        except ValueError:
+            return set()
+        return {rel_db + suffix for suffix in ("", "-wal", "-shm", "-journal")}
+
+    @classmethod
+    def for_project(cls, project_root) -> "MetadataIndex":
+        """按项目配置创建索引，保证各工具共用同一份数据库"""
+        return cls(project_root, load_exclude_dirs(project_root))
+
+    def _connect(self) -> sqlite3.Connection:
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(self.db_path), timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS dirs (path TEXT PRIMARY KEY, mtime_ns INTEGER);
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                parent TEXT NOT NULL,
+                name TEXT NOT NULL,
+                is_dir INTEGER NOT NULL,
+                size INTEGER,
+                mtime REAL,
+                inode INTEGER,
+                depth INTEGER,
+                content_hash TEXT,
+                language TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_files_parent ON files(parent);
+            CREATE INDEX IF NOT EXISTS idx_files_language ON files(language);
+        """)
+        return conn
+
+    def _signature(self) -> str:
+        return json.dumps({"schema": SCHEMA_VERSION, "exclude_dirs": self.exclude_dirs})
+
+    def refresh(self) -> "MetadataIndex":
+        """增量刷新索引：只重新列出 mtime 变化的目录"""
+        with closing(self._connect()) as conn:
+            with conn:
+                old_rows, old_dirs = self._load(conn)
+                new_rows, new_dirs = self._walk(old_rows, old_dirs)
+                self._save(conn, old_rows, new_rows, old_dirs, new_dirs)
+        self._rows = new_rows
+        self._dirs = new_dirs
+        self._loaded = True
+        return self
+
+    def _load(self, conn):
+        """读取上次保存的索引；配置签名不一致时视为空索引"""
+        row = conn.execute("SELECT value FROM meta WHERE key = 'signature'").fetchone()
+        if row is None or row[0] != self._signature():
+            conn.execute("DELETE FROM files")
+            conn.execute("DELETE FROM dirs")
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('signature', ?)", (self._signature(),))
+            self._generation = None
+            return {}, {}
+
+        row = conn.execute("SELECT value FROM meta WHERE key = 'generation'").fetchone()
+        generation = int(row[0]) if row else 0
+        if self._loaded and generation == self._generation:
+            # 数据库自上次刷新后未被其他进程修改
+            return self._rows, self._dirs
+
+        self._generation = generation
+        old_rows = {r[PATH]: list(r) for r in conn.execute(f"SELECT {', '.join(COLUMNS)} FROM files")}
+        old_dirs = dict(conn.execute("SELECT path, mtime_ns FROM dirs"))
+        return old_rows, old_dirs
+
+    def _walk(self, old_rows, old_dirs):
+        """遍历项目目录，复用未变化目录的列表"""
+        scan_start_ns = time.time_ns()
+        children_by_parent: Dict[str, List[list]] = {}
+        for row in old_rows.values():
+            children_by_parent.setdefault(row[PARENT], []).append(row)
+
+        new_rows: Dict[str, list] = {}
+        new_dirs: Dict[str, int] = {}
+        self.symlink_loops = []
+        self.stats = {"dirs_listed": 0, "dirs_reused": 0, "files_changed": 0, "files_removed": 0}
+
+        try:
+            root_stat = os.stat(self.project_root)
+        except OSError:
+            return new_rows, new_dirs
+
+        stack = [(str(self.project_root), "", 0, frozenset([(root_stat.st_dev, root_stat.st_ino)]))]
+        while stack:
+            abs_dir, rel_dir, depth, ancestors = stack.pop()
+            try:
+                dir_mtime_ns = os.stat(abs_dir).st_mtime_ns
+            except OSError:
+                continue
+
+            if old_dirs.get(rel_dir) == dir_mtime_ns:
+                children = self._reuse_listing(abs_dir, children_by_parent.get(rel_dir, []))
+                self.stats["dirs_reused"] += 1
+            else:
+                children = self._list_directory(abs_dir, rel_dir, depth, old_rows)
+                if children is None:
+                    continue
+                self.stats["dirs_listed"] += 1
+
+            # 过于新的目录 mtime 不可信，记为 -1 以便下次重新列出
+            new_dirs[rel_dir] = dir_mtime_ns if scan_start_ns - dir_mtime_ns > RACY_MTIME_NS else -1
+
+            for row, dev_ino in children:
+                new_rows[row[PATH]] = row
+                if not row[IS_DIR]:
+                    continue
+                if dev_ino in ancestors:
+                    # 符号链接指向了自身的祖先目录，停止深入
+                    self.symlink_loops.append(row[PATH])
+                    continue
+                stack.append((os.path.join(abs_dir, row[NAME]), row[PATH], depth + 1, ancestors | {dev_ino}))
+
+        self.stats["files_removed"] = len(old_rows.keys() - new_rows.keys())
+        return new_rows, new_dirs
+
+    def _reuse_listing(self, abs_dir, old_children):
+        """目录未变化：沿用上次的子项列表，只刷新文件的 stat 信息"""
+        children = []
+        for old in old_children:
+            try:
+                st = os.stat(os.path.join(abs_dir, old[NAME]))
+            except OSError:
+                continue
+            children.append((self._merge_row(old, old[:], st), (st.st_dev, st.st_ino)))
+        return children
+
+    def _list_directory(self, abs_dir, rel_dir, depth, old_rows):
+        """目录已变化：重新列出子项"""
+        try:
+            with os.scandir(abs_dir) as it:
+                dir_entries = list(it)
+        except OSError:
+            return None
+
+        children = []
+        for dir_entry in dir_entries:
+            try:
+                is_dir = dir_entry.is_dir()
+                if is_dir and dir_entry.name in self.exclude_dirs:
+                    continue
+                st = dir_entry.stat()
+            except OSError:
+                continue
+
+            rel_path = f"{rel_dir}/{dir_entry.name}" if rel_dir else dir_entry.name
+            if rel_path in self._own_paths:
+                continue
+            row = [rel_path, rel_dir, dir_entry.name, int(is_dir), 0, 0.0, 0, depth, None,
+                   None if is_dir else detect_language(dir_entry.name)]
+            children.append((self._merge_row(old_rows.get(rel_path), row, st), (st.st_dev, st.st_ino)))
+        return children
+
+    def _merge_row(self, old, row, st):
+        """用最新 stat 填充行；内容未变化时保留已计算的哈希"""
+        row[SIZE] = 0 if row[IS_DIR] else st.st_size
+        row[MTIME] = st.st_mtime
+        row[INODE] = st.st_ino
+        row[CONTENT_HASH] = None
+        if old is not None and old[IS_DIR] == row[IS_DIR] and old[SIZE] == row[SIZE] \
+                and old[MTIME] == row[MTIME] and old[INODE] == row[INODE]:
+            row[CONTENT_HASH] = old[CONTENT_HASH]
+        elif not row[IS_DIR]:
+            self.stats["files_changed"] += 1
+        return row
+
+    def _save(self, conn, old_rows, new_rows, old_dirs, new_dirs):
+        """只把差异写回数据库"""
+        removed = [(path,) for path in old_rows.keys() - new_rows.keys()]
+        changed = [tuple(row) for path, row in new_rows.items() if old_rows.get(path) != row]
+        conn.executemany("DELETE FROM files WHERE path = ?", removed)
+        conn.executemany(
+            f"INSERT OR REPLACE INTO files ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+            changed)
+
+        changed_dirs = [(p, m) for p, m in new_dirs.items() if old_dirs.get(p) != m]
+        removed_dirs = [(p,) for p in old_dirs.keys() - new_dirs.keys()]
+        conn.executemany("DELETE FROM dirs WHERE path = ?", removed_dirs)
+        conn.executemany("INSERT OR REPLACE INTO dirs (path, mtime_ns) VALUES (?, ?)", changed_dirs)
+
+        if removed or changed or changed_dirs or removed_dirs or self._generation is None:
+            self._bump_generation(conn)
+
+    def _bump_generation(self, conn):
+        """数据库内容变化后递增 generation，通知其他常驻进程重新加载"""
+        row = conn.execute("SELECT value FROM meta WHERE key = 'generation'").fetchone()
+        self._generation = (int(row[0]) if row else 0) + 1
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('generation', ?)",
+                     (str(self._generation),))
+
+    def _ensure_loaded(self):
+        if not self._loaded:
+            self.refresh()
+
+    def to_file_index(self) -> FileIndex:
+        """转换为内存 FileIndex，供各章节和 ProjectDetector 查询"""
+        self._ensure_loaded()
+        file_index = FileIndex(self.project_root, self.exclude_dirs)
+        file_index.load_entries(
+            (FileEntry(row[PATH], row[NAME], bool(row[IS_DIR]), row[SIZE], row[MTIME], row[INODE], row[DEPTH])
+             for row in self._rows.values()),
+            self.symlink_loops)
+        return file_index
+
+    def get(self, rel_path: str) -> Optional[Dict]:
+        """获取单个路径的元数据"""
+        self._ensure_loaded()
+        row = self._rows.get(rel_path.replace("\\", "/").strip("/"))
+        return dict(zip(COLUMNS, row)) if row else None
+
+    def query(self, language: Optional[str] = None, under: str = "",
+              modified_since: Optional[float] = None) -> List[Dict]:
+        """按语言、目录或修改时间筛选文件"""
+        self._ensure_loaded()
+        prefix = under.replace("\\", "/").strip("/")
+        prefix = prefix + "/" if prefix else ""
+        results = []
+        for row in self._rows.values():
+            if row[IS_DIR]:
+                continue
+            if language is not None and row[LANGUAGE] != language:
+                continue
+            if prefix and not row[PATH].startswith(prefix):
+                continue
+            if modified_since is not None and row[MTIME] <= modified_since:
+                continue
+            results.append(dict(zip(COLUMNS, row)))
+        return results
+
+    def count_files(self) -> int:
+        """索引中的文件数量（不含目录）"""
+        self._ensure_loaded()
+        return sum(1 for row in self._rows.values() if not row[IS_DIR])
+
+    def language_stats(self) -> Dict[str, int]:
+        """按语言统计文件数量"""
+        self._ensure_loaded()
+        stats: Dict[str, int] = {}
+        for row in self._rows.values():
+            if row[LANGUAGE]:
+                stats[row[LANGUAGE]] = stats.get(row[LANGUAGE], 0) + 1
+        return stats
+
+    def content_hash(self, rel_path: str) -> Optional[str]:
+        """获取文件内容哈希，未计算过时按需计算并写回数据库"""
+        self._ensure_loaded()
+        row = self._rows.get(rel_path.replace("\\", "/").strip("/"))
+        if row is None or row[IS_DIR]:
+            return None
+        if row[CONTENT_HASH] is None:
+            row[CONTENT_HASH] = hash_file(self.project_root / row[PATH])
+            self.store_hashes({row[PATH]: row[CONTENT_HASH]})
+        return row[CONTENT_HASH]
+
+    def ensure_content_hashes(self, paths: Optional[Iterable[str]] = None,
+                              max_workers: Optional[int] = None) -> Dict[str, Optional[str]]:
+        """
+        补全文件的内容哈希并返回 {路径: 哈希}（paths 为空时处理所有文件）
+        size/mtime/inode 未变化的文件沿用已保存的哈希，其余文件在线程池中并行计算
+        （hashlib 计算时释放 GIL）
+        """
+        self._ensure_loaded()
+        if paths is None:
+            rows = [row for row in self._rows.values() if not row[IS_DIR]]
+        else:
+            rows = [self._rows[path] for path in paths if path in self._rows and not self._rows[path][IS_DIR]]
+
+        missing = [row[PATH] for row in rows if row[CONTENT_HASH] is None]
+        if missing:
+            with ThreadPoolExecutor(max_workers=max_workers) as pool:
+                digests = list(pool.map(hash_file, (self.project_root / path for path in missing)))
+            self.store_hashes(dict(zip(missing, digests)))
+        return {row[PATH]: row[CONTENT_HASH] for row in rows}
+
+    def store_hashes(self, hashes: Dict[str, Optional[str]]):
+        """批量写回内容哈希"""
+        for path, digest in hashes.items():
+            if path in self._rows:
+                self._rows[path][CONTENT_HASH] = digest
+        with closing(self._connect()) as conn:
+            with conn:
+                conn.executemany("UPDATE files SET content_hash = ? WHERE path = ?",
+                                 [(digest, path) for path, digest in hashes.items()])
+                self._bump_generation(conn)
+
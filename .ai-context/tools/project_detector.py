@@ -10,8 +10,28 @@ from typing import Tuple, List
 class ProjectDetector:
     """项目类型检测器"""
     
-    def __init__(self, project_root: str):
+    def __init__(self, project_root: str, file_index=None):
         self.project_root = Path(project_root).resolve()
+        # 可选的 FileIndex，提供时所有路径查询都走内存索引
+        self.file_index = file_index
+    
+    def _exists(self, rel_path: str) -> bool:
+        """判断相对路径是否存在"""
+        if self.file_index is not None:
+            return self.file_index.exists(rel_path)
+        return (self.project_root / rel_path).exists()
+    
+    def _glob_any(self, pattern: str) -> bool:
+        """判断是否存在匹配模式的路径"""
+        if self.file_index is not None:
+            return self.file_index.any(pattern)
+        return any(self.project_root.glob(pattern))
+    
+    def _glob_count(self, pattern: str) -> int:
+        """统计匹配模式的路径数量"""
+        if self.file_index is not None:
+            return len(self.file_index.glob(pattern))
+        return len(list(self.project_root.glob(pattern)))
     
     def detect_project_type(self) -> Tuple[str, float]:
         """
@@ -51,13 +71,13 @@ class ProjectDetector:
             return "documentation", 0.6
         
         # 基于文件扩展名的简单检测
-        if any(self.project_root.glob("*.py")):
+        if self._glob_any("*.py"):
             return "python_project", 0.7
-        elif any(self.project_root.glob("*.js")):
+        elif self._glob_any("*.js"):
             return "web_project", 0.7
-        elif any(self.project_root.glob("*.java")):
+        elif self._glob_any("*.java"):
             return "java_project", 0.7
-        elif any(self.project_root.glob("*.md")):
+        elif self._glob_any("*.md"):
             return "documentation", 0.6
         
         return "general", 0.5
@@ -67,49 +87,49 @@ class ProjectDetector:
         tech_stack = []
         
         # 后端技术
-        if (self.project_root / "requirements.txt").exists() or any(self.project_root.glob("*.py")):
+        if self._exists("requirements.txt") or self._glob_any("*.py"):
             tech_stack.append("Python")
         
-        if (self.project_root / "package.json").exists():
+        if self._exists("package.json"):
             tech_stack.append("Node.js")
         
-        if (self.project_root / "pom.xml").exists() or any(self.project_root.glob("*.java")):
+        if self._exists("pom.xml") or self._glob_any("*.java"):
             tech_stack.append("Java")
         
-        if (self.project_root / "Cargo.toml").exists() or any(self.project_root.glob("*.rs")):
+        if self._exists("Cargo.toml") or self._glob_any("*.rs"):
             tech_stack.append("Rust")
         
-        if (self.project_root / "go.mod").exists() or any(self.project_root.glob("*.go")):
+        if self._exists("go.mod") or self._glob_any("*.go"):
             tech_stack.append("Go")
         
         # 前端技术
-        if any(self.project_root.glob("**/*.js")):
+        if self._glob_any("**/*.js"):
             tech_stack.append("JavaScript")
         
-        if any(self.project_root.glob("**/*.ts")):
+        if self._glob_any("**/*.ts"):
             tech_stack.append("TypeScript")
         
-        if any(self.project_root.glob("**/*.vue")):
+        if self._glob_any("**/*.vue"):
             tech_stack.append("Vue.js")
         
-        if any(self.project_root.glob("**/*.jsx")) or any(self.project_root.glob("**/*.tsx")):
+        if self._glob_any("**/*.jsx") or self._glob_any("**/*.tsx"):
             tech_stack.append("React")
         
         # 数据库
-        if any(self.project_root.glob("**/*.db")) or any(self.project_root.glob("**/*.sqlite")):
+        if self._glob_any("**/*.db") or self._glob_any("**/*.sqlite"):
             tech_stack.append("SQLite")
         
-        if (self.project_root / "docker-compose.yml").exists():
+        if self._exists("docker-compose.yml"):
             tech_stack.append("Docker")
         
         # 项目结构
-        if (self.project_root / "backend").exists():
+        if self._exists("backend"):
             tech_stack.append("后端开发")
         
-        if (self.project_root / "frontend").exists():
+        if self._exists("frontend"):
             tech_stack.append("前端开发")
         
-        if (self.project_root / "api").exists():
+        if self._exists("api"):
             tech_stack.append("API开发")
         
         return tech_stack or ["通用"]
@@ -123,7 +143,7 @@ class ProjectDetector:
             "next.config.js",
             "nuxt.config.js"
         ]
-        return any((self.project_root / indicator).exists() for indicator in indicators)
+        return any(self._exists(indicator) for indicator in indicators)
     
     def _has_python_indicators(self) -> bool:
         """检测Python项目指标"""
@@ -134,7 +154,7 @@ class ProjectDetector:
             "Pipfile",
             "manage.py"  # Django
         ]
-        return any((self.project_root / indicator).exists() for indicator in indicators)
+        return any(self._exists(indicator) for indicator in indicators)
     
     def _has_java_indicators(self) -> bool:
         """检测Java项目指标"""
@@ -143,19 +163,19 @@ class ProjectDetector:
             "build.gradle",
             "gradle.properties"
         ]
-        return any((self.project_root / indicator).exists() for indicator in indicators)
+        return any(self._exists(indicator) for indicator in indicators)
     
     def _has_nodejs_indicators(self) -> bool:
         """检测Node.js项目指标"""
-        return (self.project_root / "package.json").exists()
+        return self._exists("package.json")
     
     def _has_datascience_indicators(self) -> bool:
         """检测数据科学项目指标"""
         indicators = [
-            any(self.project_root.glob("*.ipynb")),  # Jupyter notebooks
-            (self.project_root / "environment.yml").exists(),  # Conda
-            any(self.project_root.glob("**/data/")),  # 数据目录
-            any(self.project_root.glob("**/notebooks/")),  # notebook目录
+            self._glob_any("*.ipynb"),  # Jupyter notebooks
+            self._exists("environment.yml"),  # Conda
+            self._glob_any("**/data/"),  # 数据目录
+            self._glob_any("**/notebooks/"),  # notebook目录
         ]
         return any(indicators)
     
@@ -168,30 +188,27 @@ class ProjectDetector:
             "App.js",  # React Native
             "app.json"  # Expo
         ]
-        return any((self.project_root / indicator).exists() for indicator in indicators)
+        return any(self._exists(indicator) for indicator in indicators)
     
     def _has_documentation_indicators(self) -> bool:
         """检测文档项目指标"""
-        md_files = list(self.project_root.glob("*.md"))
         indicators = [
-            len(md_files) > 3,
-            (self.project_root / "docs/").exists(),
-            (self.project_root / "mkdocs.yml").exists(),
-            (self.project_root / "_config.yml").exists(),  # Jekyll
-            (self.project_root / "conf.py").exists(),  # Sphinx
+            self._glob_count("*.md") > 3,
+            self._exists("docs/"),
+            self._exists("mkdocs.yml"),
+            self._exists("_config.yml"),  # Jekyll
+            self._exists("conf.py"),  # Sphinx
         ]
         return any(indicators)
     
     def _has_context_management_indicators(self) -> bool:
         """检测上下文管理系统指标"""
         # 检查关键目录结构
-        ai_context_dir = self.project_root / ".ai-context"
-        if not ai_context_dir.exists():
+        if not self._exists(".ai-context"):
             return False
         
         # 检查核心工具目录
-        tools_dir = ai_context_dir / "tools"
-        if not tools_dir.exists():
+        if not self._exists(".ai-context/tools"):
             return False
         
         # 检查关键工具文件
@@ -201,19 +218,19 @@ class ProjectDetector:
             "smart-refresh.py"
         ]
         
-        tool_files_exist = sum(1 for tool in key_tools if (tools_dir / tool).exists())
+        tool_files_exist = sum(1 for tool in key_tools if self._exists(f".ai-context/tools/{tool}"))
         if tool_files_exist < 2:  # 至少存在2个关键工具
             return False
         
         # 检查配置或部署脚本
         config_indicators = [
-            self.project_root / "deploy-ai-context.py",
-            ai_context_dir / "context-config.json",
-            ai_context_dir / "templates",
-            ai_context_dir / "cache"
+            "deploy-ai-context.py",
+            ".ai-context/context-config.json",
+            ".ai-context/templates",
+            ".ai-context/cache"
         ]
         
-        config_exists = sum(1 for indicator in config_indicators if indicator.exists())
+        config_exists = sum(1 for indicator in config_indicators if self._exists(indicator))
         
         # 综合判断：工具文件存在 + 配置相关文件存在
         return config_exists >= 2
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+项目注册表
+多项目守护进程监听的项目列表，保存在 JSON 文件中（默认 ~/.ai-context/projects.json）:
+    {"projects": ["/path/to/project-a", "/path/to/project-b"]}
+守护进程运行期间修改注册表会被自动重新加载
+"""
+
+import json
+import os
+from pathlib import Path
+from typing import List, Optional
+
+DEFAULT_REGISTRY_PATH = Path.home() / ".ai-context" / "projects.json"
+
+
+class ProjectRegistry:
+    """读写项目注册表文件"""
+
+    def __init__(self, path=None):
+        self.path = Path(path).expanduser() if path else DEFAULT_REGISTRY_PATH
+
+    def load(self) -> List[Path]:
+        """注册的项目（绝对路径，去重并保持注册顺序）"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                entries = json.load(f).get("projects", [])
+        except (OSError, ValueError, AttributeError):
+            return []
+
+        projects: List[Path] = []
+        for entry in entries:
+            if not isinstance(entry, str):
+                continue
+            project = Path(entry).expanduser().resolve()
+            if project not in projects:
+                projects.append(project)
+        return projects
+
+    def add(self, project) -> bool:
+        """注册项目，已注册时返回 False"""
+        project = Path(project).expanduser().resolve()
+        projects = self.load()
+        if project in projects:
+            return False
+        self._save(projects + [project])
+        return True
+
+    def remove(self, project) -> bool:
+        """取消注册项目，未注册时返回 False"""
+        project = Path(project).expanduser().resolve()
+        projects = self.load()
+        if project not in projects:
+            return False
+        self._save([p for p in projects if p != project])
+        return True
+
+    def signature(self) -> Optional[int]:
+        """注册表文件的修改时间，用于判断是否需要重新加载"""
+        try:
+            return self.path.stat().st_mtime_ns
+        except OSError:
+            return None
+
+    def _save(self, projects: List[Path]):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump({"projects": [str(p) for p in projects]}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_file, self.path)
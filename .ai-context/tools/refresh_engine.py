@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+进程内刷新引擎
+一次性加载 ContextGenerator 和 SmartContextRefresher，并在多次刷新之间
+复用其状态（配置、文件索引、章节缓存），守护进程、会话管理器和命令行
+工具直接调用，不再逐级启动子进程
+
+使用方法:
+    engine = get_engine(".")
+    engine.check()                 # (是否需要刷新, 原因列表)
+    engine.auto_refresh()          # 需要时刷新
+    engine.refresh("手动刷新")      # 强制刷新并记录
+    engine.generate_context()      # 只生成上下文
+"""
+
+import os
+import sys
+import threading
+import importlib.util
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+TOOLS_DIR = Path(__file__).parent
+
+# 工具脚本文件名（含连字符，无法直接 import）-> 模块名
+TOOL_MODULES = {
+    "context-generator.py": "context_generator",
+    "smart-refresh.py": "smart_refresh",
+    "session-manager.py": "session_manager",
+}
+
+# 配置文件变化时重新创建生成器和刷新器
+CONFIG_FILES = (
+    Path(".ai-context") / "context-config.json",
+    Path(".ai-context") / "config" / "refresh-config.json",
+)
+
+# 多项目守护进程在工作线程中加载模块和创建引擎；可重入，工具模块加载时可能再加载其他工具
+_load_lock = threading.RLock()
+
+
+def load_tool_module(filename: str):
+    """按文件名加载工具脚本模块，同一进程内只加载一次"""
+    module_name = TOOL_MODULES.get(filename, Path(filename).stem.replace("-", "_"))
+    with _load_lock:
+        if module_name in sys.modules:
+            return sys.modules[module_name]
+
+        if str(TOOLS_DIR) not in sys.path:
+            sys.path.insert(0, str(TOOLS_DIR))
+
+        spec = importlib.util.spec_from_file_location(module_name, TOOLS_DIR / filename)
+        if spec is None or spec.loader is None:
+            raise ImportError(f"无法从路径加载模块: {TOOLS_DIR / filename}")
+
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[module_name] = module
+        try:
+            spec.loader.exec_module(module)
+        except BaseException:
+            sys.modules.pop(module_name, None)
+            raise
+        return module
+
+
+class RefreshEngine:
+    """进程内刷新引擎，持有常驻的生成器和刷新器"""
+
+    def __init__(self, project_root: str = "."):
+        self.project_root = Path(project_root).resolve()
+        self._generator = None
+        self._refresher = None
+        self._config_signature = None
+
+    def _current_config_signature(self) -> Tuple:
+        signature = []
+        for config_file in CONFIG_FILES:
+            try:
+                st = os.stat(self.project_root / config_file)
+                signature.append((st.st_mtime_ns, st.st_size))
+            except OSError:
+                signature.append(None)
+        return tuple(signature)
+
+    def _ensure_fresh_config(self):
+        """配置文件变化后丢弃常驻实例，下次使用时按新配置重建"""
+        signature = self._current_config_signature()
+        if signature != self._config_signature:
+            self._generator = None
+            self._refresher = None
+            self._config_signature = signature
+
+    @property
+    def generator(self):
+        """常驻的 ContextGenerator 实例"""
+        self._ensure_fresh_config()
+        if self._generator is None:
+            module = load_tool_module("context-generator.py")
+            self._generator = module.ContextGenerator(str(self.project_root))
+        return self._generator
+
+    @property
+    def refresher(self):
+        """常驻的 SmartContextRefresher 实例（与引擎共享生成器）"""
+        self._ensure_fresh_config()
+        if self._refresher is None:
+            module = load_tool_module("smart-refresh.py")
+            self._refresher = module.SmartContextRefresher(str(self.project_root), generator=self.generator)
+        return self._refresher
+
+    def generate_context(self) -> str:
+        """生成上下文（不记录刷新信息）"""
+        return self.generator.generate_context_summary()
+
+    def check(self) -> Tuple[bool, List[str]]:
+        """检查是否需要刷新"""
+        return self.refresher.check_refresh_needed()
+
+    def refresh(self, reason: str = "manual") -> bool:
+        """刷新上下文并记录刷新信息"""
+        return self.refresher.refresh_context(reason)
+
+    def auto_refresh(self) -> Tuple[bool, List[str]]:
+        """需要时自动刷新，返回 (是否执行了刷新且成功, 原因列表)"""
+        needs_refresh, reasons = self.check()
+        if not needs_refresh:
+            return False, reasons
+        return self.refresh(f"自动刷新: {'; '.join(reasons)}"), reasons
+
+    def report(self) -> Dict:
+        """生成刷新需求报告"""
+        return self.refresher.generate_refresh_report()
+
+
+_engines: Dict[Path, RefreshEngine] = {}
+
+
+def get_engine(project_root: str = ".") -> RefreshEngine:
+    """获取项目对应的共享引擎（同一进程内每个项目只有一个实例）"""
+    root = Path(project_root).resolve()
+    with _load_lock:
+        engine: Optional[RefreshEngine] = _engines.get(root)
+        if engine is None:
+            engine = _engines[root] = RefreshEngine(str(root))
+        return engine
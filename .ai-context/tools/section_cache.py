@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+章节级缓存
+上下文总结的每个章节声明自己的输入（文件、目录、文件树指纹、配置值等），
+章节内容按输入指纹缓存在 .ai-context/cache/section-cache.json 中；
+输入未变化时直接复用上次的内容，只需付出指纹检查的开销
+"""
+
+import os
+import json
+import hashlib
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+SECTION_CACHE_FILE_NAME = "section-cache.json"
+
+# 章节生成逻辑变化时递增，使旧缓存整体失效
+SECTION_CACHE_VERSION = 4
+
+# 输入声明: ("file", 相对路径) / ("dir", 相对路径) / ("value", 任意可序列化值)
+SectionInput = Tuple[str, object]
+
+
+def fingerprint_inputs(project_root, inputs: List[SectionInput]) -> str:
+    """计算章节输入的指纹"""
+    project_root = Path(project_root)
+    resolved = [SECTION_CACHE_VERSION]
+
+    for kind, arg in inputs:
+        if kind == "file":
+            resolved.append(["file", arg, _stat_signature(project_root / str(arg))])
+        elif kind == "dir":
+            resolved.append(["dir", arg, _dir_signature(project_root / str(arg))])
+        elif kind == "value":
+            resolved.append(["value", arg])
+        else:
+            raise ValueError(f"未知的章节输入类型: {kind}")
+
+    payload = json.dumps(resolved, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def _stat_signature(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_mtime_ns, st.st_size]
+
+
+def _dir_signature(path):
+    """目录签名：直接子项的名称、mtime 和大小"""
+    try:
+        with os.scandir(path) as it:
+            entries = []
+            for entry in it:
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                entries.append([entry.name, st.st_mtime_ns, st.st_size])
+    except OSError:
+        return None
+    return sorted(entries)
+
+
+class SectionCache:
+    """按输入指纹缓存章节内容，并统计每个章节的命中/未命中次数"""
+
+    def __init__(self, cache_file):
+        self.cache_file = Path(cache_file)
+        self._sections = None
+        self._dirty = False
+        # 本进程内的命中统计；累计统计保存在缓存文件中
+        self.session_stats: Dict[str, Dict[str, int]] = {}
+
+    def _load(self) -> Dict:
+        if self._sections is None:
+            self._sections = {}
+            try:
+                with open(self.cache_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get("version") == SECTION_CACHE_VERSION:
+                    self._sections = data.get("sections", {})
+            except (OSError, json.JSONDecodeError, AttributeError):
+                pass
+        return self._sections
+
+    def get_or_compute(self, name: str, fingerprint: str, compute: Callable[[], object]) -> object:
+        """指纹未变化时返回缓存内容，否则重新计算并缓存"""
+        sections = self._load()
+        entry = sections.setdefault(name, {"hits": 0, "misses": 0})
+        stats = self.session_stats.setdefault(name, {"hits": 0, "misses": 0})
+
+        if entry.get("fingerprint") == fingerprint and "content" in entry:
+            entry["hits"] += 1
+            stats["hits"] += 1
+        else:
+            entry["content"] = compute()
+            entry["fingerprint"] = fingerprint
+            entry["misses"] += 1
+            stats["misses"] += 1
+        self._dirty = True
+        return entry["content"]
+
+    def save(self):
+        """写回缓存文件"""
+        if not self._dirty:
+            return
+        self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = self.cache_file.with_suffix(".tmp")
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump({"version": SECTION_CACHE_VERSION, "sections": self._sections},
+                      f, ensure_ascii=False)
+        os.replace(tmp_file, self.cache_file)
+        self._dirty = False
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """累计的每章节命中/未命中次数"""
+        return {name: {"hits": entry.get("hits", 0), "misses": entry.get("misses", 0)}
+                for name, entry in self._load().items()}
+
+    def format_stats(self) -> str:
+        """格式化命中统计（本次运行 / 累计）"""
+        lines = ["📊 章节缓存统计 (本次命中/未命中 | 累计命中/未命中):"]
+        totals = self.stats()
+        for name, session in self.session_stats.items():
+            total = totals.get(name, {"hits": 0, "misses": 0})
+            lines.append(f"  - {name}: {session['hits']}/{session['misses']} | {total['hits']}/{total['misses']}")
+        return "\n".join(lines)
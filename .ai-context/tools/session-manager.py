@@ -5,18 +5,33 @@
 """
 import os
 import sys
-import json
 import argparse
-import subprocess
-from datetime import datetime
+from datetime import datetime, timedelta
 from pathlib import Path
 
+# 添加当前目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent))
+
+from refresh_engine import get_engine  # type: ignore
+from session_store import SessionStore, CATALOG_DB_NAME, ARCHIVE_AFTER_DAYS  # type: ignore
+from session_tracker import SessionTracker, is_git_change  # type: ignore
+from change_watcher import create_change_watcher  # type: ignore
+from metadata_index import load_exclude_dirs  # type: ignore
+from control_socket import request_daemon  # type: ignore
+
+# track 命令检查会话是否已结束的间隔（秒）
+TRACK_POLL_SECONDS = 5
+
 class SessionManager:
     def __init__(self, project_root="."):
         self.project_root = Path(project_root).resolve()
         self.ai_context_dir = self.project_root / ".ai-context"
         self.sessions_dir = self.ai_context_dir / "sessions"
         self.sessions_dir.mkdir(exist_ok=True)
+        # 活跃会话指针 + 按开始时间排序的索引，避免逐个解析全部会话文件
+        self.store = SessionStore(self.sessions_dir, self.ai_context_dir / "cache" / CATALOG_DB_NAME)
+        # 将会话期间的文件变化和新提交记录到 files_modified / git_commits
+        self.tracker = SessionTracker(self.store, self.project_root)
         
     def start_session(self, title, description="", tags=None):
         """开始新的工作会话"""
@@ -49,9 +64,7 @@ class SessionManager:
             "updates": []
         }
         
-        session_file = self.sessions_dir / f"{session_id}.json"
-        with open(session_file, 'w', encoding='utf-8') as f:
-            json.dump(session_data, f, indent=2, ensure_ascii=False)
+        self.store.save(session_data)
         
         print(f"✅ 开始新会话: {title}")
         print(f"📋 会话ID: {session_id}")
@@ -64,9 +77,12 @@ class SessionManager:
         return session_data
     
     def update_session(self, update_text):
-        """更新当前活跃会话的进展"""
-        active_session = self.get_active_session()
-        if not active_session:
+        """
+        更新当前活跃会话的进展（追加一条日志，不重写会话文件）
+        不读取会话内容，开销与会话大小无关；会话期间的提交由 end / track / 守护进程记录
+        """
+        session_id = self.store.active_id()
+        if not session_id:
             print("❌ 没有活跃的会话")
             return False
         
@@ -75,11 +91,7 @@ class SessionManager:
             "text": update_text
         }
         
-        active_session["updates"].append(update_entry)
-        
-        session_file = self.sessions_dir / f"{active_session['session_id']}.json"
-        with open(session_file, 'w', encoding='utf-8') as f:
-            json.dump(active_session, f, indent=2, ensure_ascii=False)
+        self.store.append(session_id, [{"op": "append", "field": "updates", "value": update_entry}])
         
         print(f"✅ 会话更新已记录: {update_text}")
         return True
@@ -91,50 +103,35 @@ class SessionManager:
             print("❌ 没有活跃的会话")
             return False
         
-        active_session["end_time"] = datetime.now().isoformat()
-        active_session["status"] = "completed"
-        
-        session_file = self.sessions_dir / f"{active_session['session_id']}.json"
-        with open(session_file, 'w', encoding='utf-8') as f:
-            json.dump(active_session, f, indent=2, ensure_ascii=False)
+        # 记录会话期间的提交，再记录结束并将日志合并为最终快照
+        self.tracker.record_commits()
+        self.store.append(active_session["session_id"], [
+            {"op": "set", "values": {"end_time": datetime.now().isoformat(), "status": "completed"}}
+        ])
+        active_session = self.store.materialize(active_session["session_id"])
         
         duration = self._calculate_duration(active_session["start_time"], active_session["end_time"])
         print(f"✅ 会话已结束: {active_session['title']}")
         print(f"⏱️  持续时间: {duration}")
         
+        # 顺便归档较早的会话，保持会话目录精简
+        self.store.compact()
+        
         # 自动生成上下文
         self._auto_generate_context()
         
         return True
     
     def get_active_session(self):
-        """获取当前活跃的会话"""
-        for session_file in self.sessions_dir.glob("session-*.json"):
-            try:
-                with open(session_file, 'r', encoding='utf-8') as f:
-                    session = json.load(f)
-                    if session.get("status") == "active":
-                        return session
-            except (json.JSONDecodeError, FileNotFoundError):
-                continue
-        return None
+        """获取当前活跃的会话（读取活跃会话指针）"""
+        return self.store.active()
     
     def list_sessions(self, limit=10):
         """列出最近的会话"""
-        sessions = []
-        for session_file in self.sessions_dir.glob("session-*.json"):
-            try:
-                with open(session_file, 'r', encoding='utf-8') as f:
-                    session = json.load(f)
-                    sessions.append(session)
-            except (json.JSONDecodeError, FileNotFoundError):
-                continue
-        
-        # 按开始时间排序
-        sessions.sort(key=lambda x: x["start_time"], reverse=True)
+        sessions = self.store.recent(limit=limit)
         
         print("📋 最近的工作会话:")
-        for i, session in enumerate(sessions[:limit]):
+        for session in sessions:
             status_icon = "🟢" if session["status"] == "active" else "✅"
             start_time = datetime.fromisoformat(session["start_time"]).strftime("%m-%d %H:%M")
             
@@ -158,20 +155,41 @@ class SessionManager:
     
     def get_recent_sessions(self, days=7):
         """获取最近几天的会话，用于上下文生成"""
-        cutoff_time = datetime.now().timestamp() - (days * 24 * 3600)
-        sessions = []
-        
-        for session_file in self.sessions_dir.glob("session-*.json"):
-            try:
-                with open(session_file, 'r', encoding='utf-8') as f:
-                    session = json.load(f)
-                    start_timestamp = datetime.fromisoformat(session["start_time"]).timestamp()
-                    if start_timestamp > cutoff_time:
-                        sessions.append(session)
-            except (json.JSONDecodeError, FileNotFoundError):
-                continue
-        
-        return sorted(sessions, key=lambda x: x["start_time"], reverse=True)
+        return self.store.recent(since=datetime.now() - timedelta(days=days))
+    
+    def compact_sessions(self, older_than_days=ARCHIVE_AFTER_DAYS):
+        """将较早的会话压缩进归档分段"""
+        archived = self.store.compact(older_than_days)
+        print(f"🗜️  已归档 {archived} 个会话")
+        return archived
+    
+    def track_session(self):
+        """前台监听文件变化并记录到活跃会话，会话结束或按 Ctrl+C 时停止"""
+        if not self.store.active_id():
+            print("❌ 没有活跃的会话")
+            return False
+        
+        watcher = create_change_watcher(self.project_root, load_exclude_dirs(self.project_root))
+        if watcher is None:
+            print("⚠️  当前平台不支持文件变更监听（需要 Linux inotify），结束会话时仍会记录提交")
+            return False
+        
+        print(f"👀 正在跟踪会话变更 ({watcher.watch_count} 个目录)，按 Ctrl+C 停止")
+        self.tracker.record_commits()
+        try:
+            while self.store.active_id():
+                changed = watcher.wait_for_changes(timeout=TRACK_POLL_SECONDS)
+                recorded = self.tracker.record_changes(watcher.file_events, watcher.renames)
+                commits = self.tracker.record_commits() if is_git_change(changed) else 0
+                if recorded or commits:
+                    print(f"📝 已记录 {recorded} 个文件变化, {commits} 个提交")
+        except KeyboardInterrupt:
+            pass
+        finally:
+            watcher.close()
+        
+        print("✅ 会话跟踪已停止")
+        return True
     
     def _calculate_duration(self, start_time, end_time):
         """计算会话持续时间"""
@@ -188,33 +206,23 @@ class SessionManager:
             return f"{minutes}m"
     
     def _auto_generate_context(self):
-        """自动生成上下文"""
+        """自动生成上下文：守护进程运行时交给已预热的守护进程刷新，否则在当前进程内生成"""
         try:
-            context_generator_path = self.ai_context_dir / "tools" / "context-generator.py"
+            if request_daemon(self.project_root, "trigger-refresh", {"reason": "会话变更"}):
+                print("✅ 已通知守护进程刷新上下文")
+                return True
+            
+            context_generator_path = Path(__file__).parent / "context-generator.py"
             if not context_generator_path.exists():
                 print("⚠️  警告: 找不到context-generator.py，跳过自动生成上下文")
                 return False
             
             print("🔄 自动生成最新上下文...")
             
-            # 执行上下文生成
-            result = subprocess.run([
-                sys.executable, 
-                str(context_generator_path)
-            ], 
-            cwd=str(self.project_root),
-            capture_output=True, 
-            text=True,
-            encoding='utf-8',
-            errors='ignore'  # 忽略编码错误
-            )
-            
-            if result.returncode == 0:
-                print("✅ 上下文生成完成")
-                return True
-            else:
-                print(f"⚠️  上下文生成警告: {result.stderr}")
-                return False
+            # 在当前进程内执行上下文生成
+            get_engine(str(self.project_root)).generate_context()
+            print("✅ 上下文生成完成")
+            return True
                 
         except Exception as e:
             print(f"⚠️  自动生成上下文时出错: {e}")
@@ -331,6 +339,13 @@ def main():
     # 查看状态
     subparsers.add_parser("status", help="查看当前会话状态")
     
+    # 跟踪会话变更
+    subparsers.add_parser("track", help="前台监听文件变化和新提交，记录到当前会话")
+    
+    # 归档较早的会话
+    compact_parser = subparsers.add_parser("compact", help="将较早的会话压缩进归档分段")
+    compact_parser.add_argument("--days", type=int, default=ARCHIVE_AFTER_DAYS, help="归档结束超过该天数的会话")
+    
     args = parser.parse_args()
     
     if not args.command:
@@ -359,6 +374,10 @@ def main():
             manager.end_session()
     elif args.command == "list":
         manager.list_sessions(args.limit)
+    elif args.command == "track":
+        manager.track_session()
+    elif args.command == "compact":
+        manager.compact_sessions(args.days)
     elif args.command == "status":
         active = manager.get_active_session()
         if active:
@@ -0,0 +1,525 @@
+#!/usr/bin/env python3
+"""
+会话存储与索引
+- sessions/active-session.json 指向当前活跃会话，查询活跃会话只需读取一个文件
+- cache/session-index.db（SQLite）按开始时间索引全部会话，最近 N 个会话的查询只读取 N 个会话
+- 结束超过 ARCHIVE_AFTER_DAYS 天的会话压缩进按月分段的归档文件
+  sessions/archive/sessions-YYYY-MM.jsonl，索引中记录所在分段及偏移，仍可按 ID 读取
+- 会话的修改（进展记录、结束等）以 JSON 行追加到 session-*.journal，写入开销与会话大小无关；
+  读取时在快照上重放日志，会话结束或日志过大时才合并为新的快照。
+  快照记录已合并的最后一条日志 ID，合并中途中断也不会重复应用；
+  多个终端同时写入由文件锁串行化
+- SessionIntervals 将会话时间区间解析一次并排序，按时间戳查找所属会话为二分查找
+
+索引是派生数据：不存在、版本不符或会话目录被其他程序修改时，从会话文件和归档分段重建
+
+使用方法:
+    store = SessionStore(".ai-context/sessions", ".ai-context/cache/session-index.db")
+    store.active()
+    store.append(session_id, [{"op": "append", "field": "updates", "value": {...}}])
+    store.materialize(session_id)
+    store.recent(limit=10)
+    store.compact()
+"""
+
+import os
+import json
+import time
+import bisect
+import sqlite3
+from contextlib import closing, contextmanager
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+CATALOG_DB_NAME = "session-index.db"
+CATALOG_VERSION = "1"
+ACTIVE_POINTER_NAME = "active-session.json"
+ARCHIVE_DIR_NAME = "archive"
+SESSION_FILE_PATTERN = "session-*.json"
+
+# 结束超过该天数的会话在压缩时移入归档分段
+ARCHIVE_AFTER_DAYS = 30
+
+JOURNAL_SUFFIX = ".journal"
+# 日志超过该大小时在下次写入后合并为快照
+JOURNAL_COMPACT_BYTES = 256 * 1024
+
+
+class SessionStore:
+    """会话文件、活跃会话指针和 SQLite 索引的统一读写入口"""
+
+    def __init__(self, sessions_dir, catalog_path):
+        self.sessions_dir = Path(sessions_dir)
+        self.archive_dir = self.sessions_dir / ARCHIVE_DIR_NAME
+        self.pointer_file = self.sessions_dir / ACTIVE_POINTER_NAME
+        self.catalog_path = Path(catalog_path)
+        self.lock_file = self.catalog_path.with_suffix(".lock")
+        self._catalog_checked = False
+        # 尚未写入磁盘的日志条目: {会话 ID: [条目, ...]}
+
+    # ------------------------------------------------------------------
+    # 查询
+
+    def active(self) -> Optional[Dict]:
+        """当前活跃会话（读取指针指向的会话文件并重放其日志）"""
+        session_id = self.active_id()
+        session = self._read_session_file(self._session_file(session_id)) if session_id else None
+        if session is None or session.get("status") != "active":
+            return None
+        return session
+
+    def active_id(self) -> Optional[str]:
+        """当前活跃会话的 ID（只读取指针）"""
+        self._ensure_catalog()
+        return self._pointer_target()
+
+    def get(self, session_id: str) -> Optional[Dict]:
+        """按 ID 读取会话（包括已归档的会话）"""
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT location, offset, length FROM sessions WHERE session_id = ?",
+                               (session_id,)).fetchone()
+        return self._load(*row) if row else None
+
+    def recent(self, limit: Optional[int] = None, since: Optional[datetime] = None) -> List[Dict]:
+        """按开始时间倒序返回最近的会话，since 限定开始时间下界"""
+        query = "SELECT location, offset, length FROM sessions"
+        params: list = []
+        if since is not None:
+            query += " WHERE start_time > ?"
+            params.append(since.isoformat())
+        query += " ORDER BY start_time DESC"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+
+        with closing(self._connect()) as conn:
+            rows = conn.execute(query, params).fetchall()
+        sessions = [self._load(*row) for row in rows]
+        return [session for session in sessions if session is not None]
+
+    # ------------------------------------------------------------------
+    # 写入
+
+    def save(self, session: Dict):
+        """写入完整的会话快照（丢弃该会话已有的日志）并更新索引和活跃会话指针"""
+        # 先校验索引：写入会改变目录 mtime，之后再校验会误判为被其他程序修改
+        self._ensure_catalog()
+        with self._locked():
+            self._save_snapshot(session)
+
+    def append(self, session_id: str, entries: List[Dict]):
+        """
+        追加日志条目（op: append 向列表字段追加 value，unique 为真时跳过已有的值；
+        op: set 批量设置 values 中的字段；
+        op: upsert 按 key 字段更新或插入列表中的字典元素，新插入时先填入 defaults；
+        op: remove 删除列表中 key 字段等于 value 的元素）
+        同一次调用的条目一次写入、一次 fsync
+        """
+        stamp = f"{time.time_ns()}-{os.getpid()}"
+        data = "".join(json.dumps(dict(entry, id=f"{stamp}-{index}"), ensure_ascii=False) + "\n"
+                       for index, entry in enumerate(entries)).encode('utf-8')
+        self._ensure_catalog()
+        with self._locked():
+            journal = self._journal_file(session_id)
+            created = not journal.exists()
+            with open(journal, 'a+b') as f:
+                # 上次写入中途崩溃留下的半行需先结束，否则会吞掉新条目
+                if f.seek(0, os.SEEK_END) > 0:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        data = b"\n" + data
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+                oversized = f.tell() > JOURNAL_COMPACT_BYTES
+            if created:
+                # 新建日志文件改变了目录 mtime
+                with closing(self._connect()) as conn:
+                    with conn:
+                        self._record_dir_state(conn)
+            if oversized:
+                self._materialize(session_id)
+
+    def materialize(self, session_id: str) -> Optional[Dict]:
+        """将日志合并进快照并删除日志，返回合并后的会话"""
+        self._ensure_catalog()
+        with self._locked():
+            return self._materialize(session_id)
+
+    def _materialize(self, session_id: str) -> Optional[Dict]:
+        session_file = self._session_file(session_id)
+        snapshot = _read_json(session_file)
+        journal = self._journal_file(session_id)
+        if snapshot is None or not journal.exists():
+            return snapshot
+        entries = _read_journal(journal)
+        if entries:
+            snapshot = _apply_journal(snapshot, entries)
+            snapshot["journal_applied"] = entries[-1]["id"]
+        self._save_snapshot(snapshot)
+        return snapshot
+
+    def _save_snapshot(self, session: Dict):
+        """写入快照、指针和索引，删除已合并的日志（调用方持有锁）"""
+        session_file = self._session_file(session["session_id"])
+        _atomic_write_json(session_file, session, indent=2)
+        try:
+            self._journal_file(session["session_id"]).unlink()
+        except OSError:
+            pass
+
+        if session.get("status") == "active":
+            _atomic_write_json(self.pointer_file, {"session_id": session["session_id"]})
+        elif self._pointer_target() == session["session_id"]:
+            self._remove_pointer()
+
+        with closing(self._connect()) as conn:
+            with conn:
+                self._upsert(conn, session, session_file.name, None, None)
+                self._record_dir_state(conn)
+
+    def compact(self, older_than_days: int = ARCHIVE_AFTER_DAYS, now: Optional[datetime] = None) -> int:
+        """将结束超过 older_than_days 天的会话移入按月分段的归档文件，返回归档数量"""
+        cutoff = ((now or datetime.now()) - timedelta(days=older_than_days)).isoformat()
+        archived = 0
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT session_id, location FROM sessions "
+                "WHERE status != 'active' AND end_time IS NOT NULL AND end_time < ? AND offset IS NULL "
+                "ORDER BY start_time", (cutoff,)).fetchall()
+            for session_id, location in rows:
+                session_file = self.sessions_dir / location
+                session = self._read_session_file(session_file)
+                if session is None:
+                    continue
+                with self._locked():
+                    segment, offset, length = self._append_to_archive(session)
+                    # 先写入归档并更新索引，最后删除原文件；中途中断时重建索引会优先使用原文件
+                    with conn:
+                        self._upsert(conn, session, segment, offset, length)
+                    for path in (session_file, self._journal_file(session_id)):
+                        try:
+                            path.unlink()
+                        except OSError:
+                            pass
+                archived += 1
+            if archived:
+                with conn:
+                    self._record_dir_state(conn)
+        return archived
+
+    def rebuild(self) -> int:
+        """从会话文件和归档分段重建索引，返回会话数量"""
+        with closing(self._connect(check=False)) as conn:
+            with conn:
+                count = self._rebuild(conn)
+        self._catalog_checked = True
+        return count
+
+    # ------------------------------------------------------------------
+    # 索引
+
+    def _connect(self, check: bool = True) -> sqlite3.Connection:
+        self.catalog_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(self.catalog_path), timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS sessions (
+                session_id TEXT PRIMARY KEY,
+                start_time TEXT NOT NULL,
+                end_time TEXT,
+                status TEXT,
+                title TEXT,
+                location TEXT NOT NULL,
+                offset INTEGER,
+                length INTEGER
+            );
+            CREATE INDEX IF NOT EXISTS idx_sessions_start ON sessions(start_time);
+        """)
+        if check and not self._catalog_checked:
+            with conn:
+                if not self._catalog_current(conn):
+                    self._rebuild(conn)
+            self._catalog_checked = True
+        return conn
+
+    def _ensure_catalog(self):
+        if not self._catalog_checked:
+            self._connect().close()
+
+    def _catalog_current(self, conn) -> bool:
+        """版本一致且会话目录自上次写入后未被其他程序修改"""
+        meta = dict(conn.execute("SELECT key, value FROM meta"))
+        return meta.get("version") == CATALOG_VERSION and meta.get("dir_state") == self._dir_state()
+
+    def _dir_state(self) -> str:
+        """会话目录及归档目录的 mtime（文件增删、重命名都会改变目录 mtime）"""
+        state = []
+        for directory in (self.sessions_dir, self.archive_dir):
+            try:
+                state.append(os.stat(directory).st_mtime_ns)
+            except OSError:
+                state.append(None)
+        return json.dumps(state)
+
+    def _record_dir_state(self, conn):
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('version', ?)", (CATALOG_VERSION,))
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('dir_state', ?)", (self._dir_state(),))
+
+    def _rebuild(self, conn) -> int:
+        conn.execute("DELETE FROM sessions")
+        sessions = {}
+
+        # 归档分段中的会话
+        for segment in sorted(self.archive_dir.glob("sessions-*.jsonl")) if self.archive_dir.exists() else []:
+            location = segment.relative_to(self.sessions_dir).as_posix()
+            for session, offset, length in _iter_segment(segment):
+                sessions[session["session_id"]] = (session, location, offset, length)
+
+        # 会话文件（同一会话同时存在于归档和文件中时以文件为准）
+        for session_file in self.sessions_dir.glob(SESSION_FILE_PATTERN):
+            session = self._read_session_file(session_file)
+            if session and session.get("session_id") and session.get("start_time"):
+                sessions[session["session_id"]] = (session, session_file.name, None, None)
+
+        for session, location, offset, length in sessions.values():
+            self._upsert(conn, session, location, offset, length)
+
+        self._repair_pointer(conn)
+        self._record_dir_state(conn)
+        return len(sessions)
+
+    def _repair_pointer(self, conn):
+        """指针缺失或失效时指向最近开始的活跃会话"""
+        current = self._pointer_target()
+        row = conn.execute("SELECT status FROM sessions WHERE session_id = ?", (current,)).fetchone() if current else None
+        if row and row[0] == "active":
+            return
+        row = conn.execute("SELECT session_id FROM sessions WHERE status = 'active' "
+                           "ORDER BY start_time DESC LIMIT 1").fetchone()
+        if row:
+            _atomic_write_json(self.pointer_file, {"session_id": row[0]})
+        else:
+            self._remove_pointer()
+
+    @staticmethod
+    def _upsert(conn, session: Dict, location: str, offset: Optional[int], length: Optional[int]):
+        conn.execute(
+            "INSERT OR REPLACE INTO sessions "
+            "(session_id, start_time, end_time, status, title, location, offset, length) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (session["session_id"], session["start_time"], session.get("end_time"), session.get("status"),
+             session.get("title"), location, offset, length))
+
+    # ------------------------------------------------------------------
+    # 文件
+
+    def _session_file(self, session_id: str) -> Path:
+        return self.sessions_dir / f"{session_id}.json"
+
+    def _journal_file(self, session_id: str) -> Path:
+        return self.sessions_dir / f"{session_id}{JOURNAL_SUFFIX}"
+
+    @contextmanager
+    def _locked(self):
+        """跨进程互斥锁（同一进程内不可重入）"""
+        self.lock_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.lock_file, 'a+b') as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+                else:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def _pointer_target(self) -> Optional[str]:
+        try:
+            with open(self.pointer_file, 'r', encoding='utf-8') as f:
+                return json.load(f).get("session_id")
+        except (OSError, ValueError, AttributeError):
+            return None
+
+    def _remove_pointer(self):
+        try:
+            self.pointer_file.unlink()
+        except OSError:
+            pass
+
+    @staticmethod
+    def _read_session_file(session_file: Path) -> Optional[Dict]:
+        """读取会话快照并重放尚未合并的日志"""
+        session = _read_json(session_file)
+        journal = session_file.with_suffix(JOURNAL_SUFFIX)
+        if session is not None and journal.exists():
+            session = _apply_journal(session, _read_journal(journal))
+        return session
+
+    def _load(self, location: str, offset: Optional[int], length: Optional[int]) -> Optional[Dict]:
+        path = self.sessions_dir / location
+        if offset is None:
+            return self._read_session_file(path)
+        try:
+            with open(path, 'rb') as f:
+                f.seek(offset)
+                return json.loads(f.read(length).decode('utf-8'))
+        except (OSError, ValueError):
+            return None
+
+    def _append_to_archive(self, session: Dict):
+        """追加到会话开始月份的归档分段，返回 (分段相对路径, 偏移, 长度)"""
+        self.archive_dir.mkdir(exist_ok=True)
+        month = session["start_time"][:7]
+        segment = self.archive_dir / f"sessions-{month}.jsonl"
+        line = json.dumps(session, ensure_ascii=False).encode('utf-8')
+        with open(segment, 'ab') as f:
+            offset = f.seek(0, os.SEEK_END)
+            f.write(line + b"\n")
+            f.flush()
+            os.fsync(f.fileno())
+        return segment.relative_to(self.sessions_dir).as_posix(), offset, len(line)
+
+
+class SessionIntervals:
+    """
+    会话时间区间索引：区间按开始时间排序，并记录前缀最大结束时间，
+    查找时间戳所属会话时先二分定位，再向前检查仍可能覆盖该时间的区间
+    （会话不重叠时只检查一个区间）
+    多个会话覆盖同一时间时返回开始最晚的会话；未结束的会话视为持续到下一个会话开始（没有时到 now），
+    遗留的未结束会话不会让之后的每次查找都退化为线性回溯
+    """
+
+    def __init__(self, sessions: List[Dict], now: Optional[float] = None):
+        now = time.time() if now is None else now
+        self.sessions = list(sessions)
+        intervals = []
+        for session in self.sessions:
+            try:
+                start = datetime.fromisoformat(session["start_time"]).timestamp()
+                end = datetime.fromisoformat(session["end_time"]).timestamp() if session.get("end_time") else None
+            except (KeyError, TypeError, ValueError):
+                continue
+            intervals.append((start, end, session))
+        intervals.sort(key=lambda item: item[0])
+        for i, (start, end, session) in enumerate(intervals):
+            if end is None:
+                next_start = intervals[i + 1][0] if i + 1 < len(intervals) else now
+                intervals[i] = (start, min(next_start, now), session)
+
+        self._starts = [start for start, _, _ in intervals]
+        self._ends = [end for _, end, _ in intervals]
+        self._interval_sessions = [session for _, _, session in intervals]
+        self._max_ends = []
+        max_end = float("-inf")
+        for end in self._ends:
+            max_end = max(max_end, end)
+            self._max_ends.append(max_end)
+
+    def __len__(self) -> int:
+        return len(self.sessions)
+
+    def find(self, timestamp: float) -> Optional[Dict]:
+        """返回覆盖该时间戳的会话"""
+        i = bisect.bisect_right(self._starts, timestamp) - 1
+        while i >= 0 and self._max_ends[i] >= timestamp:
+            if self._ends[i] >= timestamp:
+                return self._interval_sessions[i]
+            i -= 1
+        return None
+
+
+def _read_json(path: Path) -> Optional[Dict]:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def _read_journal(journal: Path) -> List[Dict]:
+    """读取日志条目；末尾写了一半的行（进程中途崩溃）直接忽略"""
+    entries = []
+    try:
+        with open(journal, 'rb') as f:
+            for raw in f:
+                try:
+                    entry = json.loads(raw.decode('utf-8'))
+                except (UnicodeDecodeError, ValueError):
+                    continue
+                if isinstance(entry, dict) and entry.get("id"):
+                    entries.append(entry)
+    except OSError:
+        pass
+    return entries
+
+
+def _apply_journal(session: Dict, entries: List[Dict]) -> Dict:
+    """在快照上依次应用日志条目，跳过快照中已合并的部分"""
+    applied = session.get("journal_applied")
+    if applied and any(entry["id"] == applied for entry in entries):
+        entries = entries[next(i for i, entry in enumerate(entries) if entry["id"] == applied) + 1:]
+    session = dict(session)
+    for entry in entries:
+        op = entry.get("op")
+        if op == "set":
+            session.update(entry.get("values", {}))
+        elif op == "append":
+            items = list(session.get(entry["field"]) or [])
+            if not (entry.get("unique") and entry.get("value") in items):
+                items.append(entry.get("value"))
+            session[entry["field"]] = items
+        elif op == "upsert":
+            key, value = entry["key"], entry.get("value", {})
+            items = list(session.get(entry["field"]) or [])
+            for i, item in enumerate(items):
+                if isinstance(item, dict) and item.get(key) == value.get(key):
+                    items[i] = dict(item, **value)
+                    break
+            else:
+                items.append(dict(entry.get("defaults") or {}, **value))
+            session[entry["field"]] = items
+        elif op == "remove":
+            key = entry["key"]
+            session[entry["field"]] = [item for item in session.get(entry["field"]) or []
+                                       if not (isinstance(item, dict) and item.get(key) == entry.get("value"))]
+    return session
+
+
+def _iter_segment(segment: Path):
+    """逐行读取归档分段，产出 (会话, 偏移, 长度)；不完整的行跳过"""
+    offset = 0
+    with open(segment, 'rb') as f:
+        for raw in f:
+            line = raw.rstrip(b"\n")
+            try:
+                session = json.loads(line.decode('utf-8'))
+            except (UnicodeDecodeError, ValueError):
+                session = None
+            if isinstance(session, dict) and session.get("session_id") and session.get("start_time"):
+                yield session, offset, len(line)
+            offset += len(raw)
+
+
+def _atomic_write_json(path: Path, data, indent=None):
+    tmp_file = path.with_name(path.name + ".tmp")
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=indent, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_file, path)
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+会话变更跟踪
+活跃会话期间把改动过的文件（新增、修改、删除、重命名）和新产生的提交
+增量写入会话日志的 files_modified / git_commits 字段；
+上下文生成直接使用这些记录归属文件，不必再根据 mtime 推断，
+删除和重命名的文件也能被记录下来
+
+文件变化来自 change_watcher 的事件（守护进程或 session-manager.py track），
+提交由 git_reader 从 HEAD 向前遍历到会话开始时间，在 .git 变化（守护进程、track）
+和会话结束时记录；update 只追加进展，不读取会话内容
+"""
+
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from change_watcher import CHANGE_CREATED, CHANGE_DELETED, CHANGE_MODIFIED  # type: ignore
+from git_reader import GitReader, GitReaderError  # type: ignore
+from session_store import SessionStore  # type: ignore
+
+# files_modified 条目中的变化类型
+FILE_ADDED = "added"
+FILE_MODIFIED = "modified"
+FILE_DELETED = "deleted"
+FILE_RENAMED = "renamed"
+
+_WATCHER_CHANGES = {
+    CHANGE_CREATED: FILE_ADDED,
+    CHANGE_MODIFIED: FILE_MODIFIED,
+    CHANGE_DELETED: FILE_DELETED,
+}
+
+# 单次扫描最多记录的提交数（防止会话期间切换到历史很长的分支时一次写入过多）
+MAX_COMMITS_PER_SCAN = 200
+
+
+class SessionTracker:
+    """将文件变化和新提交记录到当前活跃会话"""
+
+    def __init__(self, store: SessionStore, project_root=".", git: Optional[GitReader] = None):
+        self.store = store
+        self.git = git or GitReader(project_root)
+        self._last_head: Optional[Tuple[str, str]] = None
+
+    def record_changes(self, file_events: Dict[str, str],
+                       renames: Iterable[Tuple[str, str]] = ()) -> int:
+        """
+        记录一批文件变化（路径 -> created/modified/deleted，以及 (原路径, 新路径) 重命名），
+        整批写入一次会话日志；没有活跃会话时忽略，返回记录的条目数
+        """
+        renames = list(renames)
+        if not file_events and not renames:
+            return 0
+        session_id = self.store.active_id()
+        if not session_id:
+            return 0
+
+        now = datetime.now().isoformat()
+        entries: List[Dict] = []
+        for old_path, new_path in renames:
+            entries.append({"op": "remove", "field": "files_modified", "key": "path", "value": old_path})
+            entries.append(_file_entry({"path": new_path, "change": FILE_RENAMED, "from": old_path, "time": now}))
+        for path, change in sorted(file_events.items()):
+            change = _WATCHER_CHANGES.get(change)
+            if change == FILE_MODIFIED:
+                # 只更新时间；会话中新增或重命名得到的文件仍保留原来的变化类型
+                entries.append(_file_entry({"path": path, "time": now}, defaults={"change": FILE_MODIFIED}))
+            elif change:
+                entries.append(_file_entry({"path": path, "change": change, "time": now}))
+
+        if entries:
+            self.store.append(session_id, entries)
+        return len(renames) + len(file_events)
+
+    def record_commits(self) -> int:
+        """记录活跃会话开始以来的新提交（按 sha 去重），返回新记录的数量"""
+        session_id = self.store.active_id()
+        if not session_id:
+            return 0
+        try:
+            head = self.git.head()
+        except GitReaderError:
+            return 0
+        if head is None or self._last_head == (session_id, head):
+            return 0
+
+        session = self.store.active()
+        if session is None:
+            return 0
+        known = {commit.get("sha") for commit in session.get("git_commits") or [] if isinstance(commit, dict)}
+        try:
+            start = datetime.fromisoformat(session["start_time"]).timestamp()
+        except (KeyError, TypeError, ValueError):
+            return 0
+
+        new_commits = []
+        try:
+            for commit in self.git.iter_commits(head, limit=MAX_COMMITS_PER_SCAN):
+                # 按提交时间从新到旧遍历，早于会话开始即可停止
+                if commit.committer_time < start:
+                    break
+                if commit.sha not in known:
+                    new_commits.append(commit)
+        except GitReaderError:
+            return 0
+
+        if new_commits:
+            self.store.append(session_id, [
+                {"op": "upsert", "field": "git_commits", "key": "sha", "value": {
+                    "sha": commit.sha,
+                    "subject": commit.subject,
+                    "author": commit.author,
+                    "time": datetime.fromtimestamp(commit.committer_time).isoformat(),
+                }}
+                for commit in reversed(new_commits)
+            ])
+        self._last_head = (session_id, head)
+        return len(new_commits)
+
+
+def _file_entry(value: Dict, defaults: Optional[Dict] = None) -> Dict:
+    entry = {"op": "upsert", "field": "files_modified", "key": "path", "value": value}
+    if defaults:
+        entry["defaults"] = defaults
+    return entry
+
+
+def is_git_change(paths: Iterable[str]) -> bool:
+    """变化的路径中是否包含 .git 引用（可能有新提交）"""
+    return any(path.startswith(".git/") for path in paths)
@@ -10,17 +10,100 @@ python smart-refresh.py --force        # 强制刷新
 """
 
 import os
+import re
 import sys
 import json
+import time
+import fnmatch
 import subprocess
-import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime, timedelta
-from typing import Dict, List, Tuple, Optional
+from typing import Dict, Iterable, List, Set, Tuple, Optional
+
+# 添加当前目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent))
+
+from metadata_index import MetadataIndex  # type: ignore
+from git_reader import GitReader  # type: ignore
+from change_ledger import ChangeLedger, GIT_BATCH_SIZE  # type: ignore
+from merkle_tree import MerkleTree, build_merkle_tree  # type: ignore
+from refresh_engine import load_tool_module  # type: ignore
+
+# 依赖清单和团队文件（以 / 开头表示只匹配项目根目录）
+DEPENDENCY_FILES = [
+    "/package.json", "/package-lock.json",
+    "/requirements.txt", "/Pipfile", "/Pipfile.lock",
+    "/Cargo.toml", "/Cargo.lock",
+    "/go.mod", "/go.sum"
+]
+TEAM_FILES = [
+    "/.ai-context/team/",
+    "/CODEOWNERS",
+    "/.github/CODEOWNERS",
+    "/team.json",
+    "/contributors.md"
+]
+
+# 没有上次刷新记录时各类变更检查回溯的提交数（对应原来的 HEAD~N..HEAD）；
+# 有记录时统一检查上次刷新提交以来的全部新提交
+CHANGE_WINDOWS = {
+    "critical": 5,
+    "architecture": 5,
+    "dependency": 3,
+    "team": 3
+}
+
+# 探针结果的有效期：同一次 --check/--report/--auto 调用中每个探针只执行一次，
+# 常驻进程（守护进程）中过期后重新执行
+PROBE_TTL_SECONDS = 5.0
+
+class PathMatcher:
+    """
+    预编译的路径模式匹配器，语义与 .gitignore 相同：
+    - 以 / 结尾的模式只匹配目录（及其下的所有文件）
+    - 包含 / 的模式相对项目根目录匹配，否则匹配任意层级的文件或目录名
+    - 支持 * ? [] 通配符
+    """
+    
+    def __init__(self, categories: Dict[str, Iterable[str]], exclude_patterns: Iterable[str] = ()):
+        self._categories = {name: self._compile(patterns) for name, patterns in categories.items()}
+        self._exclude = self._compile(exclude_patterns)
+    
+    @staticmethod
+    def _compile(patterns: Iterable[str]):
+        """将一组模式编译为单个正则表达式"""
+        parts = []
+        for pattern in patterns:
+            dir_only = pattern.endswith("/")
+            body = pattern.strip("/")
+            if not body:
+                continue
+            anchored = "/" in pattern.rstrip("/")
+            regex = fnmatch.translate(body)[:-2]  # 去掉 \Z 结尾
+            regex = regex.replace(".*", "[^/]*")  # * 不跨越目录层级
+            prefix = "" if anchored else "(?:.*/)?"
+            suffix = "/.*" if dir_only else "(?:/.*)?"
+            parts.append(f"{prefix}{regex}{suffix}")
+        if not parts:
+            return None
+        return re.compile("(?s:" + "|".join(f"(?:{part})" for part in parts) + r")\Z")
+    
+    def is_excluded(self, path: str) -> bool:
+        return self._exclude is not None and self._exclude.match(path) is not None
+    
+    def categories_for(self, path: str) -> Set[str]:
+        """返回路径所属的全部类别（被排除的路径返回空集合）"""
+        if self.is_excluded(path):
+            return set()
+        return {name for name, regex in self._categories.items() if regex is not None and regex.match(path)}
 
 class SmartContextRefresher:
-    def __init__(self, project_root: str = "."):
+    def __init__(self, project_root: str = ".", generator=None):
         self.project_root = Path(project_root).resolve()
+        # 进程内的上下文生成器（由刷新引擎共享传入，或首次刷新时加载）
+        self.generator = generator
         self.ai_context_dir = self.project_root / ".ai-context"
         self.cache_dir = self.ai_context_dir / "cache"
         self.cache_dir.mkdir(parents=True, exist_ok=True)
@@ -29,6 +112,29 @@ class SmartContextRefresher:
         self.config = self._load_config()
         self.last_refresh_file = self.cache_dir / "last_refresh.json"
         self.change_tracking_file = self.cache_dir / "change_tracking.json"
+        
+        # 所有路径模式一次性编译，配合单次 git 调用在内存中匹配
+        patterns = self.config["patterns"]
+        self.path_matcher = PathMatcher({
+            "critical": patterns.get("critical_files", []),
+            "architecture": patterns.get("architecture_files", []),
+            "dependency": DEPENDENCY_FILES,
+            "team": TEAM_FILES
+        }, patterns.get("exclude_patterns", []))
+        
+        # 直接读取 .git 获取 HEAD，HEAD 未变化时复用上次的 git 分析结果
+        self.git = GitReader(self.project_root)
+        self._categorized_changes = None
+        self._categorized_changes_key = None
+        self.change_ledger = ChangeLedger(self.project_root, self.change_tracking_file, self.git)
+        # 常驻的元数据索引，内容哈希在多次检查之间复用
+        self.metadata_index = MetadataIndex.for_project(self.project_root)
+        self._code_analysis = None
+        self._code_analysis_key = None
+        
+        # 探针结果缓存: 名称 -> (执行时间, 结果)
+        self._probe_cache: Dict[str, Tuple[float, object]] = {}
+        self._probe_lock = threading.Lock()
     
     def _load_config(self) -> Dict:
         """加载刷新配置"""
@@ -74,12 +180,15 @@ class SmartContextRefresher:
         """检查是否需要刷新上下文"""
         reasons = []
         
+        # 并发执行检查所需的探针，以下各项检查直接使用缓存的结果
+        self._run_probes(self._check_probe_names())
+        
         # 1. 检查时间间隔
-        if self._check_time_threshold():
+        if self._probe("time"):
             reasons.append("⏰ 距离上次刷新时间过长")
         
         # 2. 检查代码变更
-        code_changes = self._analyze_code_changes()
+        code_changes = self._probe("code")
         if code_changes["needs_refresh"]:
             reasons.extend(code_changes["reasons"])
         
@@ -98,8 +207,99 @@ class SmartContextRefresher:
         if team_changes:
             reasons.append(f"👥 团队配置变更: {team_changes}")
         
+        # 6. 检查架构文件变更
+        if self.config.get("refresh_triggers", {}).get("architecture_changes", True):
+            architecture_changes = self._check_architecture_changes()
+            if architecture_changes:
+                reasons.append(f"🏗️ 架构文件变更: {', '.join(architecture_changes)}")
+        
+        # 7. 非 Git 项目通过内容指纹发现变化
+        if not self.git.is_repository():
+            content = self._probe("content")
+            if content["changed"]:
+                reasons.append(f"🧬 项目内容已变更: {', '.join(content['changed_areas'][:5]) or '项目根目录'}")
+        
         return len(reasons) > 0, reasons
     
+    def _probe_functions(self) -> Dict:
+        """相互独立的探针（代码变更分析和 git 变更归类各自调用 git，可并发执行）"""
+        return {
+            "time": self._check_time_threshold,
+            "code": self._analyze_code_changes,
+            "changes": self._get_categorized_changes,
+            "content": self.get_content_state
+        }
+    
+    def _check_probe_names(self) -> List[str]:
+        """检查需要的探针：内容指纹需要遍历目录，只用于非 Git 项目（报告中按需计算）"""
+        names = ["time", "code", "changes"]
+        if not self.git.is_repository():
+            names.append("content")
+        return names
+    
+    def _fresh_probe_result(self, name: str):
+        """返回未过期的探针结果，没有时返回 None"""
+        with self._probe_lock:
+            cached = self._probe_cache.get(name)
+        if cached is not None and time.monotonic() - cached[0] < PROBE_TTL_SECONDS:
+            return cached
+        return None
+    
+    def _store_probe_result(self, name: str, started: float, result):
+        with self._probe_lock:
+            self._probe_cache[name] = (started, result)
+    
+    def _run_probes(self, names: Iterable[str]):
+        """在线程池中并发执行指定探针中已过期的探针"""
+        functions = self._probe_functions()
+        pending = [name for name in names if self._fresh_probe_result(name) is None]
+        if not pending:
+            return
+        
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=len(pending)) as pool:
+            futures = {name: pool.submit(functions[name]) for name in pending}
+        for name, future in futures.items():
+            self._store_probe_result(name, started, future.result())
+    
+    def _probe(self, name: str):
+        """获取探针结果（有效期内复用，否则同步执行一次）"""
+        cached = self._fresh_probe_result(name)
+        if cached is not None:
+            return cached[1]
+        started = time.monotonic()
+        result = self._probe_functions()[name]()
+        self._store_probe_result(name, started, result)
+        return result
+    
+    def invalidate_probes(self):
+        """丢弃所有探针结果（刷新后上次刷新记录已变化）"""
+        with self._probe_lock:
+            self._probe_cache.clear()
+    
+    def _build_content_tree(self) -> MerkleTree:
+        """增量刷新元数据索引并构建内容 Merkle 树"""
+        return build_merkle_tree(self.metadata_index.refresh())
+    
+    def get_content_state(self) -> Dict:
+        """
+        比较当前内容指纹与上次刷新记录的指纹
+        返回 {"fingerprint", "changed", "changed_areas"}，changed_areas 为变化的顶层目录/文件
+        """
+        tree = self._build_content_tree()
+        try:
+            with open(self.last_refresh_file, 'r', encoding='utf-8') as f:
+                recorded = json.load(f).get("project_state", {})
+        except (OSError, json.JSONDecodeError, AttributeError):
+            recorded = {}
+        
+        changed = tree.root != recorded.get("content_fingerprint")
+        return {
+            "fingerprint": tree.root,
+            "changed": changed,
+            "changed_areas": MerkleTree.changed_paths(tree.top_level(), recorded.get("content_tree")) if changed else []
+        }
+    
     def _check_time_threshold(self) -> bool:
         """检查时间阈值"""
         if not self.last_refresh_file.exists():
@@ -117,174 +317,180 @@ class SmartContextRefresher:
             return True
     
     def _analyze_code_changes(self) -> Dict:
-        """分析代码变更情况"""
+        """
+        分析上次刷新以来的代码变更
+        新提交的 numstat 统计追加到 change_tracking.json，已记录的提交直接复用；
+        没有刷新记录时统计最近 10 个提交
+        """
+        head = self.git.head()
+        if not head:
+            return {"needs_refresh": False, "reasons": []}
+        
+        base = self._get_last_refresh_commit()
+        key = (head, base)
+        if self._code_analysis_key == key:
+            return self._code_analysis
+        
         try:
-            # 获取Git变更统计
-            result = subprocess.run([
-                "git", "diff", "--stat", "HEAD~10..HEAD"
-            ], capture_output=True, text=True, cwd=self.project_root)
-            
-            if result.returncode != 0:
-                return {"needs_refresh": False, "reasons": []}
-            
-            lines = result.stdout.strip().split('\n')
-            if not lines or lines == ['']:
-                return {"needs_refresh": False, "reasons": []}
-            
-            # 解析变更统计
-            total_files = 0
-            total_insertions = 0
-            total_deletions = 0
-            new_files = 0
-            
-            for line in lines[:-1]:  # 最后一行是总计
-                if 'file changed' in line or 'files changed' in line:
-                    continue
-                
-                parts = line.split('|')
-                if len(parts) >= 2:
-                    total_files += 1
-                    if 'new file' in line:
-                        new_files += 1
-                    
-                    # 统计插入和删除行数
-                    stats = parts[1].strip()
-                    if '+' in stats:
-                        total_insertions += stats.count('+')
-                    if '-' in stats:
-                        total_deletions += stats.count('-')
-            
-            # 检查阈值
-            reasons = []
-            thresholds = self.config["thresholds"]
-            
-            total_changes = total_insertions + total_deletions
-            if total_changes > thresholds["max_code_changes"]:
-                reasons.append(f"📝 代码变更过多: {total_changes}行")
-            
-            if new_files > thresholds["max_new_files"]:
-                reasons.append(f"📁 新增文件过多: {new_files}个")
-            
-            return {
-                "needs_refresh": len(reasons) > 0,
-                "reasons": reasons,
-                "stats": {
-                    "total_files": total_files,
-                    "new_files": new_files,
-                    "total_changes": total_changes
-                }
-            }
-            
+            stats = self.change_ledger.changes_since(base)
         except Exception as e:
             print(f"⚠️ 分析代码变更时出错: {e}")
             return {"needs_refresh": False, "reasons": []}
-    
-    def _check_config_changes(self) -> List[str]:
-        """检查关键配置文件变更"""
-        changed_configs = []
         
-        try:
-            # 检查关键配置文件
-            critical_patterns = self.config["patterns"]["critical_files"]
-            
-            for pattern in critical_patterns:
-                # 使用git检查文件变更
-                result = subprocess.run([
-                    "git", "diff", "--name-only", "HEAD~5..HEAD", "--", pattern
-                ], capture_output=True, text=True, cwd=self.project_root)
-                
-                if result.returncode == 0 and result.stdout.strip():
-                    changed_files = result.stdout.strip().split('\n')
-                    changed_configs.extend(changed_files)
-            
-        except Exception as e:
-            print(f"⚠️ 检查配置变更时出错: {e}")
+        # 检查阈值
+        reasons = []
+        thresholds = self.config["thresholds"]
         
-        return list(set(changed_configs))  # 去重
-    
-    def _check_dependency_changes(self) -> List[str]:
-        """检查依赖包变更"""
-        dependency_files = [
-            "package.json", "package-lock.json",
-            "requirements.txt", "Pipfile", "Pipfile.lock",
-            "Cargo.toml", "Cargo.lock",
-            "go.mod", "go.sum"
-        ]
+        if stats["total_changes"] > thresholds["max_code_changes"]:
+            reasons.append(f"📝 代码变更过多: {stats['total_changes']}行")
         
-        changed_deps = []
+        if stats["new_files"] > thresholds["max_new_files"]:
+            reasons.append(f"📁 新增文件过多: {stats['new_files']}个")
         
+        self._code_analysis = {
+            "needs_refresh": len(reasons) > 0,
+            "reasons": reasons,
+            "stats": stats
+        }
+        self._code_analysis_key = key
+        return self._code_analysis
+    
+    def _get_last_refresh_commit(self) -> Optional[str]:
+        """上次刷新时记录的提交"""
         try:
-            for dep_file in dependency_files:
-                if (self.project_root / dep_file).exists():
-                    result = subprocess.run([
-                        "git", "diff", "--name-only", "HEAD~3..HEAD", "--", dep_file
-                    ], capture_output=True, text=True, cwd=self.project_root)
-                    
-                    if result.returncode == 0 and result.stdout.strip():
-                        changed_deps.append(dep_file)
+            with open(self.last_refresh_file, 'r', encoding='utf-8') as f:
+                return json.load(f).get("project_state", {}).get("git_commit") or None
+        except (OSError, json.JSONDecodeError, AttributeError):
+            return None
+    
+    def _get_categorized_changes(self) -> Dict[str, List[str]]:
+        """
+        获取上次刷新以来新提交中变更的文件并按类别归类（新提交由变更账本沿第一父提交查找）
+        没有刷新记录时按回溯窗口统计：只有当 HEAD~N 存在时才统计 N 个提交的窗口，
+        与原来的 git diff HEAD~N..HEAD 一致
+        结果按 (HEAD, 上次刷新提交) 缓存，两者都未变化时不再调用 git；
+        git 调用失败时返回空结果但不缓存，下次检查重新获取
+        """
+        head = self.git.head()
+        key = (head, self._get_last_refresh_commit())
+        if self._categorized_changes is not None and key == self._categorized_changes_key:
+            return self._categorized_changes
         
+        categorized = {name: [] for name in CHANGE_WINDOWS}
+        if not head:
+            self._categorized_changes = categorized
+            self._categorized_changes_key = key
+            return categorized
+        
+        base = key[1]
+        try:
+            if base:
+                shas = self.change_ledger.commits_since(base, head)
+                commits = self._name_status_for(shas)
+                windows = {name: len(commits) for name in CHANGE_WINDOWS}
+            else:
+                max_window = max(CHANGE_WINDOWS.values())
+                commits = self._run_name_status_log(["--first-parent", "-n", str(max_window + 1)])
+                windows = {name: window for name, window in CHANGE_WINDOWS.items() if len(commits) > window}
         except Exception as e:
-            print(f"⚠️ 检查依赖变更时出错: {e}")
+            print(f"⚠️ 获取Git变更时出错: {e}")
+            return categorized
         
-        return changed_deps
+        for name, window in windows.items():
+            seen = set()
+            for changed_files in commits[:window]:
+                for path in changed_files:
+                    if path not in seen and name in self.path_matcher.categories_for(path):
+                        seen.add(path)
+                        categorized[name].append(path)
+        
+        self._categorized_changes = categorized
+        self._categorized_changes_key = key
+        return categorized
+    
+    def _name_status_for(self, shas: List[str]) -> List[List[str]]:
+        """指定提交（从新到旧）各自变更的路径，每批只调用一次 git"""
+        commits = []
+        for start in range(0, len(shas), GIT_BATCH_SIZE):
+            commits.extend(self._run_name_status_log(
+                ["--no-walk=unsorted", "--first-parent", *shas[start:start + GIT_BATCH_SIZE]]))
+        return commits
+    
+    def _run_name_status_log(self, args: List[str]) -> List[List[str]]:
+        result = subprocess.run(["git", "log", "-m", "--name-status", "--format=%x00%H", *args],
+                                capture_output=True, text=True, cwd=self.project_root)
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.strip() or f"git log 退出码 {result.returncode}")
+        return self._parse_name_status_log(result.stdout)
+    
+    @staticmethod
+    def _parse_name_status_log(output: str) -> List[List[str]]:
+        """解析 git log --name-status 输出，按提交（从新到旧）返回变更路径列表"""
+        commits = []
+        for block in output.split("\x00")[1:]:
+            paths = []
+            for line in block.split("\n")[1:]:
+                fields = line.split("\t")
+                if len(fields) < 2:
+                    continue
+                # 重命名/复制 (R100/C100) 同时记录旧路径和新路径
+                paths.extend(fields[1:])
+            commits.append(paths)
+        return commits
+    
+    def _check_config_changes(self) -> List[str]:
+        """检查关键配置文件变更"""
+        return self._probe("changes")["critical"]
+    
+    def _check_dependency_changes(self) -> List[str]:
+        """检查依赖包变更"""
+        return [path for path in self._probe("changes")["dependency"]
+                if (self.project_root / path).exists()]
     
     def _check_team_changes(self) -> Optional[str]:
         """检查团队配置变更"""
-        team_files = [
-            ".ai-context/team/",
-            "CODEOWNERS",
-            ".github/CODEOWNERS",
-            "team.json",
-            "contributors.md"
-        ]
-        
-        try:
-            for team_file in team_files:
-                if (self.project_root / team_file).exists():
-                    result = subprocess.run([
-                        "git", "diff", "--name-only", "HEAD~3..HEAD", "--", team_file
-                    ], capture_output=True, text=True, cwd=self.project_root)
-                    
-                    if result.returncode == 0 and result.stdout.strip():
-                        return f"团队文件变更: {team_file}"
-        
-        except Exception as e:
-            print(f"⚠️ 检查团队变更时出错: {e}")
-        
+        team_changes = self._probe("changes")["team"]
+        if team_changes:
+            return f"团队文件变更: {team_changes[0]}"
         return None
     
+    def _check_architecture_changes(self) -> List[str]:
+        """检查架构文件变更（architecture_files 配置）"""
+        return self._probe("changes")["architecture"]
+    
     def refresh_context(self, reason: str = "manual") -> bool:
         """执行上下文刷新"""
         print(f"🔄 开始刷新AI上下文...")
         print(f"📝 刷新原因: {reason}")
         
         try:
-            # 运行上下文生成器
-            context_generator = self.ai_context_dir / "tools" / "context-generator.py"
-            
-            if not context_generator.exists():
-                print(f"❌ 找不到上下文生成器: {context_generator}")
+            # 在当前进程内运行上下文生成器
+            generator = self._get_generator()
+            if generator is None:
                 return False
             
-            result = subprocess.run([
-                sys.executable, str(context_generator),
-                "--auto-refresh",
-                f"--reason={reason}"
-            ], cwd=self.project_root)
+            generator.generate_context_summary()
             
-            if result.returncode == 0:
-                # 记录刷新信息
-                self._record_refresh(reason)
-                print("✅ 上下文刷新完成")
-                return True
-            else:
-                print("❌ 上下文刷新失败")
-                return False
+            # 记录刷新信息
+            self._record_refresh(reason)
+            print("✅ 上下文刷新完成")
+            return True
                 
         except Exception as e:
             print(f"❌ 刷新过程中出错: {e}")
             return False
     
+    def _get_generator(self):
+        """获取进程内的上下文生成器"""
+        if self.generator is None:
+            try:
+                module = load_tool_module("context-generator.py")
+            except (ImportError, OSError) as e:
+                print(f"❌ 无法加载上下文生成器: {e}")
+                return None
+            self.generator = module.ContextGenerator(str(self.project_root))
+        return self.generator
+    
     def _record_refresh(self, reason: str):
         """记录刷新信息"""
         refresh_data = {
@@ -295,21 +501,23 @@ class SmartContextRefresher:
         
         with open(self.last_refresh_file, 'w', encoding='utf-8') as f:
             json.dump(refresh_data, f, ensure_ascii=False, indent=2)
+        self.invalidate_probes()
     
     def _get_project_state(self) -> Dict:
         """获取当前项目状态快照"""
         try:
-            # Git信息
-            git_hash = subprocess.run([
-                "git", "rev-parse", "HEAD"
-            ], capture_output=True, text=True, cwd=self.project_root).stdout.strip()
+            # Git信息（直接读取 .git/HEAD 和引用）
+            git_hash = self.git.head() or ""
             
-            # 文件统计
-            total_files = len(list(self.project_root.rglob("*")))
+            # 文件统计和内容指纹（增量刷新持久化索引，不再遍历 .git 等排除目录）
+            tree = self._build_content_tree()
+            total_files = self.metadata_index.count_files()
             
             return {
                 "git_commit": git_hash,
                 "total_files": total_files,
+                "content_fingerprint": tree.root,
+                "content_tree": tree.top_level(),
                 "timestamp": datetime.now().isoformat()
             }
         except:
@@ -319,8 +527,8 @@ class SmartContextRefresher:
         """生成刷新需求报告"""
         needs_refresh, reasons = self.check_refresh_needed()
         
-        # 获取详细分析
-        code_analysis = self._analyze_code_changes()
+        # 获取详细分析（复用检查时的探针结果）
+        code_analysis = self._probe("code")
         config_changes = self._check_config_changes()
         dependency_changes = self._check_dependency_changes()
         
@@ -341,6 +549,7 @@ class SmartContextRefresher:
             "代码变更分析": code_analysis,
             "配置文件变更": config_changes,
             "依赖变更": dependency_changes,
+            "内容指纹": self._probe("content"),
             "建议": self._get_recommendations(needs_refresh, reasons)
         }
     
@@ -365,6 +574,23 @@ class SmartContextRefresher:
         
         return recommendations
 
+def format_refresh_report(report: Dict) -> str:
+    """将刷新需求报告格式化为文本"""
+    lines = ["", "="*60, "🔍 AI上下文刷新需求分析报告", "="*60]
+    
+    for key, value in report.items():
+        lines.append(f"\n📋 {key}:")
+        if isinstance(value, list):
+            for item in value:
+                lines.append(f"  • {item}")
+        elif isinstance(value, dict):
+            for k, v in value.items():
+                lines.append(f"  {k}: {v}")
+        else:
+            lines.append(f"  {value}")
+    
+    return "\n".join(lines)
+
 def main():
     import argparse
     
@@ -374,6 +600,7 @@ def main():
     parser.add_argument("--force", action="store_true", help="强制刷新")
     parser.add_argument("--report", action="store_true", help="生成详细报告")
     parser.add_argument("--project", default=".", help="项目路径")
+    parser.add_argument("--reason", help="刷新原因（配合 --force 使用）")
     
     args = parser.parse_args()
     
@@ -382,20 +609,7 @@ def main():
     if args.report:
         # 生成详细报告
         report = refresher.generate_refresh_report()
-        print("\n" + "="*60)
-        print("🔍 AI上下文刷新需求分析报告")
-        print("="*60)
-        
-        for key, value in report.items():
-            print(f"\n📋 {key}:")
-            if isinstance(value, list):
-                for item in value:
-                    print(f"  • {item}")
-            elif isinstance(value, dict):
-                for k, v in value.items():
-                    print(f"  {k}: {v}")
-            else:
-                print(f"  {value}")
+        print(format_refresh_report(report))
         
     elif args.check:
         # 检查是否需要刷新
@@ -427,7 +641,7 @@ def main():
     
     elif args.force:
         # 强制刷新
-        success = refresher.refresh_context("强制刷新")
+        success = refresher.refresh_context(args.reason or "强制刷新")
         if success:
             print("🎉 强制刷新完成")
         else:
@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""
+合成项目生成器
+按给定形状（文件数、目录深度、扇出、提交数、会话数、文档数）在磁盘上生成可复现的测试项目，
+供基准测试衡量上下文工具随项目规模的变化：
+- 目录树按固定随机种子逐层展开，每个目录最多 fanout 个子目录、深度不超过 depth
+- 文件按扩展名比例分布在各目录中，修改时间分散在最近 MTIME_SPREAD_DAYS 天内
+- Git 历史通过 git fast-import 一次写入（未安装 git 时跳过）
+- 会话直接写成会话存储的文件格式：近期会话为会话文件，较早的会话写入按月归档分段，
+  会话索引由 SessionStore 从这些文件重建
+生成完成后写入形状标记，形状相同时可直接复用已生成的项目。
+重新生成前只删除带形状标记（或位于调用方指定的工作目录下）的目录，其他非空目录拒绝覆盖
+
+使用方法:
+    shape = SyntheticShape(files=1000, depth=4, fanout=8, commits=200, sessions=200, docs=20)
+    generate_project("/tmp/bench-project", shape)
+"""
+
+import json
+import os
+import random
+import shutil
+import subprocess
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Tuple
+
+from session_store import SessionStore, CATALOG_DB_NAME, ARCHIVE_DIR_NAME, ARCHIVE_AFTER_DAYS  # type: ignore
+from session_tracker import FILE_MODIFIED  # type: ignore
+
+SHAPE_MARKER_NAME = "synthetic-shape.json"
+# 文件修改时间的分布范围（天），其中一部分落在"最近更新"的时间窗口内
+MTIME_SPREAD_DAYS = 60
+# 相邻两个合成会话的开始时间间隔和会话时长
+SESSION_INTERVAL = timedelta(hours=3)
+SESSION_DURATION = timedelta(hours=1)
+PROGRESS_EVERY = 100000
+
+# (扩展名, 权重)
+FILE_TYPES = [
+    (".py", 35), (".js", 15), (".ts", 10), (".md", 10),
+    (".json", 10), (".txt", 10), (".css", 5), (".html", 5),
+]
+
+FILLER = "x = 1\n" * 32
+
+
+class SyntheticShape(NamedTuple):
+    """合成项目的形状"""
+    files: int = 1000
+    depth: int = 4
+    fanout: int = 8
+    files_per_dir: int = 20
+    commits: int = 200
+    sessions: int = 200
+    docs: int = 20
+    seed: int = 42
+
+
+def shape_matches(project_root, shape: SyntheticShape) -> bool:
+    """项目已按相同形状生成完毕"""
+    marker = Path(project_root) / ".ai-context" / SHAPE_MARKER_NAME
+    try:
+        with open(marker, 'r', encoding='utf-8') as f:
+            return json.load(f) == shape._asdict()
+    except (OSError, ValueError):
+        return False
+
+
+def is_synthetic_project(project_root) -> bool:
+    """目录由 generate_project 生成（带形状标记）"""
+    return (Path(project_root) / ".ai-context" / SHAPE_MARKER_NAME).is_file()
+
+
+def generate_project(project_root, shape: SyntheticShape, log=print, work_dir=None) -> Dict:
+    """
+    清空 project_root 并按形状生成项目，返回各阶段耗时（秒）及实际生成的数量
+    只清空带形状标记或位于 work_dir 下的目录；其他非空目录抛出 ValueError，不做任何修改
+    """
+    root = Path(project_root).resolve()
+    if root.exists():
+        under_work_dir = work_dir is not None and Path(work_dir).resolve() in root.parents
+        if not (is_synthetic_project(root) or under_work_dir or (root.is_dir() and not any(root.iterdir()))):
+            raise ValueError(f"{root} 不是合成项目目录且不为空，拒绝删除")
+        shutil.rmtree(root)
+    root.mkdir(parents=True)
+    rng = random.Random(shape.seed)
+    now = time.time()
+    stats: Dict = {}
+
+    started = time.perf_counter()
+    directories = _plan_directories(rng, shape)
+    paths = _write_files(root, directories, shape, rng, now, log)
+    stats["directories"] = len(directories)
+    stats["files_seconds"] = round(time.perf_counter() - started, 3)
+
+    started = time.perf_counter()
+    _write_ai_context(root, shape)
+    _write_docs(root, shape.docs)
+    stats["docs_seconds"] = round(time.perf_counter() - started, 3)
+
+    started = time.perf_counter()
+    stats["commits"] = _write_git_history(root, paths, shape, rng)
+    stats["git_seconds"] = round(time.perf_counter() - started, 3)
+
+    started = time.perf_counter()
+    stats["sessions"] = _write_sessions(root, paths, shape, rng, datetime.fromtimestamp(now))
+    stats["sessions_seconds"] = round(time.perf_counter() - started, 3)
+
+    with open(root / ".ai-context" / SHAPE_MARKER_NAME, 'w', encoding='utf-8') as f:
+        json.dump(shape._asdict(), f, indent=2)
+    return stats
+
+
+def _plan_directories(rng: random.Random, shape: SyntheticShape) -> List[str]:
+    """随机展开目录树直到目录数足够容纳全部文件（或达到深度和扇出限制）"""
+    needed = max(1, -(-shape.files // max(1, shape.files_per_dir)))
+    directories = [""]
+    children = {"": 0}
+    expandable: List[Tuple[str, int]] = [("", 0)] if shape.depth > 0 else []
+    while len(directories) < needed and expandable:
+        slot = rng.randrange(len(expandable))
+        parent, depth = expandable[slot]
+        name = f"{'pkg' if depth == 0 else 'mod'}{children[parent]:02d}"
+        child = f"{parent}/{name}" if parent else name
+        children[parent] += 1
+        if children[parent] >= shape.fanout:
+            expandable[slot] = expandable[-1]
+            expandable.pop()
+        directories.append(child)
+        children[child] = 0
+        if depth + 1 < shape.depth:
+            expandable.append((child, depth + 1))
+    return directories
+
+
+def _write_files(root: Path, directories: List[str], shape: SyntheticShape, rng: random.Random,
+                 now: float, log) -> List[str]:
+    """按目录轮流放置文件，返回全部文件的相对路径"""
+    extensions = [ext for ext, _ in FILE_TYPES]
+    weights = [weight for _, weight in FILE_TYPES]
+    for directory in directories[1:]:
+        (root / directory).mkdir(parents=True, exist_ok=True)
+
+    paths = []
+    for i in range(shape.files):
+        directory = directories[i % len(directories)]
+        name = f"file{i:07d}{rng.choices(extensions, weights)[0]}"
+        rel_path = f"{directory}/{name}" if directory else name
+        full_path = root / rel_path
+        with open(full_path, 'w', encoding='utf-8') as f:
+            f.write(f"# synthetic file {i}\n{FILLER}")
+        mtime = now - rng.random() * MTIME_SPREAD_DAYS * 86400
+        os.utime(full_path, (mtime, mtime))
+        paths.append(rel_path)
+        if (i + 1) % PROGRESS_EVERY == 0:
+            log(f"   已生成 {i + 1}/{shape.files} 个文件")
+    return paths
+
+
+def _write_ai_context(root: Path, shape: SyntheticShape):
+    """配置文件、项目概览和依赖清单"""
+    ai_context_dir = root / ".ai-context"
+    for sub_dir in ("cache", "docs", "sessions"):
+        (ai_context_dir / sub_dir).mkdir(parents=True, exist_ok=True)
+
+    config = {
+        "project": {
+            "name": root.name,
+            "type": "general",
+            "version": "1.0.0",
+            "created": datetime.now().isoformat(),
+            "description": f"合成基准项目（{shape.files} 个文件）"
+        },
+        "settings": {"max_context_length": 15000},
+        "scanning": {
+            "max_depth": 3,
+            "include_hidden_dirs": False,
+            "special_include_dirs": [".ai-context"],
+            "exclude_dirs": ["__pycache__", "node_modules", ".git"]
+        },
+        "recent_files": {"days_threshold": 7, "max_depth": 3, "include_hidden_dirs": False},
+        "integrations": {"git": True}
+    }
+    with open(ai_context_dir / "context-config.json", 'w', encoding='utf-8') as f:
+        json.dump(config, f, indent=2, ensure_ascii=False)
+
+    features = "\n".join(f"- 功能模块 {i}: 合成功能描述" for i in range(1, 11))
+    constraints = "\n".join(f"- 约束 {i}: 合成约束描述" for i in range(1, 6))
+    with open(ai_context_dir / "docs" / "project-overview.md", 'w', encoding='utf-8') as f:
+        f.write(f"# {root.name}\n\n## 核心功能\n{features}\n\n## 技术约束\n{constraints}\n")
+
+    (root / "requirements.txt").write_text("requests>=2.0\n", encoding='utf-8')
+    (root / "package.json").write_text(json.dumps({"name": root.name, "version": "1.0.0"}), encoding='utf-8')
+    (root / "README.md").write_text(f"# {root.name}\n", encoding='utf-8')
+
+
+def _write_docs(root: Path, count: int):
+    docs_dir = root / "docs"
+    docs_dir.mkdir(exist_ok=True)
+    for i in range(count):
+        with open(docs_dir / f"guide-{i:04d}.md", 'w', encoding='utf-8') as f:
+            f.write(f"# 文档 {i}\n\n## 概述\n合成文档内容。\n\n## 细节\n" + "- 条目\n" * 20)
+
+
+def _write_git_history(root: Path, paths: List[str], shape: SyntheticShape, rng: random.Random) -> int:
+    """用 git fast-import 写入线性提交历史（每个提交修改一个文件），返回提交数"""
+    if shape.commits <= 0 or not paths or shutil.which("git") is None:
+        return 0
+    env = dict(os.environ, GIT_CONFIG_NOSYSTEM="1")
+    subprocess.run(["git", "init", "-q"], cwd=root, check=True, env=env)
+    subprocess.run(["git", "symbolic-ref", "HEAD", "refs/heads/main"], cwd=root, check=True, env=env)
+
+    start = int(time.time()) - shape.commits * 600
+    chunks = []
+    for i in range(1, shape.commits + 1):
+        message = f"合成提交 {i}".encode('utf-8')
+        content = f"# revision {i}\n{FILLER}".encode('utf-8')
+        path = paths[rng.randrange(len(paths))] if i > 1 else paths[0]
+        chunks.append(b"commit refs/heads/main\n")
+        chunks.append(b"mark :%d\n" % i)
+        chunks.append(b"committer Bench <bench@example.com> %d +0000\n" % (start + i * 600))
+        chunks.append(b"data %d\n%s\n" % (len(message), message))
+        if i > 1:
+            chunks.append(b"from :%d\n" % (i - 1))
+        chunks.append(b"M 100644 inline %s\n" % path.encode('utf-8'))
+        chunks.append(b"data %d\n%s\n" % (len(content), content))
+    subprocess.run(["git", "fast-import", "--quiet"], cwd=root, input=b"".join(chunks), check=True, env=env)
+    return shape.commits
+
+
+def _write_sessions(root: Path, paths: List[str], shape: SyntheticShape, rng: random.Random,
+                    now: datetime) -> int:
+    """
+    写入 shape.sessions 个已结束的会话（从当前时间向前排列），
+    结束超过 ARCHIVE_AFTER_DAYS 天的写入归档分段，最后由 SessionStore 重建索引
+    """
+    sessions_dir = root / ".ai-context" / "sessions"
+    archive_dir = sessions_dir / ARCHIVE_DIR_NAME
+    cutoff = now - timedelta(days=ARCHIVE_AFTER_DAYS)
+    segments: Dict[str, List[str]] = {}
+
+    for i in range(shape.sessions):
+        start = (now - SESSION_INTERVAL * (i + 1)).replace(microsecond=0)
+        end = start + SESSION_DURATION
+        session = _synthetic_session(i, start, end, paths, rng)
+        if end < cutoff:
+            segments.setdefault(start.strftime("%Y-%m"), []).append(json.dumps(session, ensure_ascii=False))
+        else:
+            with open(sessions_dir / f"{session['session_id']}.json", 'w', encoding='utf-8') as f:
+                json.dump(session, f, indent=2, ensure_ascii=False)
+
+    if segments:
+        archive_dir.mkdir(exist_ok=True)
+    for month, lines in segments.items():
+        # 归档分段按追加顺序存放，与 SessionStore.compact 写入的顺序一致（较早的在前）
+        with open(archive_dir / f"sessions-{month}.jsonl", 'w', encoding='utf-8') as f:
+            f.write("".join(line + "\n" for line in reversed(lines)))
+
+    store = SessionStore(sessions_dir, root / ".ai-context" / "cache" / CATALOG_DB_NAME)
+    return store.rebuild()
+
+
+def _synthetic_session(index: int, start: datetime, end: datetime, paths: List[str],
+                       rng: random.Random) -> Dict:
+    modified = [
+        {"path": paths[rng.randrange(len(paths))], "change": FILE_MODIFIED, "time": start.isoformat()}
+        for _ in range(min(3, len(paths)))
+    ]
+    return {
+        "session_id": f"session-{start.strftime('%Y%m%d-%H%M%S')}",
+        "start_time": start.isoformat(),
+        "end_time": end.isoformat(),
+        "title": f"合成会话 {index}",
+        "description": "基准测试生成的会话",
+        "status": "completed",
+        "files_modified": modified,
+        "git_commits": [],
+        "tags": ["benchmark"],
+        "updates": [{"time": start.isoformat(), "text": f"进展 {index}"}]
+    }
+
+
+def remove_derived_state(project_root, keep_prefixes: Iterable[str] = ()):
+    """删除 .ai-context/cache 下的派生数据（索引、章节缓存、输出文件），名称以 keep_prefixes 开头的保留"""
+    cache_dir = Path(project_root) / ".ai-context" / "cache"
+    if not cache_dir.exists():
+        return
+    keep_prefixes = tuple(keep_prefixes)
+    for entry in cache_dir.iterdir():
+        if keep_prefixes and entry.name.startswith(keep_prefixes):
+            continue
+        if entry.is_dir():
+            shutil.rmtree(entry, ignore_errors=True)
+        else:
+            try:
+                entry.unlink()
+            except OSError:
+                pass
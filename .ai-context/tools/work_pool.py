@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+公平工作线程池
+多项目守护进程的检查和刷新任务在有界线程池中执行：
+每个项目一个任务队列，按项目轮流调度（优先调度最久未执行的项目），
+同一项目同一时间只运行一个任务（引擎和缓存不需要加锁），
+项目队列中已有同名任务时新任务直接合并，积压的变更只触发一次刷新
+"""
+
+import itertools
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Deque, Dict, Optional, Tuple
+
+
+class FairWorkPool:
+    """按项目轮转调度的有界线程池"""
+
+    def __init__(self, max_workers: int,
+                 on_error: Optional[Callable[[str, str, Exception], None]] = None):
+        if max_workers < 1:
+            raise ValueError("max_workers 必须大于 0")
+        self.max_workers = max_workers
+        self.on_error = on_error
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="refresh-worker")
+        self._queues: Dict[str, Deque[Tuple[str, Callable[[], object]]]] = {}
+        self._running: Dict[str, str] = {}
+        # 每个项目最近一次被调度的序号，新项目为 -1
+        self._last_dispatch: Dict[str, int] = {}
+        self._dispatch_counter = itertools.count()
+        self._lock = threading.Lock()
+        self._closed = False
+        self.stats = {"submitted": 0, "coalesced": 0, "completed": 0, "failed": 0}
+
+    def submit(self, key: str, name: str, func: Callable[[], object]) -> bool:
+        """提交任务；同一项目队列中已有同名任务时合并并返回 False"""
+        with self._lock:
+            if self._closed:
+                return False
+            queue = self._queues.setdefault(key, deque())
+            if any(queued_name == name for queued_name, _ in queue):
+                self.stats["coalesced"] += 1
+                return False
+            queue.append((name, func))
+            self.stats["submitted"] += 1
+            self._dispatch_locked()
+        return True
+
+    def discard(self, key: str) -> int:
+        """丢弃项目尚未开始的任务（项目从注册表移除时），返回丢弃数量"""
+        with self._lock:
+            queue = self._queues.pop(key, None)
+            self._last_dispatch.pop(key, None)
+            return len(queue) if queue else 0
+
+    def pending(self, key: Optional[str] = None) -> int:
+        """排队中的任务数（指定 key 时只统计该项目）"""
+        with self._lock:
+            if key is not None:
+                return len(self._queues.get(key, ()))
+            return sum(len(queue) for queue in self._queues.values())
+
+    def running(self) -> Dict[str, str]:
+        """正在执行的任务: {项目: 任务名}"""
+        with self._lock:
+            return dict(self._running)
+
+    def shutdown(self, wait: bool = True):
+        """停止接收任务，丢弃排队中的任务；wait 为真时等待执行中的任务结束"""
+        with self._lock:
+            self._closed = True
+            self._queues.clear()
+        self._executor.shutdown(wait=wait)
+
+    def _dispatch_locked(self):
+        while len(self._running) < self.max_workers:
+            key = self._next_key_locked()
+            if key is None:
+                return
+            name, func = self._queues[key].popleft()
+            self._running[key] = name
+            self._last_dispatch[key] = next(self._dispatch_counter)
+            self._executor.submit(self._run, key, name, func)
+
+    def _next_key_locked(self) -> Optional[str]:
+        """有排队任务、当前空闲且最久未被调度的项目"""
+        candidates = [key for key, queue in self._queues.items() if queue and key not in self._running]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda key: self._last_dispatch.get(key, -1))
+
+    def _run(self, key: str, name: str, func: Callable[[], object]):
+        try:
+            func()
+            outcome = "completed"
+        except Exception as e:
+            outcome = "failed"
+            if self.on_error:
+                self.on_error(key, name, e)
+        with self._lock:
+            self.stats[outcome] += 1
+            self._running.pop(key, None)
+            if not self._closed:
+                self._dispatch_locked()
@@ -103,7 +103,8 @@ class AIContextDeployer:
             "integrations": {
                 "vscode": True,
                 "git": True,
-                "ci_cd": False
+                "ci_cd": False,
+                "mcp": True
             }
         }
         